@@ -1,108 +1,163 @@
-# https://pypi.org/project/discord-py-slash-command/
-# pip3 install discord-py-slash-command
-
-import sys
-import traceback
-
-import discord
-from discord import Member
-from discord.ext import commands
-
-import os.path
-from os import path
-from pathlib import Path
-import json
-from discord_token import token
-from typing import Union
-
-from cogs.BotManagement import BotManagement
-from cogs.HierarchyManagement import HierarchyManagement
-from cogs.PlayerManagement import PlayerManagement
-from custom.Custom import CustomManagement
-
-# messages=True for reading Hierarchy commands
-# members=True for changing the roles of members
-# guilds=True for checking the Manage Roles permission
-intents = discord.Intents(messages=True, members=True, guilds=True)
-
-description = '''
-Replacement for the "Manage Roles" permission that allows for multiple hierarchies to be defined in Discord roles.
-'''
-bot = commands.Bot(command_prefix='^', description=description, intents=intents)
-
-@bot.event
-async def on_ready():
-    print('Logged in as')
-    print(bot.user.name)
-    print(bot.user.id)
-    print('------')
-
-
-#@bot.event
-#async def on_message(message: discord.Message):
-#    print(message)
-
-# SOURCE/COPYRIGHT: https://gist.github.com/EvieePy/7822af90858ef65012ea500bcecf1612
-@bot.event
-async def on_command_error(ctx: discord.ext.commands.Context, error: Exception):
-    """The event triggered when an error is raised while invoking a command.
-            Parameters
-            ------------
-            ctx: commands.Context
-                The context used for command invocation.
-            error: commands.CommandError
-                The Exception raised.
-            """
-
-    # This prevents any commands with local handlers being handled here in on_command_error.
-    if hasattr(ctx.command, 'on_error'):
-        print("Error has on_error attribute, do not process error.")
-        ctx.send(error)
-        return
-
-    # This prevents any cogs with an overwritten cog_command_error being handled here.
-    cog = ctx.cog
-    if cog:
-        if cog._get_overridden_method(cog.cog_command_error) is not None:
-            print("Cog has cog_command_error, allow cog to process this error.")
-            ctx.send(error)
-            return
-
-    ignored = (commands.CommandNotFound)
-
-    # Allows us to check for original exceptions raised and sent to CommandInvokeError.
-    # If nothing is found. We keep the exception passed to on_command_error.
-    error = getattr(error, 'original', error)
-
-    # Anything in ignored will return and prevent anything happening.
-    if isinstance(error, ignored):
-        print("Error is an ignored error instance.")
-        return
-
-    if isinstance(error, commands.DisabledCommand):
-        await ctx.send(f'{ctx.command} has been disabled.')
-
-    elif isinstance(error, commands.NoPrivateMessage):
-        try:
-            await ctx.author.send(f'{ctx.command} cannot be used in Private Messages.')
-        except discord.HTTPException:
-            pass
-
-    # For this error example we check to see where it came from...
-    elif isinstance(error, commands.BadArgument):
-        await ctx.send("Error: " + str(error))
-
-    elif isinstance(error, commands.MissingRequiredArgument):
-        await ctx.send("Error: " + str(error))
-
-    else:
-        # All other Errors not returned come here. And we can just print the default TraceBack.
-        print('Unknown exception in command {}:'.format(ctx.command), file=sys.stderr)
-        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
-        await ctx.send("Error: " + str(error))
-
-bot.add_cog(BotManagement(bot))
-bot.add_cog(HierarchyManagement(bot))
-bot.add_cog(PlayerManagement(bot))
-bot.add_cog(CustomManagement(bot))
-bot.run(token)
+# https://pypi.org/project/discord-py-slash-command/
+# pip3 install discord-py-slash-command
+
+import sys
+import time
+import traceback
+
+import discord
+from discord import Member
+from discord.ext import commands
+from discord_slash import SlashCommand
+
+import os.path
+from os import path
+from pathlib import Path
+import json
+from discord_token import token
+from typing import Union
+
+from cogs.Cluster import read_cluster_environment
+from cogs.CoreManagement import Core
+from cogs.Metrics import current_command
+from cogs.BotManagement import BotManagement
+from cogs.HierarchyManagement import HierarchyManagement
+from cogs.PlayerManagement import PlayerManagement
+from custom.Custom import CustomManagement
+
+# messages=True for reading Hierarchy commands
+# members=True for changing the roles of members
+# guilds=True for checking the Manage Roles permission
+intents = discord.Intents(messages=True, members=True, guilds=True)
+
+description = '''
+Replacement for the "Manage Roles" permission that allows for multiple hierarchies to be defined in Discord roles.
+'''
+# launcher.py runs several of these processes, each connecting its own slice of the shards.
+# Started directly, one process connects as many shards as Discord recommends.
+shard_count, shard_ids, cluster_name = read_cluster_environment()
+if cluster_name is not None:
+    Core.join_cluster(cluster_name, shard_count, shard_ids)
+# Opened before connecting, so a wrong database configuration stops the bot right away
+Core.open_storage()
+# Lean member cache mode, for large servers: members are not chunked at startup and only members
+# holding a hierarchy role stay cached. Everyone else is fetched when a command needs them.
+lean_member_cache = os.environ.get('HIERARCHIES_LEAN_MEMBER_CACHE', '') not in ('', '0')
+if lean_member_cache:
+    Core.member_cache.enabled = True
+bot = commands.AutoShardedBot(command_prefix='^', description=description, intents=intents, shard_count=shard_count, shard_ids=shard_ids,
+    chunk_guilds_at_startup=not lean_member_cache,
+    member_cache_flags=discord.MemberCacheFlags.none() if lean_member_cache else discord.MemberCacheFlags.from_intents(intents))
+# Role edits, replies and log messages are sent in that order of priority, HIERARCHIES_REQUEST_SCHEDULER=0 sends them as they come
+Core.scheduler.enabled = os.environ.get('HIERARCHIES_REQUEST_SCHEDULER', '1') not in ('', '0')
+
+class HierarchiesSlashCommand(SlashCommand):
+    async def on_socket_response(self, msg):
+        # discord_slash raises on autocomplete interactions, BotManagement answers those
+        if msg['t'] == 'INTERACTION_CREATE' and msg['d']['type'] == 4:
+            return
+        await super().on_socket_response(msg)
+
+# Receives the interactions for the cog slash commands and the page buttons of ^show and ^list
+slash = HierarchiesSlashCommand(bot)
+
+@bot.event
+async def on_ready():
+    print('Logged in as')
+    print(bot.user.name)
+    print(bot.user.id)
+    if cluster_name is not None:
+        print(f'Cluster {cluster_name}, shards {shard_ids} of {shard_count}')
+    print('------')
+    # on_ready fires again after every reconnect
+    if not hasattr(bot, 'compaction_task'):
+        bot.compaction_task = bot.loop.create_task(Core.compaction_loop())
+        bot.metrics_task = bot.loop.create_task(Core.metrics_loop())
+        # Load the busiest servers first, commands that arrive before they are loaded do not wait for it
+        guilds = sorted(bot.guilds, key=lambda guild: guild.member_count or 0, reverse=True)
+        bot.warm_up_task = bot.loop.create_task(Core.warm_up([guild.id for guild in guilds]))
+        Core.metrics.instrument_http(bot.http)
+        # Installed around the metrics, so time spent queued is not timed as api
+        Core.scheduler.install(bot.http)
+
+
+@bot.before_invoke
+async def before_invoke(ctx: discord.ext.commands.Context):
+    # Everything the command does from here on is timed under its name
+    current_command.set(ctx.command.qualified_name)
+    ctx.metrics_started = time.perf_counter()
+
+
+@bot.after_invoke
+async def after_invoke(ctx: discord.ext.commands.Context):
+    Core.metrics.observe(ctx.command.qualified_name, 'total', time.perf_counter() - ctx.metrics_started)
+
+
+#@bot.event
+#async def on_message(message: discord.Message):
+#    print(message)
+
+# SOURCE/COPYRIGHT: https://gist.github.com/EvieePy/7822af90858ef65012ea500bcecf1612
+@bot.event
+async def on_command_error(ctx: discord.ext.commands.Context, error: Exception):
+    """The event triggered when an error is raised while invoking a command.
+            Parameters
+            ------------
+            ctx: commands.Context
+                The context used for command invocation.
+            error: commands.CommandError
+                The Exception raised.
+            """
+
+    # This prevents any commands with local handlers being handled here in on_command_error.
+    if hasattr(ctx.command, 'on_error'):
+        print("Error has on_error attribute, do not process error.")
+        ctx.send(error)
+        return
+
+    # This prevents any cogs with an overwritten cog_command_error being handled here.
+    cog = ctx.cog
+    if cog:
+        if cog._get_overridden_method(cog.cog_command_error) is not None:
+            print("Cog has cog_command_error, allow cog to process this error.")
+            ctx.send(error)
+            return
+
+    ignored = (commands.CommandNotFound)
+
+    # Allows us to check for original exceptions raised and sent to CommandInvokeError.
+    # If nothing is found. We keep the exception passed to on_command_error.
+    error = getattr(error, 'original', error)
+
+    # Anything in ignored will return and prevent anything happening.
+    if isinstance(error, ignored):
+        print("Error is an ignored error instance.")
+        return
+
+    if isinstance(error, commands.DisabledCommand):
+        await ctx.send(f'{ctx.command} has been disabled.')
+
+    elif isinstance(error, commands.NoPrivateMessage):
+        try:
+            await ctx.author.send(f'{ctx.command} cannot be used in Private Messages.')
+        except discord.HTTPException:
+            pass
+
+    # For this error example we check to see where it came from...
+    elif isinstance(error, commands.BadArgument):
+        await ctx.send("Error: " + str(error))
+
+    elif isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send("Error: " + str(error))
+
+    else:
+        # All other Errors not returned come here. And we can just print the default TraceBack.
+        print('Unknown exception in command {}:'.format(ctx.command), file=sys.stderr)
+        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+        await ctx.send("Error: " + str(error))
+
+bot.add_cog(BotManagement(bot))
+bot.add_cog(HierarchyManagement(bot))
+bot.add_cog(PlayerManagement(bot))
+bot.add_cog(CustomManagement(bot))
+bot.run(token)
@@ -0,0 +1,307 @@
+#
+# Offline benchmarks for the hierarchy and player commands.
+#
+# Builds a synthetic guild out of the fakes in benchmarks/fakes.py and drives the
+# real HierarchyManagement and PlayerManagement commands against it, using JSON
+# storage in a temporary directory.
+#
+# python benchmarks/benchmark.py                    Compare against benchmarks/baseline.json
+# python benchmarks/benchmark.py --save-baseline    Record a new baseline
+#
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeBot, FakeChannel, FakeContext, FakeGuild, FakeMember
+from cogs.Codec import CODECS, decode_server_file, encode_server_file
+from cogs.CoreManagement import Core
+from cogs.HierarchyManagement import HierarchyManagement
+from cogs.Model import load_hierarchies, to_json
+from cogs.Mutations import apply_mutation
+from cogs.PlayerManagement import PlayerManagement
+from cogs.Storage import JsonStorage, new_server_json
+
+GUILD_ID = 1
+LOG_CHANNEL_ID = 2
+ADMIN_ID = 3
+FIRST_ROLE_ID = 1000
+FIRST_MEMBER_ID = 1000000
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def tier(role_id, parent_role_id, minimum=-1, maximum=-1):
+    return {
+        'role_id': role_id,
+        'parent_role_id': parent_role_id,
+        'depth': 0,
+        'promotion_min_depth': minimum,
+        'promotion_max_depth': maximum,
+        'demotion_min_depth': minimum,
+        'demotion_max_depth': maximum,
+        'allow_promote_demote': True,
+        'allow_assign_unassign': True,
+    }
+
+
+def build_guild(options, spare_roles):
+    """Returns the guild, its server document, the tiers of the deep hierarchy and spare_roles roles left over for ^add."""
+    random_source = random.Random(options.seed)
+    guild = FakeGuild(GUILD_ID)
+    roles = [guild.add_role(FIRST_ROLE_ID + index) for index in range(options.roles)]
+    unused_roles = list(roles)
+
+    server_json = new_server_json()
+    apply_mutation(server_json, {'op': 'set_log_channel', 'channel_id': LOG_CHANNEL_ID})
+
+    # One chain that is options.depth tiers deep
+    chain = [unused_roles.pop() for index in range(options.depth)]
+    apply_mutation(server_json, {'op': 'create_hierarchy', 'hierarchy': 'deep', 'tier': tier(chain[0].id, 0, 0, options.depth)})
+    for parent, child in zip(chain, chain[1:]):
+        apply_mutation(server_json, {'op': 'add_tier', 'hierarchy': 'deep', 'tier': tier(child.id, parent.id)})
+
+    # Bushy hierarchies with random parents
+    wide_tiers = []
+    for hierarchy_index in range(options.hierarchies):
+        hierarchy_name = f'wide-{hierarchy_index}'
+        hierarchy_roles = [unused_roles.pop() for index in range(options.tiers)]
+        apply_mutation(server_json, {'op': 'create_hierarchy', 'hierarchy': hierarchy_name, 'tier': tier(hierarchy_roles[0].id, 0, 0, options.tiers)})
+        for index, role in enumerate(hierarchy_roles[1:], 1):
+            parent = hierarchy_roles[random_source.randrange(index)]
+            apply_mutation(server_json, {'op': 'add_tier', 'hierarchy': hierarchy_name, 'tier': tier(role.id, parent.id)})
+        wide_tiers += hierarchy_roles[1:]
+    if len(unused_roles) <= spare_roles:
+        raise Exception('Not enough roles for the hierarchies, use more roles or fewer tiers.')
+    plain_roles = unused_roles[spare_roles:]
+
+    admin = FakeMember(ADMIN_ID, guild, [guild.get_role(hierarchy.tiers[0].role_id) for hierarchy in server_json['hierarchies'].values()])
+    guild.add_member(admin)
+    # Every member has a few plain roles and one tier, half of them in the deep hierarchy
+    for index in range(options.members):
+        member_roles = random_source.sample(plain_roles, min(3, len(plain_roles)))
+        member_roles.append(random_source.choice(chain[1:]) if index % 2 == 0 else random_source.choice(wide_tiers))
+        guild.add_member(FakeMember(FIRST_MEMBER_ID + index, guild, member_roles))
+
+    return guild, admin, server_json, chain, unused_roles[:spare_roles]
+
+
+def summarize(latencies, peak):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    return {
+        'runs': len(latencies),
+        'mean_ms': statistics.mean(latencies),
+        'p50_ms': latencies[len(latencies) // 2],
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        'max_ms': latencies[-1],
+        'peak_kb': peak / 1024,
+    }
+
+
+async def measure(operation, iterations, memory_iterations):
+    """Times operation(index) for every iteration, then reruns a few under tracemalloc for the peak memory."""
+    latencies = []
+    for index in range(iterations):
+        started = time.perf_counter()
+        await operation(index)
+        latencies.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    for index in range(iterations, iterations + memory_iterations):
+        await operation(index)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summarize(latencies, peak)
+
+
+def retained_memory(build):
+    """Bytes still allocated once build() returns, i.e. what keeping its result in the server cache costs."""
+    tracemalloc.start()
+    result = build()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def document_memory(server_json):
+    """Memory of the server document as cached, with slotted tiers, and as the plain JSON dicts it is stored as."""
+    contents = json.dumps(server_json, default=to_json)
+    return {
+        'model_kb': retained_memory(lambda: load_hierarchies(json.loads(contents))) / 1024,
+        'json_kb': retained_memory(lambda: json.loads(contents)) / 1024,
+    }
+
+
+def codec_speed(server_json, repeats=20):
+    """Size of the server file and time to write and read it with every codec that is installed, and as the old indented JSON."""
+    results = {}
+    legacy = json.dumps(server_json, indent=4, default=to_json).encode('utf-8')
+    candidates = [('indented', None)]
+    for name, codec_class in CODECS.items():
+        try:
+            candidates.append((name, codec_class()))
+        except ImportError:
+            pass
+    for name, codec in candidates:
+        encode = (lambda: json.dumps(server_json, indent=4, default=to_json).encode('utf-8')) if codec is None else (lambda: encode_server_file(codec, server_json))
+        contents = legacy if codec is None else encode()
+        started = time.perf_counter()
+        for _ in range(repeats):
+            encode()
+        encode_ms = (time.perf_counter() - started) / repeats * 1000
+        started = time.perf_counter()
+        for _ in range(repeats):
+            decode_server_file(contents)
+        decode_ms = (time.perf_counter() - started) / repeats * 1000
+        results[name] = {'size_kb': len(contents) / 1024, 'encode_ms': encode_ms, 'decode_ms': decode_ms}
+    return results
+
+
+async def run(options):
+    directory = tempfile.mkdtemp(prefix='hierarchies-benchmark-')
+    Core.storage = JsonStorage(directory=directory, journal_compact_threshold=options.iterations * 10)
+    Core.server_cache.clear()
+
+    count = options.iterations + options.memory_iterations
+    started = time.perf_counter()
+    guild, admin, server_json, chain, added_roles = build_guild(options, count)
+    await Core.save_server_file(GUILD_ID, server_json)
+    setup_seconds = time.perf_counter() - started
+
+    bot = FakeBot()
+    bot.channels[LOG_CHANNEL_ID] = FakeChannel(LOG_CHANNEL_ID)
+    hierarchy_management = HierarchyManagement(bot)
+    player_management = PlayerManagement(bot)
+    hierarchy_management.bot = bot
+    player_management.bot = bot
+    ctx = FakeContext(guild, admin)
+
+    # Members in the deep hierarchy below its second tier, so they can always move one tier up
+    deep_tiers = {role.id: index for index, role in enumerate(chain)}
+    movable = [member for member in guild.members[1:]
+               if any(deep_tiers.get(role.id, 0) >= 2 for role in member.roles)]
+    if len(movable) < count:
+        raise Exception(f'Only {len(movable)} members can be promoted, use more members or fewer iterations.')
+    movable = movable[:count]
+
+    def current_tier(member):
+        return next(chain[deep_tiers[role.id]] for role in member.roles if role.id in deep_tiers)
+
+    async def load(index):
+        Core.evict_server_json(GUILD_ID)
+        await Core.get_server_json(GUILD_ID)
+
+    async def show(index):
+        await hierarchy_management.show.callback(hierarchy_management, ctx, 'deep')
+
+    async def add(index):
+        await hierarchy_management.add.callback(hierarchy_management, ctx, added_roles[index], chain[(index * 7) % len(chain)])
+
+    async def remove(index):
+        await hierarchy_management.remove.callback(hierarchy_management, ctx, added_roles[index])
+
+    async def promote(index):
+        member = movable[index]
+        await player_management.promote.callback(player_management, ctx, member, chain[chain.index(current_tier(member)) - 1])
+
+    async def demote(index):
+        member = movable[index]
+        await player_management.demote.callback(player_management, ctx, member, chain[chain.index(current_tier(member)) + 1])
+
+    results = {}
+    api_calls = guild.api_calls
+    # The cogs print every log line, keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, operation in (('load', load), ('show', show), ('add', add), ('remove', remove), ('promote', promote), ('demote', demote)):
+            results[name] = await measure(operation, options.iterations, options.memory_iterations)
+
+    if guild.api_calls - api_calls != 2 * count:
+        raise Exception(f'Expected {2 * count} role edits but the commands made {guild.api_calls - api_calls}, check the command replies: {ctx.replies[-3:]}')
+    return {
+        'parameters': {
+            'roles': options.roles,
+            'members': options.members,
+            'depth': options.depth,
+            'hierarchies': options.hierarchies,
+            'tiers': options.tiers,
+            'iterations': options.iterations,
+        },
+        'setup_seconds': setup_seconds,
+        'document': document_memory(server_json),
+        'codecs': codec_speed(server_json),
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance, floor_ms=0.5):
+    """Prints every operation next to the baseline. Returns False if any got slower than the tolerance allows.
+
+    Operations that take well under a millisecond jitter by more than the tolerance, so a slowdown also has to exceed floor_ms."""
+    if baseline is not None and baseline['parameters'] != report['parameters']:
+        print('Baseline was recorded with different parameters, not comparing.')
+        baseline = None
+
+    passed = True
+    print(f'{"operation":<10}{"mean ms":>10}{"p95 ms":>10}{"max ms":>10}{"peak KB":>10}{"baseline":>10}')
+    for name, result in report['results'].items():
+        line = f'{name:<10}{result["mean_ms"]:>10.2f}{result["p95_ms"]:>10.2f}{result["max_ms"]:>10.2f}{result["peak_kb"]:>10.0f}'
+        if baseline is not None and name in baseline['results']:
+            baseline_mean = baseline['results'][name]['mean_ms']
+            line += f'{baseline_mean:>10.2f}'
+            if result['mean_ms'] > baseline_mean * (1 + tolerance) and result['mean_ms'] - baseline_mean > floor_ms:
+                line += '  REGRESSION'
+                passed = False
+        print(line)
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the Hierarchies commands against a synthetic guild.')
+    parser.add_argument('--roles', type=int, default=5000)
+    parser.add_argument('--members', type=int, default=100000)
+    parser.add_argument('--depth', type=int, default=300, help='Tiers in the deep hierarchy.')
+    parser.add_argument('--hierarchies', type=int, default=10, help='Number of bushy hierarchies.')
+    parser.add_argument('--tiers', type=int, default=200, help='Tiers in each bushy hierarchy.')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--memory-iterations', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed slowdown of the mean before failing, 0.5 is 50%%.')
+    parser.add_argument('--floor-ms', type=float, default=0.5, help='Slowdowns of the mean smaller than this many milliseconds never fail.')
+    parser.add_argument('--save-baseline', action='store_true')
+    options = parser.parse_args()
+
+    report = asyncio.run(run(options))
+    print(f'Built {options.roles} roles and {options.members} members in {report["setup_seconds"]:.1f} seconds.')
+    print(f'Server document takes {report["document"]["model_kb"]:.0f} KB cached, {report["document"]["json_kb"]:.0f} KB as JSON dicts.')
+    print(f'{"codec":<10}{"file KB":>10}{"write ms":>10}{"read ms":>10}')
+    for name, result in report['codecs'].items():
+        print(f'{name:<10}{result["size_kb"]:>10.0f}{result["encode_ms"]:>10.2f}{result["decode_ms"]:>10.2f}')
+
+    if options.save_baseline:
+        with open(options.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=4)
+        compare(report, None, options.tolerance, options.floor_ms)
+        print(f'Saved baseline to {options.baseline}.')
+        return
+
+    baseline = None
+    if os.path.isfile(options.baseline):
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    if not compare(report, baseline, options.tolerance, options.floor_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
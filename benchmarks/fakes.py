@@ -0,0 +1,218 @@
+#
+# In-process stand-ins for the discord.py objects the cogs use, so commands can
+# run without a connection to Discord. Only what the cogs touch is implemented.
+#
+import asyncio
+import random
+
+import discord
+
+
+class FakeRest:
+    """Simulated Discord REST API with per-route rate limit buckets and latency.
+
+    Like discord.py, a request that hits an exhausted bucket waits for the bucket to reset and is retried.
+    With a scheduler, requests go through it first, the way RequestScheduler.install routes discord.py's requests."""
+
+    # Route -> (requests, per seconds), for each major parameter (guild or channel)
+    default_limits = {
+        'PATCH /guilds/{guild_id}/members/{user_id}': (10, 10.0),
+        'PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}': (10, 10.0),
+        'DELETE /guilds/{guild_id}/members/{user_id}/roles/{role_id}': (10, 10.0),
+        'POST /channels/{channel_id}/messages': (5, 5.0),
+    }
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, limits: dict = None, seed: int = 1,
+                 global_limit: tuple = None, scheduler=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.limits = dict(self.default_limits, **(limits or {}))
+        # Requests per second over all routes, like Discord's global rate limit, None for no limit
+        self.global_limit = global_limit
+        self.random = random.Random(seed)
+        # (route, major parameter) -> [remaining requests, reset time]
+        self.buckets = {}
+        self.requests = {}
+        self.rate_limited = 0
+        self.rate_limit_wait = 0.0
+        self.scheduler = scheduler
+
+    async def request(self, route: str, major):
+        if self.scheduler is not None:
+            return await self.scheduler.run(route, major, lambda: self._request(route, major))
+        return await self._request(route, major)
+
+    async def _request(self, route: str, major):
+        if self.global_limit is not None:
+            await self._take(('global', None), *self.global_limit)
+        await self._take((route, major), *self.limits.get(route, (50, 1.0)))
+        self.requests[route] = self.requests.get(route, 0) + 1
+        await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+
+    async def _take(self, key, limit, per):
+        loop = asyncio.get_event_loop()
+        while True:
+            now = loop.time()
+            bucket = self.buckets.get(key)
+            if bucket is None or now >= bucket[1]:
+                bucket = self.buckets[key] = [limit, now + per]
+            if bucket[0] > 0:
+                bucket[0] -= 1
+                return
+            self.rate_limited += 1
+            self.rate_limit_wait += bucket[1] - now
+            await asyncio.sleep(bucket[1] - now)
+
+
+class FakeRole(discord.Role):
+    """A role that passes isinstance checks for discord.Role without gateway data."""
+
+    def __init__(self, role_id: int, guild, position: int = 0):
+        self.id = role_id
+        self.guild = guild
+        self.name = f'role-{role_id}'
+        self.position = position
+
+    def __repr__(self):
+        return f'<FakeRole id={self.id}>'
+
+    def is_default(self):
+        return self.id == self.guild.id
+
+    @property
+    def members(self):
+        return [member for member in self.guild.members if self in member.roles]
+
+
+class FakeMember:
+    __slots__ = ('id', 'guild', 'roles', 'name', 'discriminator')
+
+    def __init__(self, member_id: int, guild, roles: list):
+        self.id = member_id
+        self.guild = guild
+        self.roles = roles
+        self.name = f'member-{member_id}'
+        self.discriminator = '0001'
+
+    @property
+    def mention(self):
+        return f'<@{self.id}>'
+
+    @property
+    def _roles(self):
+        return [role.id for role in self.roles]
+
+    async def edit(self, roles=None, **kwargs):
+        self.guild.api_calls += 1
+        if self.guild.rest is not None:
+            await self.guild.rest.request('PATCH /guilds/{guild_id}/members/{user_id}', self.guild.id)
+        if roles is not None:
+            self.roles = list(roles)
+
+    async def add_roles(self, *roles, **kwargs):
+        self.guild.api_calls += 1
+        if self.guild.rest is not None:
+            for role in roles:
+                await self.guild.rest.request('PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}', self.guild.id)
+        self.roles = self.roles + [role for role in roles if role not in self.roles]
+
+    async def remove_roles(self, *roles, **kwargs):
+        self.guild.api_calls += 1
+        if self.guild.rest is not None:
+            for role in roles:
+                await self.guild.rest.request('DELETE /guilds/{guild_id}/members/{user_id}/roles/{role_id}', self.guild.id)
+        self.roles = [role for role in self.roles if role not in roles]
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, rest: FakeRest = None):
+        self.id = guild_id
+        self.rest = rest
+        self._roles = {}
+        self._members = {}
+        self.members = []
+        # Role edits the cogs would have sent to Discord
+        self.api_calls = 0
+
+    @property
+    def roles(self):
+        return list(self._roles.values())
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+    def add_member(self, member):
+        self._members[member.id] = member
+        self.members.append(member)
+        return member
+
+    def add_role(self, role_id: int):
+        role = FakeRole(role_id, self, len(self._roles))
+        self._roles[role_id] = role
+        return role
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild=None, rest: FakeRest = None):
+        self.id = channel_id
+        self.guild = guild
+        self.rest = rest
+        self.mention = f'<#{channel_id}>'
+        self.messages = 0
+
+    def permissions_for(self, member):
+        return discord.Permissions.all()
+
+    async def send(self, content=None, **kwargs):
+        self.messages += 1
+        if self.rest is not None:
+            await self.rest.request('POST /channels/{channel_id}/messages', self.id)
+        return FakeMessage(self.guild, channel=self, content=content)
+
+
+class FakeMessage(discord.Message):
+    """A message that passes isinstance checks for discord.Message, which the page buttons wait on."""
+
+    last_id = 0
+
+    def __init__(self, guild, author=None, channel=None, content: str = ''):
+        FakeMessage.last_id += 1
+        self.id = FakeMessage.last_id
+        self.guild = guild
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.mentions = []
+        self.role_mentions = []
+        self._state = None
+
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeContext:
+    def __init__(self, guild, author):
+        self.guild = guild
+        self.author = author
+        self.message = FakeMessage(guild)
+        self.replies = []
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append(content if content is not None else kwargs.get('embed'))
+        return FakeMessage(self.guild, self.author, content=content)
+
+
+class FakeBot:
+    def __init__(self):
+        self.channels = {}
+        self.loop = asyncio.get_event_loop()
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    async def wait_for(self, event, check=None, timeout=None):
+        # Nobody clicks page buttons in a benchmark
+        raise asyncio.TimeoutError()
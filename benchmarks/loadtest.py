@@ -0,0 +1,364 @@
+#
+# Load test that replays command streams concurrently through the bot's command
+# dispatch, against the fake Discord REST layer in benchmarks/fakes.py.
+#
+# python benchmarks/loadtest.py                           50 moderators in 20 guilds, synthetic commands
+# python benchmarks/loadtest.py --record trace.jsonl      Also save the synthetic commands
+# python benchmarks/loadtest.py --trace trace.jsonl       Replay saved commands
+# python benchmarks/loadtest.py --log-flood 20 --shared-log-channel
+#                                                         Also flood every guild's log channel, which is a command channel
+#
+# Every moderator sends its commands in order, waiting for each to finish and then
+# until the command's offset in the trace, so slow commands push the rest back.
+#
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from discord.ext import commands
+
+from benchmarks.fakes import FakeChannel, FakeGuild, FakeMember, FakeMessage, FakeRest
+from cogs.CoreManagement import Core
+from cogs.HierarchyManagement import HierarchyManagement
+from cogs.Mutations import apply_mutation
+from cogs.PlayerManagement import PlayerManagement
+from cogs.Scheduler import RequestScheduler
+from cogs.Storage import JsonStorage, new_server_json
+
+FIRST_GUILD_ID = 1000
+# IDs inside a guild are the guild ID times this plus an offset
+GUILD_ID_SPACE = 1000000
+LOG_CHANNEL_OFFSET = 1
+COMMAND_CHANNEL_OFFSET = 10
+ROLE_OFFSET = 1000
+MODERATOR_OFFSET = 100000
+MEMBER_OFFSET = 200000
+
+
+class LoadContext(commands.Context):
+    """Replies go through the fake channel, and so through the fake REST rate limits."""
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class LoadBot(commands.Bot):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.channels = {}
+        self.errors = {}
+        # get_context skips messages sent by the bot itself, so it needs to know who that is
+        self._connection.user = SimpleNamespace(id=0)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    async def on_command_error(self, ctx, error):
+        error = getattr(error, 'original', error)
+        name = f'{type(error).__name__}: {error}'
+        self.errors[name] = self.errors.get(name, 0) + 1
+        ctx.failed = True
+
+
+def tier(role_id, parent_role_id, minimum=-1, maximum=-1):
+    return {
+        'role_id': role_id,
+        'parent_role_id': parent_role_id,
+        'depth': 0,
+        'promotion_min_depth': minimum,
+        'promotion_max_depth': maximum,
+        'demotion_min_depth': minimum,
+        'demotion_max_depth': maximum,
+        'allow_promote_demote': True,
+        'allow_assign_unassign': True,
+    }
+
+
+def guild_ids(parameters, guild_index):
+    """IDs of everything in one synthetic guild."""
+    guild_id = FIRST_GUILD_ID + guild_index
+    base = guild_id * GUILD_ID_SPACE
+    moderators = [moderator for moderator in range(parameters['moderators']) if moderator % parameters['guilds'] == guild_index]
+    return SimpleNamespace(
+        guild=guild_id,
+        log_channel=base + LOG_CHANNEL_OFFSET,
+        channels=[base + COMMAND_CHANNEL_OFFSET + index for index in range(parameters['channels'])],
+        chain=[base + ROLE_OFFSET + index for index in range(parameters['depth'])],
+        # Roles each moderator adds to and removes from the hierarchy
+        spares={moderator: [base + ROLE_OFFSET + parameters['depth'] + moderator * parameters['commands'] + index
+                            for index in range(parameters['commands'])] for moderator in moderators},
+        moderators={moderator: base + MODERATOR_OFFSET + moderator for moderator in moderators},
+        members=[base + MEMBER_OFFSET + index for index in range(parameters['members'])],
+    )
+
+
+def member_start_depth(parameters, member_index):
+    """Members start somewhere below the second tier of the chain, so they can always move one tier up."""
+    return 2 + member_index % (parameters['depth'] - 2)
+
+
+def build_world(parameters, rest, bot):
+    """Creates the guilds, members and channels, and the server documents for them."""
+    guilds = {}
+    documents = {}
+    for guild_index in range(parameters['guilds']):
+        ids = guild_ids(parameters, guild_index)
+        guild = FakeGuild(ids.guild, rest)
+        for role_id in ids.chain:
+            guild.add_role(role_id)
+        for spare_role_ids in ids.spares.values():
+            for role_id in spare_role_ids:
+                guild.add_role(role_id)
+
+        server_json = new_server_json()
+        # Replies and log messages then share the channel's rate limit
+        log_channel = ids.channels[0] if parameters.get('shared_log_channel') else ids.log_channel
+        apply_mutation(server_json, {'op': 'set_log_channel', 'channel_id': log_channel})
+        apply_mutation(server_json, {'op': 'create_hierarchy', 'hierarchy': 'staff', 'tier': tier(ids.chain[0], 0, 0, parameters['depth'])})
+        for parent, child in zip(ids.chain, ids.chain[1:]):
+            apply_mutation(server_json, {'op': 'add_tier', 'hierarchy': 'staff', 'tier': tier(child, parent)})
+        documents[ids.guild] = server_json
+
+        for moderator_id in ids.moderators.values():
+            guild.add_member(FakeMember(moderator_id, guild, [guild.get_role(ids.chain[0])]))
+        for member_index, member_id in enumerate(ids.members):
+            guild.add_member(FakeMember(member_id, guild, [guild.get_role(ids.chain[member_start_depth(parameters, member_index)])]))
+
+        bot.channels[ids.log_channel] = FakeChannel(ids.log_channel, guild, rest)
+        for channel_id in ids.channels:
+            bot.channels[channel_id] = FakeChannel(channel_id, guild, rest)
+        guilds[ids.guild] = guild
+    return guilds, documents
+
+
+def synthetic_trace(parameters):
+    """Generates every moderator's commands, keeping track of member tiers so every command is valid when run in order."""
+    random_source = random.Random(parameters['seed'])
+    trace = []
+    for guild_index in range(parameters['guilds']):
+        ids = guild_ids(parameters, guild_index)
+        moderators = sorted(ids.moderators)
+        for position, moderator in enumerate(moderators):
+            # Moderators of the same guild work on different members
+            members = ids.members[position::len(moderators)]
+            depths = {member_id: member_start_depth(parameters, ids.members.index(member_id)) for member_id in members}
+            spares = list(ids.spares[moderator])
+            added = []
+            offset = 0.0
+            for index in range(parameters['commands']):
+                offset += random_source.expovariate(1 / parameters['think_time'])
+                choice = random_source.random()
+                if choice < 0.7 and members:
+                    member_id = random_source.choice(members)
+                    # Alternate members between their starting tier and the one above it
+                    if depths[member_id] >= 2 and random_source.random() < 0.5 or depths[member_id] == parameters['depth'] - 1:
+                        depths[member_id] -= 1
+                        content = f'^promote <@{member_id}> <@&{ids.chain[depths[member_id]]}>'
+                    else:
+                        depths[member_id] += 1
+                        content = f'^demote <@{member_id}> <@&{ids.chain[depths[member_id]]}>'
+                elif choice < 0.8:
+                    content = '^show staff'
+                elif choice < 0.85:
+                    content = '^list'
+                elif added and (choice < 0.93 or not spares):
+                    content = f'^remove <@&{added.pop(0)}>'
+                elif spares:
+                    role_id = spares.pop(0)
+                    added.append(role_id)
+                    content = f'^add <@&{role_id}> <@&{random_source.choice(ids.chain)}>'
+                else:
+                    content = '^show staff'
+                trace.append({
+                    't': round(offset, 4),
+                    'guild': ids.guild,
+                    'channel': ids.channels[position % len(ids.channels)],
+                    'author': ids.moderators[moderator],
+                    'content': content,
+                })
+    trace.sort(key=lambda entry: entry['t'])
+    return trace
+
+
+def percentile(latencies, fraction):
+    if not latencies:
+        return 0.0
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+
+async def replay(parameters, trace, speed):
+    directory = tempfile.mkdtemp(prefix='hierarchies-loadtest-')
+    Core.storage = JsonStorage(directory=directory)
+    Core.server_cache.clear()
+    Core.locks.timeout = parameters['lock_timeout']
+
+    # The scheduler is told the same limits the fake REST layer enforces
+    global_limit = (parameters['global_limit'], 1.0) if parameters.get('global_limit') else None
+    Core.scheduler = RequestScheduler(enabled=not parameters.get('no_scheduler'), global_limit=global_limit, metrics=Core.metrics)
+    rest = FakeRest(parameters['latency'], parameters['jitter'], seed=parameters['seed'], global_limit=global_limit, scheduler=Core.scheduler)
+    bot = LoadBot(command_prefix='^', intents=discord.Intents(messages=True, members=True, guilds=True))
+    bot.add_cog(HierarchyManagement(bot))
+    bot.add_cog(PlayerManagement(bot))
+    HierarchyManagement(bot).bot = bot
+    PlayerManagement(bot).bot = bot
+
+    guilds, documents = build_world(parameters, rest, bot)
+    for guild_id, server_json in documents.items():
+        await Core.save_server_file(guild_id, server_json)
+
+    streams = {}
+    for entry in trace:
+        streams.setdefault(entry['author'], []).append(entry)
+    latencies = {}
+
+    async def moderator(entries):
+        for entry in entries:
+            delay = started + entry['t'] / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            guild = guilds[entry['guild']]
+            message = FakeMessage(guild, guild.get_member(entry['author']), bot.channels[entry['channel']], entry['content'])
+            command_started = time.perf_counter()
+            ctx = await bot.get_context(message, cls=LoadContext)
+            ctx.failed = False
+            await bot.invoke(ctx)
+            name = ctx.command.name if ctx.command is not None else 'unknown'
+            latencies.setdefault(name, []).append(time.perf_counter() - command_started)
+
+    async def log_flood(guild_id, lines_per_second):
+        line = 0
+        while True:
+            line += 1
+            await Core.log_server(bot, guild_id, f'Flood line {line} for guild {guild_id}, standing in for a burst of log lines. ' + '.' * 100)
+            await asyncio.sleep(1 / lines_per_second)
+
+    # The cogs print every log line, keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        floods = [asyncio.ensure_future(log_flood(guild_id, parameters['log_flood'])) for guild_id in guilds] if parameters.get('log_flood') else []
+        await asyncio.gather(*[moderator(entries) for entries in streams.values()])
+        duration = time.perf_counter() - started
+        for flood in floods:
+            flood.cancel()
+        # Let error handlers scheduled by the last commands run
+        await asyncio.sleep(0)
+
+    all_latencies = sorted(latency for command_latencies in latencies.values() for latency in command_latencies)
+    return {
+        'parameters': parameters,
+        'commands': len(all_latencies),
+        'duration_seconds': duration,
+        'throughput': len(all_latencies) / duration if duration else 0.0,
+        'latency_ms': {
+            'p50': percentile(all_latencies, 0.5),
+            'p99': percentile(all_latencies, 0.99),
+            'max': all_latencies[-1] * 1000 if all_latencies else 0.0,
+        },
+        'commands_by_name': {name: {
+            'count': len(command_latencies),
+            'p50_ms': percentile(sorted(command_latencies), 0.5),
+            'p99_ms': percentile(sorted(command_latencies), 0.99),
+        } for name, command_latencies in sorted(latencies.items())},
+        'errors': bot.errors,
+        'locks': Core.get_lock_stats(),
+        'rest': {
+            'requests': rest.requests,
+            'rate_limited': rest.rate_limited,
+            'rate_limit_wait_seconds': rest.rate_limit_wait,
+        },
+        'log_queue': Core.log_queue.get_stats(),
+        'scheduler': Core.scheduler.get_stats(),
+    }
+
+
+def print_report(report):
+    print(f'{report["commands"]} commands in {report["duration_seconds"]:.1f} seconds, {report["throughput"]:.1f} commands/second')
+    print(f'Latency p50 {report["latency_ms"]["p50"]:.1f} ms, p99 {report["latency_ms"]["p99"]:.1f} ms, max {report["latency_ms"]["max"]:.1f} ms')
+    for name, result in report['commands_by_name'].items():
+        print(f'  {name:<10}{result["count"]:>6} runs, p50 {result["p50_ms"]:>8.1f} ms, p99 {result["p99_ms"]:>8.1f} ms')
+    locks = report['locks']
+    print(f'Locks: {locks["acquired"]} acquired, wait {locks["wait_average"] * 1000:.1f} ms average / {locks["wait_max"] * 1000:.1f} ms max, {locks["timeouts"]} timeouts')
+    rest = report['rest']
+    print(f'REST: {sum(rest["requests"].values())} requests, {rest["rate_limited"]} rate limited for {rest["rate_limit_wait_seconds"]:.1f} seconds in total')
+    scheduler = report['scheduler']
+    if scheduler['enabled']:
+        for name, stats in scheduler['priorities'].items():
+            print(f'  {name:<10}{stats["requests"]:>6} sent, wait {stats["wait_average"] * 1000:>8.1f} ms average / {stats["wait_max"] * 1000:.1f} ms max, {stats["queued_max"]} queued at most')
+    log_queue = report['log_queue']
+    print(f'Log queue: {log_queue["lines"]} lines in {log_queue["messages"]} messages, {log_queue["coalesced"]} repeats coalesced, {log_queue["dropped"]} dropped')
+    print(f'Rejected commands: {sum(report["errors"].values())}')
+    for name, count in sorted(report['errors'].items(), key=lambda item: -item[1]):
+        print(f'  {count:>6}  {name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays concurrent Hierarchies commands against a fake Discord REST layer.')
+    parser.add_argument('--guilds', type=int, default=20)
+    parser.add_argument('--moderators', type=int, default=50, help='Spread over the guilds round robin.')
+    parser.add_argument('--members', type=int, default=200, help='Members per guild.')
+    parser.add_argument('--channels', type=int, default=3, help='Command channels per guild.')
+    parser.add_argument('--depth', type=int, default=8, help='Tiers in each guild\'s hierarchy.')
+    parser.add_argument('--commands', type=int, default=40, help='Commands per moderator.')
+    parser.add_argument('--think-time', type=float, default=0.5, help='Average seconds between a moderator\'s commands.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Average seconds the fake REST layer takes per request.')
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--lock-timeout', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--global-limit', type=int, default=0, help='Requests per second over all routes, Discord allows 50. 0 for no limit.')
+    parser.add_argument('--log-flood', type=float, default=0.0, help='Extra log lines per second for every guild.')
+    parser.add_argument('--shared-log-channel', action='store_true', help='Log to a command channel instead of a channel of its own.')
+    parser.add_argument('--no-scheduler', action='store_true', help='Send requests as they come instead of by priority.')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay the trace this many times faster.')
+    parser.add_argument('--trace', help='Replay commands from a trace file instead of generating them.')
+    parser.add_argument('--record', help='Save the generated commands to a trace file.')
+    parser.add_argument('--json', help='Also write the report to this file.')
+    options = parser.parse_args()
+
+    if options.trace:
+        # The first line holds the parameters the world was generated with
+        with open(options.trace) as trace_file:
+            parameters = json.loads(trace_file.readline())['parameters']
+            trace = [json.loads(line) for line in trace_file if line.strip()]
+    else:
+        parameters = {
+            'guilds': options.guilds,
+            'moderators': options.moderators,
+            'members': options.members,
+            'channels': options.channels,
+            'depth': options.depth,
+            'commands': options.commands,
+            'think_time': options.think_time,
+            'seed': options.seed,
+        }
+        if parameters['depth'] < 3:
+            raise Exception('The hierarchy needs at least 3 tiers.')
+        trace = synthetic_trace(parameters)
+    parameters.update(latency=options.latency, jitter=options.jitter, lock_timeout=options.lock_timeout,
+                      global_limit=options.global_limit, log_flood=options.log_flood, shared_log_channel=options.shared_log_channel, no_scheduler=options.no_scheduler)
+
+    if options.record:
+        with open(options.record, 'w') as trace_file:
+            trace_file.write(json.dumps({'parameters': parameters}) + '\n')
+            for entry in trace:
+                trace_file.write(json.dumps(entry) + '\n')
+
+    report = asyncio.run(replay(parameters, trace, options.speed))
+    print_report(report)
+    if options.json:
+        with open(options.json, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import bisect
+
+
+class PrefixIndex:
+    """Names kept in a sorted array, so the names starting with a prefix are one binary search away."""
+
+    def __init__(self):
+        # (case folded name, value), sorted
+        self.keys = []
+        # value -> name as it is shown
+        self.names = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name: str, value):
+        self.remove(value)
+        bisect.insort(self.keys, (name.casefold(), value))
+        self.names[value] = name
+
+    def remove(self, value):
+        name = self.names.pop(value, None)
+        if name is None:
+            return
+        del self.keys[bisect.bisect_left(self.keys, (name.casefold(), value))]
+
+    def search(self, prefix: str, limit: int = 25, check=None):
+        """Returns up to limit (name, value) pairs whose name starts with the prefix, skipping values check rejects."""
+        prefix = prefix.casefold()
+        results = []
+        position = bisect.bisect_left(self.keys, (prefix,))
+        while position < len(self.keys) and len(results) < limit:
+            key, value = self.keys[position]
+            if not key.startswith(prefix):
+                break
+            if check is None or check(value):
+                results.append((self.names[value], value))
+            position += 1
+        return results
+
+
+class GuildNames:
+    """Prefix indexes over the hierarchy names and tier role names of one guild."""
+
+    def __init__(self, guild, server_json):
+        self.guild = guild
+        self.server_json = server_json
+        self.hierarchies = PrefixIndex()
+        self.tiers = PrefixIndex()
+        for hierarchy_name, hierarchy_json in server_json['hierarchies'].items():
+            self.add_hierarchy(hierarchy_name, hierarchy_json)
+
+    def role_name(self, role_id):
+        role = self.guild.get_role(role_id)
+        # Tiers whose role was deleted can still be removed by ID
+        return role.name if role is not None else str(role_id)
+
+    def add_hierarchy(self, hierarchy_name, hierarchy_json):
+        self.hierarchies.add(hierarchy_name, hierarchy_name)
+        for tier in hierarchy_json.tiers:
+            self.tiers.add(self.role_name(tier.role_id), tier.role_id)
+
+    def apply(self, mutation):
+        """Updates the indexes for a mutation that was just applied to the server document."""
+        op = mutation['op']
+        if op == 'create_hierarchy':
+            self.add_hierarchy(mutation['hierarchy'], self.server_json['hierarchies'][mutation['hierarchy']])
+        elif op == 'delete_hierarchy':
+            self.hierarchies.remove(mutation['hierarchy'])
+            # The roles of the hierarchy are already gone from the document
+            for role_id in [role_id for role_id in self.tiers.names if str(role_id) not in self.server_json['roles']]:
+                self.tiers.remove(role_id)
+        elif op == 'add_tier':
+            self.tiers.add(self.role_name(mutation['tier']['role_id']), mutation['tier']['role_id'])
+        elif op == 'remove_tier':
+            self.tiers.remove(mutation['role_id'])
+
+    def rename_role(self, role_id, name: str):
+        if role_id in self.tiers.names:
+            self.tiers.add(name, role_id)
+
+
+class AutocompleteIndex:
+    """Per-guild name indexes for slash command autocomplete, built on first use and kept up to date by mutations."""
+
+    # Discord shows at most this many choices
+    limit = 25
+
+    def __init__(self):
+        self.guilds = {}
+
+    def get(self, guild, server_json):
+        names = self.guilds.get(str(guild.id))
+        # A reloaded document may have been changed outside of this process
+        if names is None or names.server_json is not server_json:
+            names = self.guilds[str(guild.id)] = GuildNames(guild, server_json)
+        return names
+
+    def apply(self, server_id, server_json, mutation):
+        names = self.guilds.get(str(server_id))
+        if names is not None and names.server_json is server_json:
+            names.apply(mutation)
+
+    def rename_role(self, server_id, role_id, name: str):
+        """Tier names are read from Discord when they are indexed, so renamed roles have to be indexed again."""
+        names = self.guilds.get(str(server_id))
+        if names is not None:
+            names.rename_role(role_id, name)
+
+    def evict(self, server_id):
+        self.guilds.pop(str(server_id), None)
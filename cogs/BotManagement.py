@@ -1,80 +1,278 @@
-import discord
-# pip install -U discord.py
-from discord.ext import commands
-# pip install -U discord-py-slash-command
-from discord_slash import SlashCommand, SlashContext, cog_ext
-from discord_slash.utils.manage_commands import create_option
-from discord.ext.commands import Cog, command, has_permissions, MissingPermissions
-from os import path
-from cogs.CoreManagement import Core, ApplicationCommandOptionType
-
-class BotManagement(commands.Cog):
-    """Commands for managing the Hierarchies bot."""
-    _instance = None
-
-    def __new__(cls, bot):
-        if cls._instance is None:
-            cls._instance = super(BotManagement, cls).__new__(cls)
-            # Put any initialization here.
-        return cls._instance
-
-    def __init__(self, bot):
-        self.bot = bot
-        self._last_member = None
-
-    """
-
-    setlogger
-
-    """
-    @cog_ext.cog_slash(name="setlogger", description="Sets the channel that Hierarchies commands will be logged to.",
-        options=[
-          create_option(name="channel", description="The channel for logging", option_type=ApplicationCommandOptionType.CHANNEL, required=True)
-        ]
-    )
-    async def _setlogger(self, ctx: SlashContext, *, channel: discord.TextChannel):
-        await self.setlogger(ctx=ctx, channel=channel)
-
-    @commands.command(pass_context=True)
-    @has_permissions(manage_roles=True)
-    async def setlogger(self, ctx: discord.ext.commands.Context, channel: discord.TextChannel):
-        """Sets the channel that Hierarchies commands will be logged to."""
-
-        server_id = ctx.message.guild.id
-        Core.lock_server_file(server_id)
-        server_json = Core.get_server_json(server_id)
-
-        server_json['log_channel'] = channel.id
-
-        Core.save_server_file(server_id, server_json)
-        Core.unlock_server_file(server_id)
-
-        # Can only log setCore.logger to console, not Discord
-        print(f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) ran `setCore.logger` <#{channel.mention}.')
-        return await ctx.send(f'Set Core.logger channel to {channel.mention}.')
-
-    """
-
-    unlock
-
-    """
-    @cog_ext.cog_slash(name="unlock", description="Unlocks the mutex file if the bot crashes during a Hierarchies command.")
-    async def _unlock(self, ctx: SlashContext):
-        await self.unlock(ctx=ctx)
-
-    @commands.command(pass_context=True)
-    @has_permissions(manage_roles=True)
-    async def unlock(self, ctx: discord.ext.commands.Context):
-        """Unlocks the mutex file if the bot crashes during a Hierarchies command."""
-
-        server_id = ctx.message.guild.id
-        if path.isfile(str(server_id) + '.lck'):
-            Core.unlock_server_file(server_id)
-            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator})' +
-                         ' successfully ran `unlock`.')
-            return await ctx.send('Server file unlocked.')
-        else:
-            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator})' +
-                         ' unsuccessfully ran `unlock`.')
-            return await ctx.send('Server file was not locked.')
-
+import discord
+# pip install -U discord.py
+from discord.ext import commands
+# pip install -U discord-py-slash-command
+from discord_slash import SlashCommand, SlashContext, cog_ext
+from discord_slash.utils.manage_commands import create_option
+from discord.ext.commands import Cog, command, has_permissions, MissingPermissions
+from discord.http import Route
+from os import path
+from cogs.CoreManagement import Core, ApplicationCommandOptionType
+from cogs.Metrics import current_command
+
+class BotManagement(commands.Cog):
+    """Commands for managing the Hierarchies bot."""
+    _instance = None
+
+    def __new__(cls, bot):
+        if cls._instance is None:
+            cls._instance = super(BotManagement, cls).__new__(cls)
+            # Put any initialization here.
+        return cls._instance
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._last_member = None
+
+    """
+
+    setlogger
+
+    """
+    @cog_ext.cog_slash(name="setlogger", description="Sets the channel that Hierarchies commands will be logged to.",
+        options=[
+          create_option(name="channel", description="The channel for logging", option_type=ApplicationCommandOptionType.CHANNEL, required=True)
+        ]
+    )
+    async def _setlogger(self, ctx: SlashContext, *, channel: discord.TextChannel):
+        await self.setlogger(ctx=ctx, channel=channel)
+
+    @commands.command(pass_context=True)
+    @has_permissions(manage_roles=True)
+    async def setlogger(self, ctx: discord.ext.commands.Context, channel: discord.TextChannel):
+        """Sets the channel that Hierarchies commands will be logged to."""
+
+        server_id = ctx.message.guild.id
+        async with Core.hold_server_file(server_id):
+            server_json = await Core.get_server_json(server_id)
+
+            await Core.commit_mutation(server_id, server_json, {
+                'op': 'set_log_channel',
+                'channel_id': channel.id
+            })
+
+        # Can only log setCore.logger to console, not Discord
+        print(f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) ran `setCore.logger` <#{channel.mention}.')
+        return await ctx.send(f'Set Core.logger channel to {channel.mention}.')
+
+    """
+
+    unlock
+
+    """
+    @cog_ext.cog_slash(name="unlock", description="Removes the server lock file if a Hierarchies process crashed while holding it.")
+    async def _unlock(self, ctx: SlashContext):
+        await self.unlock(ctx=ctx)
+
+    @commands.command(pass_context=True)
+    @has_permissions(manage_roles=True)
+    async def unlock(self, ctx: discord.ext.commands.Context):
+        """Removes the server lock file if a Hierarchies process crashed while holding it."""
+
+        server_id = ctx.message.guild.id
+        if Core.unlock_server_file(server_id):
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator})' +
+                         ' successfully ran `unlock`.')
+            return await ctx.send('Server file unlocked.')
+        elif Core.locks.is_locked(server_id):
+            # Commands always release their lock when they end, taking it from them would let two edit at once
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator})' +
+                         ' ran `unlock` while a command was editing the server.')
+            return await ctx.send('A command is still editing this server, the lock is released when it finishes.')
+        else:
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator})' +
+                         ' unsuccessfully ran `unlock`.')
+            return await ctx.send('Server file was not locked.')
+
+    """
+
+    stats
+
+    """
+    @cog_ext.cog_slash(name="stats", description="Shows where Hierarchies commands spend their time.")
+    async def _stats(self, ctx: SlashContext):
+        await self.stats(ctx=ctx)
+
+    @commands.command(pass_context=True)
+    @has_permissions(manage_roles=True)
+    async def stats(self, ctx: discord.ext.commands.Context):
+        """Shows where Hierarchies commands spend their time."""
+
+        metrics = Core.get_metrics()
+        retval = f'**Command timings** (average / p95 ms) over {metrics["uptime"] / 3600:.1f} hours:\n'
+        for command_name, phases in sorted(metrics['timings'].items()):
+            runs = phases['total']['count'] if 'total' in phases else max(phase['count'] for phase in phases.values())
+            retval += f'`{command_name}` {runs} runs: ' + ', '.join(
+                f'{phase_name} {phase["average"]:.1f} / {phase["p95"]:.0f}' for phase_name, phase in sorted(phases.items())) + '\n'
+
+        cache = metrics['cache']
+        lookups = cache['hits'] + cache['misses']
+        retval += f'**Server cache:** {cache["hits"]} hits, {cache["misses"]} misses' + \
+            f' ({100 * cache["hits"] / lookups if lookups else 0:.1f}% hit rate), {cache["size"]}/{cache["capacity"]} servers\n'
+
+        warm_up = metrics['warm_up']
+        if warm_up['guilds'] > 0:
+            retval += f'**Warm-up:** {warm_up["loaded"] + warm_up["skipped"] + warm_up["failed"]}/{warm_up["guilds"]} servers' + \
+                (f' in {warm_up["seconds"]:.1f} seconds' if warm_up['done'] else ' so far') + f', {warm_up["failed"]} failed\n'
+
+        locks = metrics['locks']
+        retval += f'**Locks:** {locks["acquired"]} acquired, wait {locks["wait_average"] * 1000:.1f} ms average' + \
+            f' / {locks["wait_max"] * 1000:.1f} ms max, {locks["timeouts"]} timeouts, {locks["held"]} held, {locks["queued"]} queued\n'
+
+        log_queue = metrics['log_queue']
+        retval += f'**Log queue:** {log_queue["lines"]} lines in {log_queue["messages"]} messages, {log_queue["coalesced"]} repeats coalesced, {log_queue["queued"]} queued, {log_queue["dropped"]} dropped, {log_queue["errors"]} errors\n'
+
+        scheduler = metrics['scheduler']
+        if scheduler['enabled']:
+            retval += '**Request queue:** ' + ', '.join(
+                f'{name} {stats["requests"]} sent, {scheduler["queued"][name]} queued (max {stats["queued_max"]}), wait {stats["wait_average"] * 1000:.1f} / {stats["wait_max"] * 1000:.0f} ms'
+                for name, stats in scheduler['priorities'].items()) + '\n'
+
+        api_calls = sorted(((count, name[4:]) for name, count in metrics['counters'].items() if name.startswith('api ')), reverse=True)
+        retval += f'**Discord API:** {sum(count for count, name in api_calls)} calls\n'
+        for count, name in api_calls:
+            line = f'`{name}` {count}\n'
+            # Stay under Discord's 2000 character message limit
+            if len(retval) + len(line) > 1900:
+                break
+            retval += line
+        return await ctx.send(retval[:2000])
+
+    """
+
+    autocomplete
+
+    """
+    @Cog.listener()
+    async def on_socket_response(self, msg):
+        """Answers slash command autocomplete interactions, which discord_slash does not handle, and passes member updates to the lean member cache."""
+        if msg['t'] == 'GUILD_MEMBER_UPDATE':
+            return await self.lean_member_update(msg['d'])
+        if msg['t'] != 'INTERACTION_CREATE' or msg['d']['type'] != 4:
+            return
+        current_command.set('autocomplete')
+        interaction = msg['d']
+        choices = []
+        with Core.metrics.timer('total'):
+            guild = self.bot.get_guild(int(interaction['guild_id'])) if 'guild_id' in interaction else None
+            focused = next((option for option in interaction['data'].get('options', []) if option.get('focused')), None)
+            if guild is not None and focused is not None:
+                role_ids = [int(role_id) for role_id in interaction['member']['roles']]
+                choices = await Core.get_autocomplete_choices(guild, interaction['data']['name'], focused['name'], str(focused['value']), role_ids)
+            # 8 is the autocomplete result response, choice names are limited to 100 characters
+            await self.bot.http.request(
+                Route('POST', '/interactions/{interaction_id}/{interaction_token}/callback', interaction_id=interaction['id'], interaction_token=interaction['token']),
+                json={'type': 8, 'data': {'choices': [{'name': name[:100], 'value': str(value)} for name, value in choices]}})
+
+    """
+
+    memory
+
+    """
+    @cog_ext.cog_slash(name="memory", description="Shows how much memory Hierarchies uses, for this server and in total.")
+    async def _memory(self, ctx: SlashContext):
+        await self.memory(ctx=ctx)
+
+    @commands.command(pass_context=True)
+    @has_permissions(manage_roles=True)
+    async def memory(self, ctx: discord.ext.commands.Context):
+        """Shows how much memory Hierarchies uses, for this server and in total."""
+
+        report = Core.get_memory_report(self.bot)
+        resident = f'{report["resident"] / 1048576:.1f} MB' if report['resident'] is not None else 'unknown'
+        lean = report['lean_member_cache']
+        retval = f'**Resident memory:** {resident} for {len(report["guilds"])} servers\n'
+        if lean['enabled']:
+            retval += f'**Lean member cache:** {lean["kept"]} kept, {lean["dropped"]} dropped, {lean["fetched"]} fetched in {lean["syncs"]} syncs\n'
+        else:
+            retval += '**Lean member cache:** off, every member is cached\n'
+
+        members = sum(guild['members'] for guild in report['guilds'])
+        estimated = sum(guild['members_bytes'] + guild['roles_bytes'] + guild['server_bytes'] for guild in report['guilds'])
+        retval += f'**All servers:** {members} members cached, about {estimated / 1048576:.1f} MB of members, roles and hierarchies\n'
+        for guild in report['guilds']:
+            if guild['guild_id'] == ctx.guild.id:
+                retval += f'**This server:** {guild["members"]} of {guild["member_count"]} members cached, ' + \
+                    f'members {guild["members_bytes"] / 1024:.0f} KB, roles {guild["roles_bytes"] / 1024:.0f} KB, hierarchies {guild["server_bytes"] / 1024:.0f} KB\n'
+        return await ctx.send(retval)
+
+    """
+
+    role events
+
+    """
+    @Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        # Splices the deleted role out of its hierarchy like ^remove, so commands never meet a tier without a role
+        server_id = role.guild.id
+        # Most deleted roles are not tiers, answer from the cache before locking or loading anything
+        cached = Core.server_cache.get(str(server_id))
+        if cached is not None:
+            if str(role.id) not in cached[1]['roles']:
+                return
+        # Servers without a server file have no tiers, and loading them would create one
+        elif not await Core.run_storage(Core.storage.has_guild, server_id) or str(role.id) not in await Core.get_roles_lookup(server_id):
+            return
+        current_command.set('role_event')
+        async with Core.hold_server_file(server_id):
+            server_json = await Core.get_server_json(server_id)
+            hierarchy_name = server_json['roles'].get(str(role.id))
+            if hierarchy_name not in server_json['hierarchies']:
+                return
+            tier = Core.get_hierarchy_index(server_id, server_json, hierarchy_name).tier(role.id)
+            if tier is None:
+                return
+            if tier.parent_role_id == 0:
+                message = f'Role {role.name} ({role.id}) was deleted, but it is the root tier of hierarchy `{hierarchy_name}`. Delete and recreate the hierarchy.'
+            else:
+                await Core.commit_mutation(server_id, server_json, {
+                    'op': 'remove_tier',
+                    'hierarchy': hierarchy_name,
+                    'role_id': role.id
+                })
+                message = f'Role {role.name} ({role.id}) was deleted, removed it from hierarchy `{hierarchy_name}`.'
+        try:
+            await Core.log_server(self.bot, server_id, message)
+        except Exception as exception:
+            print(f'Could not log to server {server_id}: {exception}')
+
+    @Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        # Autocomplete shows tiers by the name they had when they were indexed
+        if before.name != after.name:
+            Core.autocomplete.rename_role(after.guild.id, after.id, after.name)
+
+    """
+
+    member events
+
+    """
+    @Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before._roles != after._roles:
+            Core.tier_members.update(after, before._roles)
+        # Drops cached members that lost their last tier
+        if Core.member_cache.enabled:
+            Core.member_cache.update(after, await Core.get_roles_lookup(after.guild.id))
+
+    @Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        Core.tier_members.update(member)
+
+    @Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        Core.tier_members.remove_member(member)
+
+    async def lean_member_update(self, data):
+        """Caches members that were not cached when they gained a tier, discord.py ignores their updates."""
+        if not Core.member_cache.enabled:
+            return
+        guild = self.bot.get_guild(int(data['guild_id']))
+        if guild is None or guild.get_member(int(data['user']['id'])) is not None:
+            return
+        roles_lookup = await Core.get_roles_lookup(guild.id)
+        if any(role_id in roles_lookup for role_id in data['roles']):
+            member = discord.Member(data=data, guild=guild, state=guild._state)
+            Core.member_cache.update(member, roles_lookup)
+            # Members that were not cached held no tiers
+            Core.tier_members.update(member)
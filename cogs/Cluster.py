@@ -0,0 +1,33 @@
+import os
+
+# Set by launcher.py for every cluster process it starts
+SHARD_COUNT_VARIABLE = 'HIERARCHIES_SHARD_COUNT'
+SHARD_IDS_VARIABLE = 'HIERARCHIES_SHARD_IDS'
+CLUSTER_NAME_VARIABLE = 'HIERARCHIES_CLUSTER'
+
+
+def shard_of(guild_id, shard_count: int) -> int:
+    """The shard Discord sends a guild's events to."""
+    return (int(guild_id) >> 22) % shard_count
+
+
+def split_shards(shard_count: int, clusters: int):
+    """Divides the shard IDs into contiguous slices, one per cluster process."""
+    clusters = max(1, min(clusters, shard_count))
+    return [list(range(shard_count * index // clusters, shard_count * (index + 1) // clusters)) for index in range(clusters)]
+
+
+def cluster_environment(shard_count: int, shard_ids: list, cluster_name: str):
+    return {
+        SHARD_COUNT_VARIABLE: str(shard_count),
+        SHARD_IDS_VARIABLE: ','.join(str(shard_id) for shard_id in shard_ids),
+        CLUSTER_NAME_VARIABLE: cluster_name,
+    }
+
+
+def read_cluster_environment():
+    """Returns (shard count, shard IDs, cluster name) of this process, all None when it was not started by launcher.py."""
+    if SHARD_COUNT_VARIABLE not in os.environ:
+        return None, None, None
+    shard_ids = [int(shard_id) for shard_id in os.environ.get(SHARD_IDS_VARIABLE, '').split(',') if shard_id]
+    return int(os.environ[SHARD_COUNT_VARIABLE]), shard_ids or None, os.environ.get(CLUSTER_NAME_VARIABLE)
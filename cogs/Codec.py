@@ -0,0 +1,128 @@
+#
+# Encodings for server snapshot files. Every file written by a codec starts with a header line,
+#
+# #hierarchies 1 orjson
+#
+# naming the format version and the codec of the rest of the file. Files without a header are
+# the indented JSON written by older versions and are read with the standard library.
+#
+import json
+
+from cogs.Model import to_json
+
+HEADER_PREFIX = b'#hierarchies '
+FORMAT_VERSION = 1
+# Tier fields are integers, the allow flags booleans or missing
+TIER_VALUE_TYPES = frozenset((int, bool, type(None)))
+
+
+class JsonCodec:
+    """Minified JSON through the standard library, always available."""
+
+    name = 'json'
+
+    def encode(self, server_json) -> bytes:
+        return json.dumps(server_json, separators=(',', ':'), default=to_json).encode('utf-8')
+
+    def decode(self, contents: bytes):
+        return json.loads(contents)
+
+
+class OrjsonCodec:
+    """Minified JSON through orjson, several times faster than the standard library."""
+
+    name = 'orjson'
+
+    def __init__(self):
+        # pip3 install orjson
+        import orjson
+        self.orjson = orjson
+
+    def encode(self, server_json) -> bytes:
+        return self.orjson.dumps(server_json, default=to_json)
+
+    def decode(self, contents: bytes):
+        return self.orjson.loads(contents)
+
+
+class MsgpackCodec:
+    """MessagePack, the smallest files."""
+
+    name = 'msgpack'
+
+    def __init__(self):
+        # pip3 install msgpack
+        import msgpack
+        self.msgpack = msgpack
+
+    def encode(self, server_json) -> bytes:
+        return self.msgpack.packb(server_json, default=to_json)
+
+    def decode(self, contents: bytes):
+        return self.msgpack.unpackb(contents, raw=False, strict_map_key=False)
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, OrjsonCodec, MsgpackCodec)}
+# Tried in this order for 'auto'
+PREFERRED_CODECS = ('orjson', 'msgpack', 'json')
+
+
+def create_codec(name: str = 'auto'):
+    """Creates the named codec, or for 'auto' the fastest one whose library is installed."""
+    if name == 'auto':
+        for preferred in PREFERRED_CODECS:
+            try:
+                return CODECS[preferred]()
+            except ImportError:
+                pass
+    if name not in CODECS:
+        raise Exception(f'Unknown server file codec `{name}`, use one of: auto, {", ".join(CODECS)}.')
+    return CODECS[name]()
+
+
+def encode_server_file(codec, server_json) -> bytes:
+    return HEADER_PREFIX + f'{FORMAT_VERSION} {codec.name}\n'.encode('ascii') + codec.encode(server_json)
+
+
+def decode_server_file(contents: bytes):
+    """Returns the validated server document and the name of the codec it was written with, None for old indented files."""
+    if contents.startswith(HEADER_PREFIX):
+        header, _, body = contents.partition(b'\n')
+        try:
+            version, codec_name = header[len(HEADER_PREFIX):].decode('ascii').split()
+            version = int(version)
+        except ValueError:
+            raise Exception(f'Server file header `{header[:64]!r}` is malformed.')
+        if version > FORMAT_VERSION:
+            raise Exception(f'Server file format {version} is newer than the supported format {FORMAT_VERSION}, update the bot.')
+        try:
+            codec = create_codec(codec_name)
+        except ImportError:
+            raise Exception(f'Server file was written with {codec_name}, which is not installed. Run pip3 install {codec_name}.')
+        server_json = codec.decode(body)
+    else:
+        codec_name = None
+        server_json = json.loads(contents) if contents.strip() else {}
+    validate_server_json(server_json)
+    return server_json, codec_name
+
+
+def validate_server_json(server_json):
+    """Checks the shape of a decoded server document, so a damaged file fails on load instead of in a command."""
+    if not isinstance(server_json, dict):
+        raise Exception(f'Server file holds a {type(server_json).__name__} instead of an object.')
+    hierarchies = server_json.get('hierarchies', {})
+    if not isinstance(hierarchies, dict):
+        raise Exception('Server file hierarchies are not an object.')
+    for hierarchy_name, hierarchy_json in hierarchies.items():
+        if not isinstance(hierarchy_json, dict) or not isinstance(hierarchy_json.get('tiers', []), list):
+            raise Exception(f'Hierarchy `{hierarchy_name}` in the server file has no tier list.')
+        for tier_json in hierarchy_json.get('tiers', []):
+            if type(tier_json) is not dict or type(tier_json.get('role_id')) is not int or type(tier_json.get('parent_role_id')) is not int:
+                raise Exception(f'Hierarchy `{hierarchy_name}` in the server file has a tier without a role ID and parent role ID: {tier_json!r}')
+            # Checking the types of all values at once is much faster than one field at a time
+            if not TIER_VALUE_TYPES.issuperset(map(type, tier_json.values())):
+                raise Exception(f'Tier {tier_json["role_id"]} in hierarchy `{hierarchy_name}` has a value that is not an integer: {tier_json!r}')
+    roles = server_json.get('roles', {})
+    if not isinstance(roles, dict) or not {str}.issuperset(map(type, roles.values())):
+        raise Exception('Server file role lookup does not map roles to hierarchy names.')
@@ -1,99 +1,602 @@
-import sys
-import traceback
-import discord
-from discord.ext import commands
-import os.path
-from os import path
-
-from pathlib import Path
-import json
-from discord_token import token
-from typing import Union
-
-import importlib
-
-
-class ApplicationCommandOptionType:
-    SUB_COMMAND = 1
-    SUB_COMMAND_GROUP = 2
-    STRING = 3
-    INTEGER = 4
-    BOOLEAN = 5
-    USER = 6
-    CHANNEL = 7
-    ROLE = 8
-    MENTIONABLE = 9
-
-
-class Core:
-    """Core static methods for management of the bot."""
-
-    @staticmethod
-    def lock_server_file(server_id):
-        if path.isfile('./servers/' + str(server_id) + '.lck'):
-            raise Exception('Server file is currently locked.')
-
-        Path('./servers/' + str(server_id) + '.lck').touch()
-
-    @staticmethod
-    def get_server_json(server_id):
-        if path.isfile('./servers/' + str(server_id) + '.json'):
-            contents = Path('./servers/' + str(server_id) + '.json').read_text()
-            server_json = json.loads(contents)
-            if 'hierarchies' not in server_json:
-                server_json['hierarchies'] = {}
-            if 'roles' not in server_json:
-                server_json['roles'] = {}
-            if 'channels' not in server_json:
-                server_json['channels'] = {'log': None}
-            return server_json
-        else:
-            Path('./servers/' + str(server_id) + '.json').touch()
-            server_json = {
-                'hierarchies': {},
-                'roles': {},
-                'channels': {'log': None}
-            }
-            return server_json
-
-    @staticmethod
-    def save_server_file(server_id, server_json):
-        if 'hierarchies' not in server_json:
-            server_json['hierarchies'] = {}
-        if 'roles' not in server_json:
-            server_json['roles'] = {}
-        if 'channels' not in server_json:
-            server_json['channels'] = {'log': None}
-        contents = json.dumps(server_json, indent=4)
-        with open('./servers/' + str(server_id) + '.json', "w") as json_file:
-            json_file.write(contents)
-
-    @staticmethod
-    def unlock_server_file(server_id):
-        if path.isfile('./servers/' + str(server_id) + '.lck'):
-            os.remove('./servers/' + str(server_id) + '.lck')
-
-    @staticmethod
-    async def logger(bot, ctx, message: str):
-        print(message)
-        server_id = ctx.message.guild.id
-        server_json = Core.get_server_json(server_id)
-
-        if 'log_channel' not in server_json:
-            raise Exception('Must use `setCore.logger` to set log channel.')
-
-        channel = bot.get_channel(server_json['log_channel'])
-        if channel is None:
-            raise Exception('No logging channel set.')
-
-        return await channel.send(message)
-
-    #@staticmethod
-    #def has_manage_roles():
-    #    async def predicate(ctx):
-    #        if ctx.author and hasattr(ctx.author, 'guild_permissions') and ctx.author.guild_permissions.manage_roles is True:
-    #            return True
-    #        else:
-    #            raise NoManageRoles('You must have the Manage Roles permission to create, delete, and modify hierarchies.')
-    #    return commands.check(predicate)
-
+import sys
+import time
+import traceback
+import asyncio
+import discord
+from discord.ext import commands
+import os.path
+from os import path
+
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+from discord_token import token
+from typing import Union
+
+import importlib
+from discord_slash.model import ButtonStyle
+from discord_slash.utils import manage_components
+from discord_slash.utils.manage_commands import create_option
+
+from cogs.Autocomplete import AutocompleteIndex
+from cogs.Cluster import shard_of
+from cogs.HierarchyIndex import HierarchyIndex
+from cogs.LockManager import LockManager
+from cogs.LogQueue import LogQueue
+from cogs.MemberCache import LeanMemberCache, TierMemberIndex, guild_memory, resident_memory
+from cogs.Metrics import Metrics
+from cogs.Mutations import apply_mutation
+from cogs.Scheduler import RequestScheduler
+from cogs.Storage import create_storage, find_tier
+
+
+class ApplicationCommandOptionType:
+    SUB_COMMAND = 1
+    SUB_COMMAND_GROUP = 2
+    STRING = 3
+    INTEGER = 4
+    BOOLEAN = 5
+    USER = 6
+    CHANNEL = 7
+    ROLE = 8
+    MENTIONABLE = 9
+
+
+def create_autocomplete_option(name: str, description: str, required: bool):
+    """A STRING option that suggests values while typing, answered by Core.get_autocomplete_choices."""
+    return dict(create_option(name=name, description=description, option_type=ApplicationCommandOptionType.STRING, required=required), autocomplete=True)
+
+
+class Core:
+    """Core static methods for management of the bot."""
+
+    # Writers for the same guild wait for each other instead of failing
+    locks = LockManager()
+
+    @staticmethod
+    async def lock_server_file(server_id):
+        with Core.metrics.timer('lock'):
+            return await Core.locks.acquire(server_id)
+
+    @staticmethod
+    def hold_server_file(server_id):
+        """async with Core.hold_server_file(server_id) as lock: releases the lock however the block ends."""
+        return Core.locks.hold(server_id, Core.lock_server_file)
+
+    # Phase timings and counters reported by ^stats and dumped to metrics_file
+    metrics = Metrics()
+    metrics_file = './metrics.json'
+
+    # Log lines are sent to the log channel in batches by a background task per guild
+    log_queue = LogQueue()
+
+    # Orders outbound REST requests by priority and keeps them within the known rate limits
+    scheduler = RequestScheduler(metrics=metrics)
+
+    # Enabled by Hierarchies.py in lean member cache mode
+    member_cache = LeanMemberCache()
+    # Tier role ID -> member IDs of every guild that was queried, kept current by BotManagement's member listeners
+    tier_members = TierMemberIndex()
+
+    # Hierarchy and tier names for slash command autocomplete
+    autocomplete = AutocompleteIndex()
+    # (command, option) -> names the option is completed from
+    autocomplete_options = {
+        ('show', 'HierarchyName'): 'hierarchies',
+        ('delete', 'HierarchyName'): 'hierarchies',
+        ('remove', 'Tier'): 'tiers',
+        ('promote', 'Tier'): 'tiers',
+        ('assign', 'Tier'): 'tiers',
+        ('demote', 'Tier'): 'tiers',
+        ('unassign', 'Tier'): 'tiers',
+        ('members', 'Tier'): 'tiers',
+        ('census', 'HierarchyName'): 'hierarchies',
+    }
+
+    # Where server files are kept, see custom/DatabaseConfig.py.stub.
+    # Set by open_storage when the bot starts, so importing Core does not open files or connect to a database.
+    storage = None
+
+    # Set by join_cluster when launcher.py runs this process as one of several clusters
+    cluster_name = None
+    shard_count = None
+    shard_ids = None
+
+    # Resident per-guild state, least recently used first.
+    # Each entry is (storage version, server document, compiled hierarchy indexes).
+    server_cache = OrderedDict()
+    server_cache_size = 512
+    server_cache_hits = 0
+    server_cache_misses = 0
+    compactions_pending = set()
+    # Storage calls of a guild running on a thread, str(server_id) -> future.
+    # Loads may write the guild's files too (new, migrated or torn journal), so one guild's files are only used by one thread at a time.
+    storage_in_flight = {}
+    # Progress of the startup warm-up
+    warm_up_stats = {
+        'guilds': 0,
+        'loaded': 0,
+        'skipped': 0,
+        'failed': 0,
+        'seconds': 0.0,
+        'done': False,
+    }
+
+    @staticmethod
+    def open_storage():
+        """Creates the storage backend configured in custom/DatabaseConfig.py, unless one is already set."""
+        if Core.storage is None:
+            Core.storage = create_storage()
+        return Core.storage
+
+    @staticmethod
+    async def run_storage(method, *args):
+        """Calls a storage method, on the storage executor if it would block the event loop."""
+        if not Core.storage.blocking:
+            return method(*args)
+        return await asyncio.get_event_loop().run_in_executor(Core.storage.executor, method, *args)
+
+    @staticmethod
+    async def get_storage_version(server_id):
+        if Core.storage.version_on_loop:
+            return Core.storage.get_version(server_id)
+        return await Core.run_storage(Core.storage.get_version, server_id)
+
+    @staticmethod
+    def start_guild_storage(server_id, executor, method, *args):
+        """Runs a storage method for a guild on the executor, and records it in storage_in_flight until the thread is done."""
+        future = asyncio.get_event_loop().run_in_executor(executor, method, *args)
+        Core.storage_in_flight[str(server_id)] = future
+        future.add_done_callback(lambda _: Core.storage_in_flight.pop(str(server_id), None))
+        return future
+
+    @staticmethod
+    async def wait_for_guild_storage(server_id):
+        """Waits until no thread is using the guild's storage, without raising what that call raised."""
+        while str(server_id) in Core.storage_in_flight:
+            await asyncio.wait([Core.storage_in_flight[str(server_id)]])
+
+    @staticmethod
+    async def run_guild_storage(server_id, method, *args):
+        """Calls a storage method that reads or writes the guild's files, after any such call that is still running."""
+        await Core.wait_for_guild_storage(server_id)
+        if not Core.storage.blocking:
+            return method(*args)
+        # Shielded, so a cancelled command does not forget a thread that is still writing
+        return await asyncio.shield(Core.start_guild_storage(server_id, Core.storage.executor, method, *args))
+
+    @staticmethod
+    def join_cluster(cluster_name: str, shard_count: int, shard_ids: list):
+        """Prepares this process to run next to the other cluster processes that share its storage.
+
+        Discord sends each guild to exactly one shard, so a process only caches and locks its own guilds.
+        The lock files cover the moment two processes overlap while a cluster restarts."""
+        Core.cluster_name = cluster_name
+        Core.shard_count = shard_count
+        Core.shard_ids = set(shard_ids) if shard_ids is not None else None
+        Core.locks.shared_store = True
+        # Each process writes its own metrics
+        root, extension = os.path.splitext(Core.metrics_file)
+        Core.metrics_file = f'{root}-{cluster_name}{extension}'
+
+    @staticmethod
+    def owns_guild(server_id) -> bool:
+        if Core.shard_count is None or Core.shard_ids is None:
+            return True
+        return shard_of(server_id, Core.shard_count) in Core.shard_ids
+
+    @staticmethod
+    def cache_server_json(server_id, server_json, version, indexes=None):
+        # Guilds of other shards belong to another process, do not keep their state here
+        if not Core.owns_guild(server_id):
+            Core.evict_server_json(server_id)
+            return
+        cached = Core.server_cache.get(str(server_id))
+        if cached is not None and cached[1] is server_json:
+            indexes = cached[2]
+        elif indexes is None:
+            indexes = {name: HierarchyIndex(hierarchy_json) for name, hierarchy_json in server_json['hierarchies'].items()}
+        Core.server_cache[str(server_id)] = (version, server_json, indexes)
+        Core.server_cache.move_to_end(str(server_id))
+        while len(Core.server_cache) > Core.server_cache_size:
+            Core.server_cache.popitem(last=False)
+
+    @staticmethod
+    def load_compiled_server_json(server_id):
+        """Loads a server document and compiles its hierarchy indexes, on a warm-up thread. Returns None if nothing is stored."""
+        if not Core.storage.has_guild(server_id):
+            return None
+        version = Core.storage.get_version(server_id)
+        server_json = Core.storage.load_guild(server_id)
+        return version, server_json, {name: HierarchyIndex(hierarchy_json) for name, hierarchy_json in server_json['hierarchies'].items()}
+
+    @staticmethod
+    async def warm_up(guild_ids, workers: int = 4):
+        """Loads and compiles the state of the given guilds in the background, so their first commands find it cached.
+
+        Commands never wait for the warm-up: guilds they loaded or locked first are skipped, and the
+        warm-up leaves a thread of a blocking backend free, so commands that arrive meanwhile load right away."""
+        started = time.perf_counter()
+        # Only as many guilds as the cache holds, the caller passes the busiest first
+        guild_ids = list(guild_ids)[:Core.server_cache_size]
+        stats = Core.warm_up_stats = dict(Core.warm_up_stats, guilds=len(guild_ids), loaded=0, skipped=0, failed=0, seconds=0.0, done=False)
+        executor = None
+        if Core.storage.blocking:
+            executor = Core.storage.executor
+            workers = max(1, min(workers, getattr(Core.storage, 'pool_size', workers + 1) - 1))
+        elif Core.storage.thread_safe:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warm-up')
+        else:
+            # Loads share one connection, so they run on the event loop one at a time
+            workers = 1
+        semaphore = asyncio.Semaphore(workers)
+        print(f'Warming up {len(guild_ids)} servers with {workers} workers.')
+
+        async def load(server_id):
+            """Returns loaded, skipped or failed."""
+            if str(server_id) in Core.server_cache or Core.locks.is_locked(server_id) or str(server_id) in Core.storage_in_flight:
+                return 'skipped'
+            # Holding the lock keeps writers of this guild out while a thread reads its files,
+            # and read-only commands wait for the load in storage_in_flight instead of loading it a second time
+            generation = await Core.locks.acquire(server_id)
+            try:
+                if executor is not None:
+                    loaded = await Core.start_guild_storage(server_id, executor, Core.load_compiled_server_json, server_id)
+                else:
+                    loaded = Core.load_compiled_server_json(server_id)
+                    await asyncio.sleep(0)
+                if loaded is None or str(server_id) in Core.server_cache:
+                    return 'skipped'
+                Core.cache_server_json(server_id, loaded[1], loaded[0], loaded[2])
+                return 'loaded'
+            finally:
+                Core.locks.release(server_id, generation)
+
+        async def warm_up_guild(server_id):
+            async with semaphore:
+                try:
+                    stats[await load(server_id)] += 1
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f'Could not warm up server {server_id}: {e}', file=sys.stderr)
+            finished = stats['loaded'] + stats['skipped'] + stats['failed']
+            if finished * 10 // len(guild_ids) != (finished - 1) * 10 // len(guild_ids):
+                print(f'Warmed up {finished}/{len(guild_ids)} servers in {time.perf_counter() - started:.1f} seconds.')
+
+        try:
+            await asyncio.gather(*[warm_up_guild(server_id) for server_id in guild_ids])
+        finally:
+            if executor is not None and not Core.storage.blocking:
+                executor.shutdown(wait=False)
+        stats['seconds'] = time.perf_counter() - started
+        stats['done'] = True
+        print(f'Warm-up finished in {stats["seconds"]:.1f} seconds: {stats["loaded"]} loaded, {stats["skipped"]} skipped, {stats["failed"]} failed.')
+
+    @staticmethod
+    def evict_server_json(server_id):
+        Core.server_cache.pop(str(server_id), None)
+        Core.autocomplete.evict(server_id)
+
+    @staticmethod
+    def get_cache_stats():
+        return {
+            'hits': Core.server_cache_hits,
+            'misses': Core.server_cache_misses,
+            'size': len(Core.server_cache),
+            'capacity': Core.server_cache_size
+        }
+
+    @staticmethod
+    async def get_server_json(server_id):
+        with Core.metrics.timer('load'):
+            # The warm-up caches the guild when its thread is done
+            await Core.wait_for_guild_storage(server_id)
+            cached = Core.server_cache.get(str(server_id))
+            # The storage version catches edits made outside of this process, e.g. a hand-edited or restored server file
+            version = await Core.get_storage_version(server_id)
+            if cached is not None and cached[0] == version:
+                Core.server_cache.move_to_end(str(server_id))
+                Core.server_cache_hits += 1
+                return cached[1]
+            Core.server_cache_misses += 1
+
+            # The version is read before loading, so a concurrent edit at worst causes one extra reload
+            server_json = await Core.run_guild_storage(server_id, Core.storage.load_guild, server_id)
+            Core.cache_server_json(server_id, server_json, version)
+            return server_json
+
+    @staticmethod
+    def get_hierarchy_index(server_id, server_json, hierarchy_name):
+        """Returns the compiled index of a hierarchy in a server document from get_server_json."""
+        cached = Core.server_cache.get(str(server_id))
+        if cached is None or cached[1] is not server_json:
+            # The document was evicted while the command was using it
+            return HierarchyIndex(server_json['hierarchies'][hierarchy_name])
+        if hierarchy_name not in cached[2]:
+            cached[2][hierarchy_name] = HierarchyIndex(server_json['hierarchies'][hierarchy_name])
+        return cached[2][hierarchy_name]
+
+    @staticmethod
+    def update_hierarchy_index(server_id, server_json, mutation):
+        cached = Core.server_cache.get(str(server_id))
+        if cached is None or cached[1] is not server_json or 'hierarchy' not in mutation:
+            return
+        if mutation['op'] == 'delete_hierarchy':
+            cached[2].pop(mutation['hierarchy'], None)
+        elif mutation['hierarchy'] in cached[2] and cached[2][mutation['hierarchy']].hierarchy_json is server_json['hierarchies'][mutation['hierarchy']]:
+            if mutation['op'] == 'modify_tier':
+                # Usually only the depth ranges changed, update_tier rebuilds if the tier moved
+                cached[2][mutation['hierarchy']].update_tier(mutation['role_id'])
+            else:
+                cached[2][mutation['hierarchy']].rebuild()
+        else:
+            cached[2][mutation['hierarchy']] = HierarchyIndex(server_json['hierarchies'][mutation['hierarchy']])
+
+    @staticmethod
+    async def get_tier_by_role(server_id, role_id):
+        """Returns the hierarchy name and tier for a role, or None, None if the role is not in a hierarchy."""
+        if str(server_id) not in Core.server_cache:
+            return await Core.run_guild_storage(server_id, Core.storage.get_tier_by_role, server_id, role_id)
+        server_json = await Core.get_server_json(server_id)
+        if str(role_id) not in server_json['roles'] or server_json['roles'][str(role_id)] not in server_json['hierarchies']:
+            return find_tier(server_json, role_id)
+        hierarchy_name = server_json['roles'][str(role_id)]
+        return hierarchy_name, Core.get_hierarchy_index(server_id, server_json, hierarchy_name).tier(int(role_id))
+
+    @staticmethod
+    async def get_roles_lookup(server_id):
+        """The role ID -> hierarchy name lookup of a server, from the cache without checking storage if it is there."""
+        cached = Core.server_cache.get(str(server_id))
+        if cached is not None:
+            return cached[1]['roles']
+        return (await Core.get_server_json(server_id))['roles']
+
+    @staticmethod
+    async def get_tier_members(guild):
+        """The tier role ID -> member IDs index of a guild, built from the member cache the first time it is needed."""
+        roles_lookup = await Core.get_roles_lookup(guild.id)
+        tier_members = Core.tier_members.get(guild.id)
+        # Tiers added by another process show up as a different number of tiers
+        if tier_members is None or len(tier_members) != len(roles_lookup):
+            if Core.member_cache.enabled:
+                await Core.member_cache.sync_guild(guild, roles_lookup)
+            tier_members = Core.tier_members.build(guild, roles_lookup)
+        return tier_members
+
+    @staticmethod
+    async def get_tier_member_ids(guild, role_id):
+        """IDs of the members holding a tier, empty if the role is not a tier."""
+        return (await Core.get_tier_members(guild)).get(int(role_id), set())
+
+    @staticmethod
+    async def get_role_members(guild, role):
+        """Every member holding the role, including members the lean member cache does not keep."""
+        if str(role.id) in await Core.get_roles_lookup(guild.id):
+            member_ids = await Core.get_tier_member_ids(guild, role.id)
+            return [member for member in map(guild.get_member, sorted(member_ids)) if member is not None]
+        if not Core.member_cache.enabled:
+            return role.members
+        return await Core.member_cache.members_with_role(guild, role)
+
+    @staticmethod
+    async def list_hierarchies(server_id):
+        if str(server_id) not in Core.server_cache:
+            return await Core.run_guild_storage(server_id, Core.storage.list_hierarchies, server_id)
+        return list((await Core.get_server_json(server_id))['hierarchies'])
+
+    @staticmethod
+    async def commit_mutation(server_id, server_json, mutation):
+        """Applies a mutation to the cached server document and persists it.
+
+        The caller must hold the server lock."""
+        with Core.metrics.timer('storage'):
+            # The compiled index finds tiers in the tier list without scanning it
+            cached = Core.server_cache.get(str(server_id))
+            index = cached[2].get(mutation.get('hierarchy')) if cached is not None and cached[1] is server_json else None
+            changed_tiers = apply_mutation(server_json, mutation, index.positions if index is not None else None)
+            Core.update_hierarchy_index(server_id, server_json, mutation)
+            Core.autocomplete.apply(server_id, server_json, mutation)
+            Core.tier_members.apply(server_id, server_json['roles'], mutation)
+            if mutation['op'] == 'create_hierarchy' or mutation['op'] == 'add_tier':
+                Core.member_cache.invalidate(server_id)
+            try:
+                version = await Core.run_guild_storage(server_id, Core.storage.apply_mutation, server_id, server_json, mutation, changed_tiers)
+                if version is None:
+                    version = await Core.get_storage_version(server_id)
+            except Exception:
+                # Never serve a cached document that did not make it to storage
+                Core.evict_server_json(server_id)
+                raise
+            Core.cache_server_json(server_id, server_json, version)
+            if mutation['op'] == 'set_log_channel':
+                Core.log_queue.channels[str(server_id)] = mutation['channel_id']
+
+            if Core.storage.needs_compaction(server_id):
+                Core.schedule_compaction(server_id)
+
+    @staticmethod
+    def schedule_compaction(server_id):
+        if str(server_id) in Core.compactions_pending:
+            return
+        Core.compactions_pending.add(str(server_id))
+        asyncio.ensure_future(Core.compact_server_file(server_id))
+
+    @staticmethod
+    async def compact_server_file(server_id):
+        """Folds the journal into a new snapshot of the server file."""
+        async with Core.hold_server_file(server_id):
+            Core.compactions_pending.discard(str(server_id))
+            server_json = await Core.get_server_json(server_id)
+            await Core.run_guild_storage(server_id, Core.storage.compact, server_id, server_json)
+            Core.cache_server_json(server_id, server_json, await Core.get_storage_version(server_id))
+
+    @staticmethod
+    async def compaction_loop(interval: float = 300):
+        """Periodically compacts every journal that has mutations in it."""
+        while True:
+            await asyncio.sleep(interval)
+            for server_id in Core.storage.pending_compactions():
+                try:
+                    await Core.compact_server_file(server_id)
+                except Exception as e:
+                    print(f'Could not compact server file {server_id}: {e}', file=sys.stderr)
+
+    @staticmethod
+    def get_role_from_option(guild, value: str):
+        """Resolves an autocompleted role option, which holds the role ID if a suggestion was picked and the typed name otherwise."""
+        if value.isdigit() and guild.get_role(int(value)) is not None:
+            return guild.get_role(int(value))
+        return discord.utils.get(guild.roles, name=value)
+
+    @staticmethod
+    async def get_autocomplete_choices(guild, command: str, option: str, prefix: str, role_ids: list):
+        """Returns (name, value) pairs for an autocompleted slash command option.
+
+        Tiers of player commands are limited to the ones members with the given roles may use the command on."""
+        kind = Core.autocomplete_options.get((command, option))
+        if kind is None:
+            return []
+        server_json = await Core.get_server_json(guild.id)
+        names = Core.autocomplete.get(guild, server_json)
+        if kind == 'hierarchies':
+            return names.hierarchies.search(prefix, Core.autocomplete.limit)
+        if command == 'remove' or command == 'members':
+            return names.tiers.search(prefix, Core.autocomplete.limit)
+
+        # One permission mask per hierarchy covers every tier the roles may act on
+        masks = {}
+
+        def allowed(role_id):
+            hierarchy_name = server_json['roles'].get(str(role_id))
+            if hierarchy_name is None:
+                return False
+            hierarchy = Core.get_hierarchy_index(guild.id, server_json, hierarchy_name)
+            if hierarchy_name not in masks:
+                masks[hierarchy_name] = hierarchy.permission_mask(command, role_ids)
+            return (masks[hierarchy_name] >> hierarchy.positions[role_id]) & 1 == 1
+        return names.tiers.search(prefix, Core.autocomplete.limit, allowed)
+
+    @staticmethod
+    def get_memory_report(bot):
+        """Resident memory of the process and an estimate for every guild, largest first."""
+        guilds = []
+        for guild in bot.guilds:
+            cached = Core.server_cache.get(str(guild.id))
+            guilds.append(dict(guild_memory(guild, cached[1] if cached is not None else None), guild_id=guild.id))
+        guilds.sort(key=lambda guild: guild['members_bytes'] + guild['roles_bytes'] + guild['server_bytes'], reverse=True)
+        return {
+            'resident': resident_memory(),
+            'lean_member_cache': dict(Core.member_cache.stats, enabled=Core.member_cache.enabled),
+            'guilds': guilds,
+        }
+
+    @staticmethod
+    def get_metrics():
+        return Core.metrics.snapshot(
+            cache=Core.get_cache_stats(),
+            locks=Core.get_lock_stats(),
+            log_queue=Core.log_queue.get_stats(),
+            scheduler=Core.scheduler.get_stats(),
+            warm_up=dict(Core.warm_up_stats),
+        )
+
+    @staticmethod
+    async def metrics_loop(interval: float = 60):
+        """Periodically writes the metrics to metrics_file, so they survive restarts and can be compared."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                Core.metrics.dump(Core.metrics_file, Core.get_metrics())
+            except Exception as e:
+                print(f'Could not write metrics file {Core.metrics_file}: {e}', file=sys.stderr)
+
+    @staticmethod
+    async def save_server_file(server_id, server_json):
+        """Writes the full server document, replacing whatever is stored."""
+        try:
+            version = await Core.run_guild_storage(server_id, Core.storage.save_guild, server_id, server_json)
+            if version is None:
+                version = await Core.get_storage_version(server_id)
+        except Exception:
+            # Never serve a cached document that did not make it to storage
+            Core.evict_server_json(server_id)
+            raise
+        Core.cache_server_json(server_id, server_json, version)
+
+    @staticmethod
+    def unlock_server_file(server_id):
+        """Removes a lock file that a crashed cluster process left behind."""
+        return Core.locks.clear_lock_file(server_id)
+
+    @staticmethod
+    def get_lock_stats():
+        return Core.locks.get_stats()
+
+    @staticmethod
+    async def logger(bot, ctx, message: str):
+        """Queues a line for the guild's log channel and returns without waiting for it to be sent."""
+        return await Core.log_server(bot, ctx.message.guild.id, message)
+
+    @staticmethod
+    async def log_server(bot, server_id, message: str):
+        """Like logger, for messages that do not come from a command, e.g. gateway events."""
+        print(message)
+        channel_id = Core.log_queue.channels.get(str(server_id))
+        if channel_id is None:
+            server_json = await Core.get_server_json(server_id)
+
+            if 'log_channel' not in server_json:
+                raise Exception('Must use `setCore.logger` to set log channel.')
+            channel_id = server_json['log_channel']
+
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            raise Exception('No logging channel set.')
+        Core.log_queue.channels[str(server_id)] = channel_id
+
+        with Core.metrics.timer('log'):
+            return await Core.log_queue.put(bot, server_id, message)
+
+    @staticmethod
+    async def send_pages(bot, ctx, page_count: int, render_page, timeout: float = 300):
+        """Sends the first embed from render_page(index) with buttons to flip through the others.
+
+        Pages are only rendered when someone turns to them."""
+        if page_count <= 1:
+            return await ctx.send(embed=render_page(0))
+
+        def buttons(index):
+            return [manage_components.create_actionrow(
+                manage_components.create_button(style=ButtonStyle.grey, label='Previous', custom_id='previous', disabled=index == 0),
+                manage_components.create_button(style=ButtonStyle.grey, label='Next', custom_id='next', disabled=index == page_count - 1),
+            )]
+
+        async def turn_pages(message):
+            index = 0
+            while True:
+                try:
+                    button_ctx = await manage_components.wait_for_component(bot, messages=message, timeout=timeout)
+                except asyncio.TimeoutError:
+                    try:
+                        await message.edit(components=[])
+                    except discord.HTTPException:
+                        pass
+                    return
+                index = min(index + 1, page_count - 1) if button_ctx.custom_id == 'next' else max(index - 1, 0)
+                await button_ctx.edit_origin(embed=render_page(index), components=buttons(index))
+
+        message = await ctx.send(embed=render_page(0), components=buttons(0))
+        # The command returns right away, the buttons keep working until they time out
+        bot.loop.create_task(turn_pages(message))
+        return message
+
+    #@staticmethod
+    #def has_manage_roles():
+    #    async def predicate(ctx):
+    #        if ctx.author and hasattr(ctx.author, 'guild_permissions') and ctx.author.guild_permissions.manage_roles is True:
+    #            return True
+    #        else:
+    #            raise NoManageRoles('You must have the Manage Roles permission to create, delete, and modify hierarchies.')
+    #    return commands.check(predicate)
+
@@ -0,0 +1,112 @@
+# Promote and assign share the promotion depths, demote and unassign the demotion depths
+PERMISSION_COMMANDS = (('promotion', ('promote', 'assign')), ('demotion', ('demote', 'unassign')))
+
+
+class HierarchyIndex:
+    """Lookups compiled from the flat tier list of one hierarchy, so commands never scan the tiers."""
+
+    def __init__(self, hierarchy_json):
+        self.hierarchy_json = hierarchy_json
+        self.rebuild()
+
+    def rebuild(self):
+        """Recompiles every lookup from the tier list. The tier list must already be in tree order."""
+        # Anything derived from the tiers that commands want to keep until the hierarchy changes, e.g. rendered pages
+        self.cache = {}
+        self.tiers_by_role = {}
+        self.children_by_parent = {}
+        self.subtree_sizes = {}
+        # Bit i of a permission mask stands for the tier at position i of the tier list
+        self.positions = {}
+        self.depth_masks = {}
+        for position, tier in enumerate(self.hierarchy_json.tiers):
+            self.tiers_by_role[tier.role_id] = tier
+            self.children_by_parent.setdefault(tier.parent_role_id, []).append(tier)
+            self.positions[tier.role_id] = position
+            self.depth_masks[tier.depth] = self.depth_masks.get(tier.depth, 0) | (1 << position)
+
+        # Children always come after their parent in tree order, so walk backwards to sum subtrees
+        for tier in reversed(self.hierarchy_json.tiers):
+            self.subtree_sizes[tier.role_id] = self.subtree_sizes.get(tier.role_id, 0) + 1
+            if tier.parent_role_id in self.tiers_by_role:
+                self.subtree_sizes[tier.parent_role_id] = \
+                    self.subtree_sizes.get(tier.parent_role_id, 0) + self.subtree_sizes[tier.role_id]
+
+        # For every command, the tiers each tier may move members to or from
+        self.maximum_depth = max(self.depth_masks) if self.depth_masks else 0
+        self.permission_masks = {}
+        for key_prefix, commands in PERMISSION_COMMANDS:
+            masks = {tier.role_id: self._permission_mask(tier, key_prefix) for tier in self.hierarchy_json.tiers}
+            for command in commands:
+                self.permission_masks[command] = masks
+
+    def _permission_mask(self, tier, key_prefix):
+        minimum = tier[key_prefix + '_min_depth']
+        maximum = tier[key_prefix + '_max_depth']
+        mask = 0
+        # -1 means the tier cannot promote or demote at all
+        if minimum != -1 and maximum != -1:
+            for depth in range(max(tier.depth + minimum, 0), min(tier.depth + maximum, self.maximum_depth) + 1):
+                mask |= self.depth_masks.get(depth, 0)
+        return mask
+
+    def update_tier(self, role_id):
+        """Recompiles one tier after a change that kept its place in the tree, e.g. new depth ranges.
+
+        Falls back to a rebuild if the tier moved. Adding, moving or removing a tier shifts the positions
+        behind it, which every permission mask is made of, so those changes always rebuild."""
+        tier = self.tiers_by_role.get(role_id)
+        position = self.positions.get(role_id)
+        tiers = self.hierarchy_json.tiers
+        if tier is None or position >= len(tiers) or tiers[position] is not tier \
+                or not any(child is tier for child in self.children(tier.parent_role_id)):
+            return self.rebuild()
+        self.cache = {}
+        for key_prefix, commands in PERMISSION_COMMANDS:
+            # Commands of one key prefix share their masks
+            self.permission_masks[commands[0]][role_id] = self._permission_mask(tier, key_prefix)
+
+    def __contains__(self, role_id):
+        return role_id in self.tiers_by_role
+
+    def __len__(self):
+        return len(self.tiers_by_role)
+
+    def tier(self, role_id):
+        return self.tiers_by_role.get(role_id)
+
+    def children(self, role_id):
+        return self.children_by_parent.get(role_id, [])
+
+    def depth(self, role_id):
+        return self.tiers_by_role[role_id]['depth']
+
+    def subtree_size(self, role_id):
+        """Number of tiers at or below this tier."""
+        return self.subtree_sizes.get(role_id, 0)
+
+    def is_below(self, role_id, ancestor_role_id):
+        """Whether the tier is the given ancestor or sits somewhere in its subtree."""
+        tier = self.tiers_by_role.get(role_id)
+        while tier is not None:
+            if tier.role_id == ancestor_role_id:
+                return True
+            tier = self.tiers_by_role.get(tier.parent_role_id)
+        return False
+
+    def can(self, command, actor_role_id, target_role_id):
+        """Whether members of the actor tier may use the command on the target tier."""
+        if target_role_id not in self.positions:
+            return False
+        return (self.permission_masks[command].get(actor_role_id, 0) >> self.positions[target_role_id]) & 1 == 1
+
+    def permission_mask(self, command, actor_role_ids):
+        """Every tier that any of the actor tiers may use the command on, as one bitset over the tier list."""
+        mask = 0
+        for role_id in actor_role_ids:
+            mask |= self.permission_masks[command].get(role_id, 0)
+        return mask
+
+    def tiers_of(self, roles):
+        """Returns the tiers for the given Discord roles that belong to this hierarchy."""
+        return [self.tiers_by_role[role.id] for role in roles if role.id in self.tiers_by_role]
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, fall back to exclusively creating the lock file
+    fcntl = None
+
+
+class LockHold:
+    """Holds a server lock for an async with block and releases it when the block ends, even if it raises.
+
+    release() lets go of the lock early, e.g. before replying. It passes on the generation of this hold's
+    acquisition, so it never releases an acquisition that came after it."""
+
+    def __init__(self, acquire, release, server_id):
+        self._acquire = acquire
+        self._release = release
+        self.server_id = server_id
+        self.generation = None
+
+    @property
+    def held(self):
+        return self.generation is not None
+
+    async def __aenter__(self):
+        self.generation = await self._acquire(self.server_id)
+        return self
+
+    def release(self):
+        if self.generation is not None:
+            generation, self.generation = self.generation, None
+            self._release(self.server_id, generation)
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self.release()
+
+
+class LockManager:
+    """Per-guild locks that queue writers in FIFO order instead of rejecting them."""
+
+    def __init__(self, timeout: float = 10.0, shared_store: bool = False, poll_interval: float = 0.05):
+        # Seconds a writer will wait in the queue before giving up
+        self.timeout = timeout
+        # Set when several processes share ./servers, adds a file lock on top of the asyncio lock
+        self.shared_store = shared_store
+        self.poll_interval = poll_interval
+        self._locks = {}
+        self._acquired_at = {}
+        # Counts the acquisitions of each guild's lock, release only accepts the current one
+        self._generations = {}
+        self._lock_files = {}
+        self.stats = {
+            'acquired': 0,
+            'timeouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'hold_total': 0.0,
+            'hold_max': 0.0,
+        }
+
+    def _lock(self, server_id) -> asyncio.Lock:
+        key = str(server_id)
+        if key not in self._locks:
+            # asyncio.Lock hands itself to the longest waiting coroutine first
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    def _lock_file_path(self, server_id):
+        return './servers/' + str(server_id) + '.lck'
+
+    def is_locked(self, server_id) -> bool:
+        lock = self._locks.get(str(server_id))
+        return lock is not None and lock.locked()
+
+    def waiting(self, server_id) -> int:
+        lock = self._locks.get(str(server_id))
+        if lock is None or lock._waiters is None:
+            return 0
+        return len(lock._waiters)
+
+    async def acquire(self, server_id) -> int:
+        """Waits for the guild's lock. Returns the generation of this acquisition, which release needs."""
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        lock = self._lock(server_id)
+        try:
+            await asyncio.wait_for(lock.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise Exception('Timed out waiting for the server file lock, another command is still editing this server.')
+
+        if self.shared_store:
+            try:
+                await self._acquire_file(server_id, deadline)
+            except BaseException:
+                lock.release()
+                raise
+
+        acquired = time.perf_counter()
+        waited = acquired - started
+        self._acquired_at[str(server_id)] = acquired
+        self.stats['acquired'] += 1
+        self.stats['wait_total'] += waited
+        self.stats['wait_max'] = max(self.stats['wait_max'], waited)
+        generation = self._generations[str(server_id)] = self._generations.get(str(server_id), 0) + 1
+        return generation
+
+    async def _acquire_file(self, server_id, deadline):
+        file_path = self._lock_file_path(server_id)
+        while True:
+            if fcntl is not None:
+                # flock is released by the OS if the process dies, so a crash cannot leave the guild locked
+                lock_file = open(file_path, 'a')
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    self._lock_files[str(server_id)] = lock_file
+                    return
+                except BlockingIOError:
+                    lock_file.close()
+            else:
+                try:
+                    os.close(os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    self._lock_files[str(server_id)] = None
+                    return
+                except FileExistsError:
+                    pass
+
+            if time.perf_counter() >= deadline:
+                self.stats['timeouts'] += 1
+                raise Exception('Server file is currently locked by another process. Use `unlock` if that process crashed.')
+            await asyncio.sleep(self.poll_interval)
+
+    def _release_file(self, server_id):
+        if str(server_id) not in self._lock_files:
+            return
+        lock_file = self._lock_files.pop(str(server_id))
+        if lock_file is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+        elif os.path.isfile(self._lock_file_path(server_id)):
+            os.remove(self._lock_file_path(server_id))
+
+    def release(self, server_id, generation: int) -> bool:
+        """Releases the lock for a guild if generation is still its current acquisition. Returns False otherwise."""
+        lock = self._locks.get(str(server_id))
+        if lock is None or not lock.locked() or self._generations.get(str(server_id)) != generation:
+            return False
+
+        self._release_file(server_id)
+        acquired = self._acquired_at.pop(str(server_id), None)
+        if acquired is not None:
+            held = time.perf_counter() - acquired
+            self.stats['hold_total'] += held
+            self.stats['hold_max'] = max(self.stats['hold_max'], held)
+        lock.release()
+        return True
+
+    def clear_lock_file(self, server_id) -> bool:
+        """Removes the lock file a crashed process left behind. Returns False if there was none.
+
+        Locks held in this process are released by their own commands, and flock is released when its process dies,
+        so only the exclusively created lock files of systems without flock can be orphaned."""
+        if not self.shared_store or fcntl is not None or str(server_id) in self._lock_files:
+            return False
+        if not os.path.isfile(self._lock_file_path(server_id)):
+            return False
+        os.remove(self._lock_file_path(server_id))
+        return True
+
+    def hold(self, server_id, acquire=None) -> LockHold:
+        """Lock for an async with block, acquire replaces self.acquire, e.g. to time the wait."""
+        return LockHold(acquire or self.acquire, self.release, server_id)
+
+    def get_stats(self):
+        acquired = self.stats['acquired']
+        return dict(self.stats,
+            wait_average=self.stats['wait_total'] / acquired if acquired else 0.0,
+            hold_average=self.stats['hold_total'] / acquired if acquired else 0.0,
+            held=sum(1 for lock in self._locks.values() if lock.locked()),
+            queued=sum(len(lock._waiters) for lock in self._locks.values() if lock._waiters),
+        )
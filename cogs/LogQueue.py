@@ -0,0 +1,122 @@
+import asyncio
+import sys
+
+from cogs.Metrics import current_command
+
+
+class LogQueue:
+    """Per-guild queues that batch log lines into as few log channel messages as possible."""
+
+    # Discord rejects messages longer than this
+    message_limit = 2000
+
+    def __init__(self, flush_interval: float = 2.0, max_size: int = 1000):
+        # Seconds to keep collecting lines after the first one arrives
+        self.flush_interval = flush_interval
+        # Lines a guild may have waiting, later lines are dropped until the sender catches up
+        self.max_size = max_size
+        # Log channel ID of every guild that has logged, so logging never has to load the server file
+        self.channels = {}
+        self._queues = {}
+        self._tasks = {}
+        # Lines dropped per guild since its last batch
+        self._dropped = {}
+        self.stats = {
+            'lines': 0,
+            'messages': 0,
+            'errors': 0,
+            'dropped': 0,
+            'coalesced': 0,
+        }
+
+    async def put(self, bot, server_id, message: str):
+        key = str(server_id)
+        if key not in self._queues:
+            self._queues[key] = asyncio.Queue(self.max_size)
+        queue = self._queues[key]
+        if key not in self._tasks or self._tasks[key].done():
+            self._tasks[key] = bot.loop.create_task(self._sender(bot, key, queue))
+        if queue.full():
+            # The log channel is rate limited and log messages go last, waiting here would hold up the command
+            self.stats['dropped'] += 1
+            self._dropped[key] = self._dropped.get(key, 0) + 1
+            return
+        queue.put_nowait(message)
+        self.stats['lines'] += 1
+
+    def _take_batch(self, key, queue, lines):
+        while not queue.empty():
+            lines.append(queue.get_nowait())
+        dropped = self._dropped.pop(key, 0)
+        if dropped:
+            lines.append(f'{dropped} log lines were dropped because the log channel could not keep up. They are still in the bot\'s output.')
+        return lines
+
+    def _coalesce(self, lines):
+        """Collapses repeats of a line in a batch into its first occurrence, with the number of times it was logged."""
+        counts = {}
+        for line in lines:
+            counts[line] = counts.get(line, 0) + 1
+        self.stats['coalesced'] += len(lines) - len(counts)
+        return [line if count == 1 else f'{line} (x{count})' for line, count in counts.items()]
+
+    def _pack(self, lines):
+        """Joins lines into messages that fit the message limit, splitting lines that are too long by themselves."""
+        messages = []
+        current = ''
+        for line in lines:
+            while len(line) > self.message_limit:
+                if current:
+                    messages.append(current)
+                    current = ''
+                messages.append(line[:self.message_limit])
+                line = line[self.message_limit:]
+            if current and len(current) + 1 + len(line) > self.message_limit:
+                messages.append(current)
+                current = ''
+            current = current + '\n' + line if current else line
+        if current:
+            messages.append(current)
+        return messages
+
+    async def _sender(self, bot, key, queue):
+        # The task inherits the context of the command that started it, log messages are not part of that command
+        current_command.set('log_queue')
+        while True:
+            lines = [await queue.get()]
+            # Let the rest of the burst arrive, then send it all together
+            await asyncio.sleep(self.flush_interval)
+            self._take_batch(key, queue, lines)
+
+            channel = bot.get_channel(self.channels.get(key))
+            # Sending waits behind replies and role edits, so a saturated log channel makes the batches larger, not the queue
+            for message in self._pack(self._coalesce(lines)):
+                try:
+                    if channel is None:
+                        raise Exception('No logging channel set.')
+                    await channel.send(message)
+                    self.stats['messages'] += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f'Could not send log message for server {key}: {e}', file=sys.stderr)
+
+    async def flush(self, bot, server_id=None):
+        """Sends everything queued right away, for one guild or all of them."""
+        keys = [str(server_id)] if server_id is not None else list(self._queues)
+        for key in keys:
+            queue = self._queues.get(key)
+            if queue is None or queue.empty():
+                continue
+            lines = self._take_batch(key, queue, [])
+            channel = bot.get_channel(self.channels.get(key))
+            if channel is None:
+                continue
+            for message in self._pack(self._coalesce(lines)):
+                await channel.send(message)
+                self.stats['messages'] += 1
+
+    def get_stats(self):
+        return dict(self.stats,
+            queued=sum(queue.qsize() for queue in self._queues.values()),
+            guilds=len(self._queues),
+        )
@@ -0,0 +1,176 @@
+import os
+import sys
+
+
+class LeanMemberCache:
+    """Opt-in member cache that only keeps members holding a hierarchy role.
+
+    In lean mode the bot does not chunk guilds and discord.py caches no members by itself,
+    so this class adds the members worth keeping and drops them when they lose their last tier."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # Guilds whose hierarchy members have all been fetched, so Role.members is complete for tiers
+        self.synced = set()
+        self.stats = {
+            'kept': 0,
+            'dropped': 0,
+            'syncs': 0,
+            'fetched': 0,
+        }
+
+    @staticmethod
+    def holds_tier(member, roles_lookup) -> bool:
+        # Member._roles holds the role IDs, Member.roles would build a sorted list of Role objects
+        return any(str(role_id) in roles_lookup for role_id in member._roles)
+
+    def update(self, member, roles_lookup):
+        """Caches the member if it holds a hierarchy role, otherwise drops it from the cache."""
+        if not self.enabled:
+            return
+        guild = member.guild
+        cached = guild.get_member(member.id)
+        if self.holds_tier(member, roles_lookup):
+            if cached is None:
+                guild._add_member(member)
+                self.stats['kept'] += 1
+        elif cached is not None and (guild.me is None or member.id != guild.me.id):
+            guild._remove_member(cached)
+            self.stats['dropped'] += 1
+
+    def invalidate(self, server_id):
+        """New tiers may be held by members that were never cached, fetch them again when they are needed."""
+        self.synced.discard(int(server_id))
+
+    async def sync_guild(self, guild, roles_lookup):
+        """Fetches every member of the guild once, without caching them all, and keeps the hierarchy members."""
+        if guild.id in self.synced:
+            return
+        async for member in guild.fetch_members(limit=None):
+            self.stats['fetched'] += 1
+            self.update(member, roles_lookup)
+        self.synced.add(guild.id)
+        self.stats['syncs'] += 1
+
+    async def members_with_role(self, guild, role):
+        """Lists the holders of a role that is not a tier from the API. They are not cached, so they are not kept either."""
+        members = []
+        async for member in guild.fetch_members(limit=None):
+            self.stats['fetched'] += 1
+            if role.id in member._roles:
+                members.append(member)
+        return members
+
+
+class TierMemberIndex:
+    """Reverse index from tier role ID to the IDs of the members holding it, per guild.
+
+    Built from the member cache the first time a guild is queried and kept current from member events,
+    so listing or counting the members of a tier never scans every member of the guild."""
+
+    def __init__(self):
+        # guild ID -> {tier role ID -> set of member IDs}
+        self.guilds = {}
+
+    def get(self, guild_id):
+        return self.guilds.get(int(guild_id))
+
+    def build(self, guild, roles_lookup):
+        tier_members = {int(role_id): set() for role_id in roles_lookup}
+        for member in guild.members:
+            for role_id in member._roles:
+                holders = tier_members.get(role_id)
+                if holders is not None:
+                    holders.add(member.id)
+        self.guilds[guild.id] = tier_members
+        return tier_members
+
+    def update(self, member, old_role_ids=()):
+        """Moves the member between tiers after its roles changed from old_role_ids to its current roles."""
+        tier_members = self.guilds.get(member.guild.id)
+        if tier_members is None:
+            return
+        new_role_ids = set(member._roles)
+        for role_id in old_role_ids:
+            if role_id not in new_role_ids and role_id in tier_members:
+                tier_members[role_id].discard(member.id)
+        for role_id in new_role_ids:
+            if role_id in tier_members:
+                tier_members[role_id].add(member.id)
+
+    def remove_member(self, member):
+        tier_members = self.guilds.get(member.guild.id)
+        if tier_members is None:
+            return
+        for role_id in member._roles:
+            if role_id in tier_members:
+                tier_members[role_id].discard(member.id)
+
+    def apply(self, server_id, roles_lookup, mutation):
+        """Keeps the tiers of the index in step with a mutation that was just applied to the server document."""
+        tier_members = self.guilds.get(int(server_id))
+        if tier_members is None:
+            return
+        if mutation['op'] == 'create_hierarchy' or mutation['op'] == 'add_tier':
+            # Members may already hold the new tier's role, build the index again when it is next needed
+            self.evict(server_id)
+        elif mutation['op'] == 'remove_tier':
+            tier_members.pop(mutation['role_id'], None)
+        elif mutation['op'] == 'delete_hierarchy':
+            for role_id in [role_id for role_id in tier_members if str(role_id) not in roles_lookup]:
+                del tier_members[role_id]
+
+    def evict(self, server_id):
+        self.guilds.pop(int(server_id), None)
+
+
+def resident_memory():
+    """Resident set size of this process in bytes, None where it cannot be read."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak instead of current, in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def object_size(obj, seen=None, depth: int = 4) -> int:
+    """Approximate size of an object and what it references, without following references back to the guild or client."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth < 0 or type(obj).__name__ in ('Guild', 'ConnectionState', 'Client', 'Bot', 'AutoShardedBot'):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(object_size(key, seen, depth - 1) + object_size(value, seen, depth - 1) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(object_size(item, seen, depth - 1) for item in obj)
+    elif not isinstance(obj, (str, bytes, int, float)):
+        for cls in type(obj).__mro__:
+            slots = getattr(cls, '__slots__', ())
+            for slot in ((slots,) if isinstance(slots, str) else slots):
+                if slot != '__weakref__' and hasattr(obj, slot):
+                    size += object_size(getattr(obj, slot), seen, depth - 1)
+        if hasattr(obj, '__dict__'):
+            size += object_size(obj.__dict__, seen, depth - 1)
+    return size
+
+
+def guild_memory(guild, server_json=None, sample: int = 50):
+    """Estimates the memory a guild's cached members, roles and server document take, from a sample of the members."""
+    members = list(guild._members.values())
+    member_size = sum(object_size(member) for member in members[:sample]) / min(len(members), sample) if members else 0
+    return {
+        'members': len(members),
+        'member_count': guild.member_count,
+        'members_bytes': int(member_size * len(members)),
+        'roles_bytes': sum(object_size(role) for role in guild._roles.values()),
+        'server_bytes': object_size(server_json, depth=8) if server_json is not None else 0,
+    }
@@ -0,0 +1,112 @@
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Name of the command the current task is running, set by the bot's before_invoke hook
+current_command = contextvars.ContextVar('current_command', default='background')
+
+
+class Histogram:
+    """Latency histogram with fixed millisecond buckets, cheap enough to update on every call."""
+
+    bounds = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        # The last bucket counts everything slower than the largest bound
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, milliseconds: float):
+        index = 0
+        while index < len(self.bounds) and milliseconds > self.bounds[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket the given fraction of calls fall into."""
+        if self.count == 0:
+            return 0.0
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= fraction * self.count:
+                return float(self.bounds[index]) if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_json(self):
+        return {
+            'count': self.count,
+            'average': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'max': self.max,
+            'buckets': dict(zip([str(bound) for bound in self.bounds] + ['inf'], self.buckets)),
+        }
+
+
+class Metrics:
+    """Per-command phase timings and counters.
+
+    Phases are lock, load, resolve, decide, queue, api, reply, log and storage, plus total for the whole command."""
+
+    def __init__(self):
+        self.started = time.time()
+        # command -> phase -> Histogram
+        self.timings = {}
+        self.counters = {}
+
+    def observe(self, command: str, phase: str, seconds: float):
+        phases = self.timings.setdefault(command, {})
+        if phase not in phases:
+            phases[phase] = Histogram()
+        phases[phase].observe(seconds * 1000)
+
+    @contextmanager
+    def timer(self, phase: str):
+        """Times the block as a phase of the command the current task is running."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(current_command.get(), phase, time.perf_counter() - started)
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def instrument_http(self, http):
+        """Wraps discord.py's HTTP client so every REST call is counted by route and timed."""
+        if getattr(http, 'metrics_instrumented', False):
+            return
+        request = http.request
+
+        async def timed_request(route, **kwargs):
+            self.count(f'api {route.method} {route.path}')
+            # Within a command, posting a message is the reply, log lines are sent by the log queue
+            phase = 'reply' if route.method == 'POST' and route.path == '/channels/{channel_id}/messages' else 'api'
+            with self.timer(phase):
+                return await request(route, **kwargs)
+
+        http.request = timed_request
+        http.metrics_instrumented = True
+
+    def snapshot(self, **extra):
+        return dict(extra,
+            uptime=time.time() - self.started,
+            timings={command: {phase: histogram.to_json() for phase, histogram in phases.items()}
+                     for command, phases in self.timings.items()},
+            counters=dict(self.counters),
+        )
+
+    def dump(self, file_path: str, snapshot: dict):
+        """Writes a snapshot to file, replacing the previous one atomically."""
+        temporary_path = file_path + '.tmp'
+        with open(temporary_path, 'w') as metrics_file:
+            json.dump(snapshot, metrics_file, indent=4)
+        os.replace(temporary_path, file_path)
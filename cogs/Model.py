@@ -0,0 +1,112 @@
+#
+# In-memory form of the hierarchies in a server document. Storage converts them
+# from and to the stored JSON format with from_json and to_json, everything in
+# between works on these objects. Tiers can still be read and written like the
+# stored dicts, e.g. tier['promotion_min_depth'], for code that builds the key.
+#
+
+TIER_FIELDS = ('role_id', 'parent_role_id', 'depth',
+               'promotion_min_depth', 'promotion_max_depth',
+               'demotion_min_depth', 'demotion_max_depth',
+               'allow_promote_demote', 'allow_assign_unassign')
+
+
+class Tier:
+    """One role in a hierarchy. Slotted, so a tier costs a fraction of a nine key dict."""
+
+    __slots__ = TIER_FIELDS
+
+    def __init__(self, role_id: int, parent_role_id: int = 0, depth: int = 0,
+                 promotion_min_depth: int = -1, promotion_max_depth: int = -1,
+                 demotion_min_depth: int = -1, demotion_max_depth: int = -1,
+                 allow_promote_demote: bool = None, allow_assign_unassign: bool = None):
+        self.role_id = role_id
+        self.parent_role_id = parent_role_id
+        self.depth = depth
+        self.promotion_min_depth = promotion_min_depth
+        self.promotion_max_depth = promotion_max_depth
+        self.demotion_min_depth = demotion_min_depth
+        self.demotion_max_depth = demotion_max_depth
+        self.allow_promote_demote = allow_promote_demote
+        self.allow_assign_unassign = allow_assign_unassign
+
+    @classmethod
+    def from_json(cls, tier_json):
+        if isinstance(tier_json, Tier):
+            return tier_json.copy()
+        try:
+            return cls(**tier_json)
+        except TypeError:
+            # Keys that are not tier fields, like ones left behind by older versions, are dropped
+            return cls(**{field: tier_json[field] for field in TIER_FIELDS if field in tier_json})
+
+    def to_json(self):
+        # Tiers created before the allow flags existed keep not having them
+        return {field: getattr(self, field) for field in TIER_FIELDS if getattr(self, field) is not None}
+
+    def copy(self):
+        return Tier(*[getattr(self, field) for field in TIER_FIELDS])
+
+    def update(self, changes: dict):
+        for field, value in changes.items():
+            self[field] = value
+
+    def get(self, field: str, default=None):
+        return getattr(self, field, default) if field in TIER_FIELDS else default
+
+    def __getitem__(self, field: str):
+        if field not in TIER_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field: str, value):
+        if field not in TIER_FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __eq__(self, other):
+        return isinstance(other, Tier) and all(getattr(self, field) == getattr(other, field) for field in TIER_FIELDS)
+
+    def __repr__(self):
+        return f'<Tier role_id={self.role_id} parent_role_id={self.parent_role_id} depth={self.depth}>'
+
+
+class Hierarchy:
+    """The tiers of one hierarchy in tree order, every tier directly followed by its subtree."""
+
+    __slots__ = ('tiers', 'maximum_depth')
+
+    def __init__(self, tiers: list = None, maximum_depth: int = 0):
+        self.tiers = tiers if tiers is not None else []
+        self.maximum_depth = maximum_depth
+
+    @classmethod
+    def from_json(cls, hierarchy_json):
+        if isinstance(hierarchy_json, Hierarchy):
+            return hierarchy_json
+        return cls([Tier.from_json(tier_json) for tier_json in hierarchy_json.get('tiers', [])], hierarchy_json.get('maximum_depth', 0))
+
+    def to_json(self):
+        return {
+            'tiers': [tier.to_json() for tier in self.tiers],
+            'maximum_depth': self.maximum_depth
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, Hierarchy) and self.tiers == other.tiers and self.maximum_depth == other.maximum_depth
+
+    def __repr__(self):
+        return f'<Hierarchy tiers={len(self.tiers)} maximum_depth={self.maximum_depth}>'
+
+
+def load_hierarchies(server_json):
+    """Converts the hierarchies of a server document that was just read from storage."""
+    server_json['hierarchies'] = {name: Hierarchy.from_json(hierarchy_json) for name, hierarchy_json in server_json['hierarchies'].items()}
+    return server_json
+
+
+def to_json(obj):
+    """json.dumps default for server documents holding model objects."""
+    if isinstance(obj, (Tier, Hierarchy)):
+        return obj.to_json()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
@@ -0,0 +1,213 @@
+#
+# Every change to a server file is described by a small mutation record, e.g.
+# {'op': 'add_tier', 'hierarchy': 'staff', 'tier': {...}}
+# The same records are appended to the server journal and replayed on load,
+# so apply_mutation must be the only code that changes a server document.
+# Records hold plain JSON, apply_mutation turns their tiers into model objects.
+#
+from cogs.Model import Hierarchy, Tier
+
+
+def order_hierarchy_tiers(tiers, root_role_id=0):
+    """Returns the tiers in tree order, every tier directly followed by its subtree, and sets their depths.
+
+    Walks an adjacency list with an explicit stack, so it is O(T) and deep hierarchies cannot hit the recursion limit.
+    Tiers that are not connected to the root are dropped."""
+    children = {}
+    for tier in tiers:
+        children.setdefault(tier.parent_role_id, []).append(tier)
+    ordered = []
+    stack = [(tier, 0) for tier in reversed(children.get(root_role_id, []))]
+    while stack:
+        tier, depth = stack.pop()
+        tier.depth = depth
+        ordered.append(tier)
+        stack.extend((child, depth + 1) for child in reversed(children.get(tier.role_id, [])))
+    return ordered
+
+
+def update_hierarchy_depths(hierarchy_json):
+    """Re-sorts the tiers of a hierarchy and recalculates every depth and the maximum depth.
+
+    Returns the tiers whose depth changed."""
+    old_depths = {tier.role_id: tier.depth for tier in hierarchy_json.tiers}
+    hierarchy_json.tiers = order_hierarchy_tiers(hierarchy_json.tiers)
+    hierarchy_json.maximum_depth = 0
+    changed_tiers = []
+    for tier in hierarchy_json.tiers:
+        if tier.depth > hierarchy_json.maximum_depth:
+            hierarchy_json.maximum_depth = tier.depth
+        if old_depths[tier.role_id] != tier.depth:
+            changed_tiers.append(tier)
+    return changed_tiers
+
+
+#
+# The functions below keep a hierarchy that is already in tree order up to date
+# without re-sorting it. In tree order a subtree is the contiguous run of tiers
+# deeper than its root, so only that run has to be re-depthed.
+#
+
+
+def _tier_index(tiers, role_id, positions=None):
+    """Position of a tier in the tier list. positions is the lookup of a HierarchyIndex compiled before the change, if there is one."""
+    if positions is not None:
+        index = positions.get(role_id)
+        if index is not None and index < len(tiers) and tiers[index].role_id == role_id:
+            return index
+    for index, tier in enumerate(tiers):
+        if tier.role_id == role_id:
+            return index
+    return None
+
+
+def _subtree_end(tiers, index):
+    """Index just past the subtree rooted at tiers[index]."""
+    depth = tiers[index].depth
+    end = index + 1
+    while end < len(tiers) and tiers[end].depth > depth:
+        end += 1
+    return end
+
+
+def insert_tier(hierarchy_json, tier, positions=None):
+    """Adds a new leaf tier as the last child of its parent.
+
+    Returns the tiers whose depth changed."""
+    tiers = hierarchy_json.tiers
+    if tier.parent_role_id == 0:
+        tier.depth = 0
+        tiers.append(tier)
+    else:
+        parent_index = _tier_index(tiers, tier.parent_role_id, positions)
+        if parent_index is None:
+            raise Exception(f'Parent role {tier.parent_role_id} does not exist in the hierarchy.')
+        tier.depth = tiers[parent_index].depth + 1
+        tiers.insert(_subtree_end(tiers, parent_index), tier)
+    hierarchy_json.maximum_depth = max(hierarchy_json.maximum_depth, tier.depth)
+    return []
+
+
+def move_subtree(hierarchy_json, role_id, parent_role_id, positions=None):
+    """Re-parents a tier, moving its subtree to the end of the new parent's children.
+
+    Returns the tiers whose depth changed."""
+    tiers = hierarchy_json.tiers
+    start = _tier_index(tiers, role_id, positions)
+    if start is None:
+        raise Exception(f'Role {role_id} does not exist in the hierarchy.')
+    end = _subtree_end(tiers, start)
+    parent_index = _tier_index(tiers, parent_role_id, positions)
+    if parent_index is None:
+        raise Exception(f'Parent role {parent_role_id} does not exist in the hierarchy.')
+    if start <= parent_index < end:
+        raise Exception(f'Role {role_id} cannot be moved below itself.')
+
+    tiers[start].parent_role_id = parent_role_id
+    shift = tiers[parent_index].depth + 1 - tiers[start].depth
+    parent_end = _subtree_end(tiers, parent_index)
+    # Position of the parent's subtree end once the moved subtree has been taken out
+    insert_at = parent_end - (end - start) if end <= parent_end else parent_end
+
+    changed_tiers = []
+    moved = []
+    remaining = []
+    maximum_depth = 0
+    for index, tier in enumerate(tiers):
+        if start <= index < end:
+            if shift != 0:
+                tier.depth += shift
+                changed_tiers.append(tier)
+            moved.append(tier)
+        else:
+            remaining.append(tier)
+        if tier.depth > maximum_depth:
+            maximum_depth = tier.depth
+    hierarchy_json.tiers = remaining[:insert_at] + moved + remaining[insert_at:]
+    hierarchy_json.maximum_depth = maximum_depth
+    return changed_tiers
+
+
+def remove_tier(hierarchy_json, role_id, positions=None):
+    """Removes a tier and links its children to its parent, moving its subtree up one level.
+
+    Returns the tiers that were re-parented or whose depth changed."""
+    tiers = hierarchy_json.tiers
+    start = _tier_index(tiers, role_id, positions)
+    if start is None:
+        raise Exception(f'Role {role_id} does not exist in the hierarchy.')
+    end = _subtree_end(tiers, start)
+    parent_role_id = tiers[start].parent_role_id
+
+    changed_tiers = []
+    new_hierarchy = []
+    maximum_depth = 0
+    for index, tier in enumerate(tiers):
+        if index == start:
+            continue
+        if start < index < end:
+            if tier.parent_role_id == role_id:
+                tier.parent_role_id = parent_role_id
+            tier.depth -= 1
+            changed_tiers.append(tier)
+        if tier.depth > maximum_depth:
+            maximum_depth = tier.depth
+        new_hierarchy.append(tier)
+    hierarchy_json.tiers = new_hierarchy
+    hierarchy_json.maximum_depth = maximum_depth
+    return changed_tiers
+
+
+def apply_mutation(server_json, mutation, positions=None):
+    """Applies a single mutation record to a server document in place.
+
+    positions optionally maps role IDs to their place in the tier list of the mutated hierarchy, as compiled
+    by HierarchyIndex before the change. Returns the tiers that were created or changed, so storage backends can write only those."""
+    op = mutation['op']
+    changed_tiers = []
+
+    if op == 'create_hierarchy':
+        tier = Tier.from_json(mutation['tier'])
+        server_json['hierarchies'][mutation['hierarchy']] = Hierarchy([tier])
+        server_json['roles'][str(tier.role_id)] = mutation['hierarchy']
+        changed_tiers.append(tier)
+
+    elif op == 'delete_hierarchy':
+        del server_json['hierarchies'][mutation['hierarchy']]
+        for key in dict(server_json['roles']):
+            if server_json['roles'][key] == mutation['hierarchy']:
+                del server_json['roles'][key]
+
+    elif op == 'add_tier':
+        hierarchy_json = server_json['hierarchies'][mutation['hierarchy']]
+        tier = Tier.from_json(mutation['tier'])
+        changed_tiers += insert_tier(hierarchy_json, tier, positions)
+        server_json['roles'][str(tier.role_id)] = mutation['hierarchy']
+        changed_tiers.append(tier)
+
+    elif op == 'modify_tier':
+        hierarchy_json = server_json['hierarchies'][mutation['hierarchy']]
+        changes = dict(mutation['changes'])
+        parent_role_id = changes.pop('parent_role_id', None)
+        index = _tier_index(hierarchy_json.tiers, mutation['role_id'], positions)
+        if index is None:
+            raise Exception(f'Role {mutation["role_id"]} does not exist in hierarchy {mutation["hierarchy"]}.')
+        tier = hierarchy_json.tiers[index]
+        # Only a new parent moves the tier, the depth ranges can be updated in place
+        if parent_role_id is not None and parent_role_id != tier.parent_role_id:
+            changed_tiers += move_subtree(hierarchy_json, mutation['role_id'], parent_role_id, positions)
+        tier.update(changes)
+        changed_tiers.append(tier)
+
+    elif op == 'remove_tier':
+        hierarchy_json = server_json['hierarchies'][mutation['hierarchy']]
+        changed_tiers += remove_tier(hierarchy_json, mutation['role_id'], positions)
+        server_json['roles'].pop(str(mutation['role_id']), None)
+
+    elif op == 'set_log_channel':
+        server_json['log_channel'] = mutation['channel_id']
+
+    else:
+        raise Exception(f'Unknown mutation `{op}`.')
+
+    return changed_tiers
@@ -1,294 +1,483 @@
-import discord
-# pip install -U discord.py
-from discord.ext import commands
-# pip install -U discord-py-slash-command
-from discord_slash import SlashCommand, SlashContext, cog_ext
-from discord_slash.utils.manage_commands import create_option
-from discord.ext.commands import Cog, command, has_permissions, MissingPermissions
-
-from cogs.CoreManagement import Core, ApplicationCommandOptionType
-from custom.Custom import CustomManagement
-
-
-class PlayerManagement(commands.Cog):
-    """Commands for managing player roles."""
-    _instance = None
-
-    def __new__(cls, bot):
-        if cls._instance is None:
-            cls._instance = super(PlayerManagement, cls).__new__(cls)
-            # Put any initialization here.
-        return cls._instance
-    
-    def __init__(self, bot):
-        self.bot = bot
-        self._last_member = None
-
-    async def _core_get_hierarchies(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
-        server_id = ctx.message.guild.id
-        server_json = Core.get_server_json(server_id)
-
-        if str(Tier.id) not in server_json['roles']:
-            await Core.logger(self.bot, ctx,  f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because role {Tier.mention} does not belong to a hierarchy.')
-            await ctx.send(f'Role {Tier.mention} does not belong to a hierarchy.')
-            return None, None
-        hierarchy_name = server_json['roles'][str(Tier.id)]
-        hierarchy = server_json['hierarchies'][hierarchy_name]['tiers']
-        return hierarchy_name, hierarchy
-
-    async def _core_get_tier_lists(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role, hierarchy_name: str, hierarchy: list):
-        key_prefix = None
-        if command == 'promote' or command == 'assign':
-            key_prefix = 'promotion'
-        elif command == 'demote' or command == 'unassign':
-            key_prefix = 'demotion'
-        else:
-            raise Exception('This should be impossible.')
-
-        author_tiers = []
-        target_tiers = []
-        tier_target = None
-        # Get Discord roles for every role ID and parent role ID in the hierarchy
-        # Store them in the hierarchy because this is a temporary object
-        # that will not be saved to file
-        for tier_object in hierarchy:
-            role = discord.utils.get(ctx.guild.roles, id=tier_object['role_id'])
-            if role is None:
-                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because a deleted role {tier_object["role_id"]} still exists in the hierarchy.')
-                await ctx.send(f'Role {tier_object["role_id"]} was deleted but still exists in the hierarchy.')
-                return None, None, None, None
-            parent_role = discord.utils.get(ctx.guild.roles, id=tier_object['parent_role_id'])
-            if int(tier_object['parent_role_id']) != 0 and parent_role is None:
-                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because a deleted parent role {tier_object["parent_role_id"]} still exists in the hierarchy.')
-                await ctx.send(f'Parent role {tier_object["parent_role_id"]} was deleted but still exists in the hierarchy.')
-                return None, None, None, None
-            tier_object['role'] = role
-            tier_object['parent_role'] = parent_role
-
-            if role in ctx.author.roles and \
-                    tier_object[key_prefix + '_min_depth'] != -1 and \
-                    tier_object[key_prefix + '_max_depth'] != -1:
-                author_tiers.append(tier_object)
-            if role in Member.roles:
-                target_tiers.append(tier_object)
-            if role.id == Tier.id:
-                tier_target = tier_object
-
-        if len(author_tiers) == 0:
-            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because he/she has no roles in hierarchy {hierarchy_name} that are capable of promoting.')
-            await ctx.send(f'You have no roles in hierarchy {hierarchy_name} with permissions. You cannot {command} members.')
-            return None, None, None, None
-
-        if tier_target is None:
-            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because role exists in role lookup but not in hierarchy tree.')
-            await ctx.send(f'Hierarchy {hierarchy_name} is corrupted. Role exists in role lookup but not in hierarchy tree. You should never see this error.')
-            return None, None, None, None
-
-        return key_prefix, author_tiers, target_tiers, tier_target
-
-    async def _core_promote_assign(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
-        """Core method used in promote/assign commands."""
-        hierarchy_name, hierarchy = await self._core_get_hierarchies(command, ctx, Member, Tier)
-        if hierarchy_name is None or hierarchy is None:
-            return
-        key_prefix, author_tiers, target_tiers, tier_target = await self._core_get_tier_lists(command, ctx, Member, Tier, hierarchy_name, hierarchy)
-        if key_prefix is None or author_tiers is None or target_tiers is None or tier_target is None:
-            return
-        tier_source = None
-
-        if command == 'promote':
-            for tier_object in target_tiers:
-                print(f'{tier_object["role"]} <@&{tier_object["role_id"]}> == {tier_object["parent_role"]} <@&{tier_target["parent_role_id"]}>')
-                # Try to locate the role that we are going to remove before promoting/assigning
-                if tier_object['parent_role_id'] == Tier.id:
-                    if tier_source is None:
-                        # If the role was found and it is the only role, assign it
-                        tier_source = tier_object
-                    else:
-                        # If multiple roles share this parent
-                        await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because this member has 2 or more child roles in hierarchy {hierarchy_name}.')
-                        return await ctx.send(f'This member has 2 or more child roles in hierarchy {hierarchy_name}. You cannot {command} a user who has two tiers at the same level.')
-
-            # Enforce tier_source as a requirement when promoting/assigning. Only allow ^assign for lowest role
-            # TODO: Remove maximum_depth, no longer useful
-            if tier_source is None:  # and int(tier_target["depth"]) != int(server_json["hierarchies"][hierarchy_name]["maximum_depth"])
-                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because {Member.mention} does not have its child role.')
-                return await ctx.send(f'Cannot {command} to <@&{tier_target["role_id"]}> because {Member.mention} does not have its child role.')
-
-        # Iterate over author's tiers looking for role that can promote
-        for tier_object in author_tiers:
-            print(f'Calculating depth {tier_target["depth"]} - {tier_object["depth"]}')
-            calculated_depth = tier_target['depth'] - tier_object['depth']
-            print(f"Calculated depth: {tier_object['demotion_min_depth']} <= {calculated_depth} <= {tier_object['demotion_max_depth']}")
-            if tier_object[key_prefix + '_min_depth'] <= calculated_depth <= tier_object[key_prefix + '_max_depth']:
-
-                if command == 'promote':
-                    async def role_change_function(Member, Tier, NewTier):
-                        await Member.remove_roles(Tier)
-                        await Member.add_roles(NewTier)
-                        return True
-                elif command == 'assign':
-                    async def role_change_function(Member, Tier, NewTier):
-                        await Member.add_roles(NewTier)
-                        return True
-
-                custom_cog = CustomManagement(self.bot)
-                custom_method = getattr(custom_cog, command + '_hooks', None)
-                if callable(custom_method):
-                    callback_result = await custom_method(ctx, Member, tier_source['role'] if tier_source is not None else None, tier_target['role'] if tier_target is not None else None, hierarchy_name, role_change_function)
-                else:
-                    callback_result = await role_change_function(Member, tier_source['role'] if tier_source is not None else None, tier_target['role'] if tier_target is not None else None)
-
-                if callback_result:
-                    await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) {"promoted" if command == "promote" else "assigned"} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention}.')
-                    return await ctx.send(f'{"Promoted" if command == "promote" else "Assigned"} {Member.mention} to {Tier.mention}.')
-                # Allow callback to handle output on false
-                #else:
-            else:
-                # Might send multiple times for multiple roles
-                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because role <@&{tier_object["role_id"]}> can only {command} between {tier_object[key_prefix + "_min_depth"]} and {tier_object[key_prefix + "_max_depth"]} roles down, inclusively.')
-                return await ctx.send(f'Your role <@&{tier_object["role_id"]}> can only {command} between {tier_object[key_prefix + "_min_depth"]} and {tier_object[key_prefix + "_max_depth"]} roles down, inclusively.')
-        return
-
-    """
-    
-    PROMOTE
-    
-    """
-    @cog_ext.cog_slash(name="promote", description="Remove a role from a user and give that user the next highest role in the hierarchy.",
-        options=[
-           create_option(name="Member", description="The member to promote.", option_type=ApplicationCommandOptionType.STRING, required=True),
-           create_option(name="Tier", description="The role to promote the member to.", option_type=ApplicationCommandOptionType.STRING, required=True),
-        ]
-    )
-    async def _promote(self, ctx: SlashContext, *, Member: discord.Member, Tier: discord.Role):
-        await self.promote(ctx=ctx, Member=Member, Tier=Tier)
-
-    @commands.command(pass_context=True)
-    async def promote(self, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
-        """Remove a role from a user and give that user the next highest role in the hierarchy."""
-        return await self._core_promote_assign('promote', ctx, Member, Tier)
-
-    """
-
-    ASSIGN
-
-    """
-    @cog_ext.cog_slash(name="assign", description="Assign a role to a user in the hierarchy. This should only be used for roles that cannot be promoted or demoted.",
-        options=[
-           create_option(name="Member", description="The member to promote.", option_type=ApplicationCommandOptionType.STRING, required=True),
-           create_option(name="Tier", description="The role to promote the member to.", option_type=ApplicationCommandOptionType.STRING, required=True),
-        ]
-    )
-    async def _assign(self, ctx: SlashContext, *, Member: discord.Member, Tier: discord.Role):
-        await self.assign(ctx=ctx, Member=Member, Tier=Tier)
-
-    @commands.command(pass_context=True)
-    async def assign(self, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
-        """Assign a role to a user in the hierarchy. This should only be used for roles that cannot be promoted or demoted."""
-        return await self._core_promote_assign('assign', ctx, Member, Tier)
-
-    async def _core_demote_unassign(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
-        """Core method used in promote/assign commands."""
-        hierarchy_name, hierarchy = await self._core_get_hierarchies(command, ctx, Member, Tier)
-        if hierarchy_name is None:
-            return
-        key_prefix, author_tiers, target_tiers, tier_target = await self._core_get_tier_lists(command, ctx, Member, Tier, hierarchy_name, hierarchy)
-        if key_prefix is None or author_tiers is None or target_tiers is None or tier_target is None:
-            return
-        tier_source = None
-
-        if command == 'demote':
-            for tier_object in target_tiers:
-                # Try to locate the role that we are going to remove before demoting
-                print(f'{tier_object["role"]} <@&{tier_object["role_id"]}> == {tier_object["parent_role"]} <@&{tier_target["parent_role_id"]}>')
-                if tier_object['role_id'] == tier_target['parent_role_id']:
-                    if tier_source is None:
-                        # If the role was found and it is the only role, assign it
-                        tier_source = tier_object
-                    else:
-                        # If multiple roles share this parent
-                        await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because this member has 2 or more child roles in hierarchy {hierarchy_name}.')
-                        return await ctx.send(f'This member has 2 or more child roles in hierarchy {hierarchy_name}. You cannot {command} a user who has two tiers at the same level.')
-
-            if tier_source is None:
-                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because {Member.mention} does not have its child role.')
-                return await ctx.send(f'You cannot {command} a user at the lowest level of the hierarchy. Use unassign for this instead.')
-        #elif command == 'unassign':
-        #    tier_source = tier_target
-        #    tier_target = None
-
-        # Iterate over author's tiers looking for role that can demote
-        for tier_object in author_tiers:
-            print(f'Calculating depth {tier_target["depth"]} - {tier_object["depth"]}')
-            calculated_depth = tier_target['depth'] - tier_object['depth']
-            print(f"Calculated depth: {tier_object['demotion_min_depth']} <= {calculated_depth} <= {tier_object['demotion_max_depth']}")
-            if tier_object['demotion_min_depth'] <= calculated_depth <= tier_object['demotion_max_depth']:
-
-                if command == 'demote':
-                    async def role_change_function(Member, Tier, NewTier):
-                        await Member.remove_roles(Tier)
-                        await Member.add_roles(NewTier)
-                        return True
-                elif command == 'unassign':
-                    async def role_change_function(Member, Tier, NewTier):
-                        #await Member.remove_roles(Tier)
-                        #await Member.add_roles(NewTier)
-                        await Member.remove_roles(NewTier)
-                        return True
-
-                custom_cog = CustomManagement(self.bot)
-                custom_method = getattr(custom_cog, command + '_hooks', None)
-                if callable(custom_method):
-                    callback_result = await custom_method(ctx, Member, tier_source['role'] if tier_source is not None else None, tier_target['role'] if tier_target is not None else None, hierarchy_name, role_change_function)
-                else:
-                    callback_result = await role_change_function(Member, tier_source['role'] if tier_source is not None else None, tier_target['role'] if tier_target is not None else None)
-
-                if callback_result:
-                    await Core.logger(self.bot, ctx, f'{ctx.author.name} {ctx.author.mention} {"demoted" if command == "demote" else "unassigned"} {Member.name} {Member.mention} to {Tier.name} {Tier.mention}.')
-                    return await ctx.send(f'{"Demoted" if command == "demote" else "Unassigned"} {Member.mention} {"to" if command == "demote" else "from"} {Tier.mention}.')
-                # Allow callback to handle output on false
-                # else:
-            else:
-                # Might send multiple times for multiple roles
-                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because role <@&{tier_object["role_id"]}> can only {command} between {tier_object["demotion_min_depth"]} and {tier_object["demotion_max_depth"]} roles down, inclusively.')
-                await ctx.send(f'Your role <@&{tier_object["role_id"]}> can only {command} between {tier_object["demotion_min_depth"]} and {tier_object["demotion_max_depth"]} roles down, inclusively.')
-        return
-
-    """
-
-    DEMOTE
-
-    """
-    @cog_ext.cog_slash(name="demote", description="Remove a role from a user and give that user the next highest role in the hierarchy.",
-        options=[
-           create_option(name="Member", description="The member to demote.", option_type=ApplicationCommandOptionType.STRING, required=True),
-           create_option(name="Tier", description="The role to demote the member to.", option_type=ApplicationCommandOptionType.STRING, required=True),
-        ]
-    )
-    async def _demote(self, ctx: SlashContext, *, Member: discord.Member, Tier: discord.Role):
-        await self.demote(ctx=ctx, Member=Member, Tier=Tier)
-
-    @commands.command(pass_context=True)
-    async def demote(self, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
-        """Remove a role from the user and give that user the next lowest role in the hierarchy."""
-        return await self._core_demote_unassign('demote', ctx, Member, Tier)
-
-    """
-
-    UNASSIGN
-
-    """
-    @cog_ext.cog_slash(name="unassign", description="Unassign a role from a user in the hierarchy. This should only be used for roles that cannot be promoted or demoted.",
-        options=[
-           create_option(name="Member", description="The member to unassign from.", option_type=ApplicationCommandOptionType.STRING, required=True),
-           create_option(name="Tier", description="The role to unassign from the member.", option_type=ApplicationCommandOptionType.STRING, required=True),
-        ]
-    )
-    async def _unassign(self, ctx: SlashContext, *, Member: discord.Member, Tier: discord.Role):
-        await self.unassign(ctx=ctx, Member=Member, Tier=Tier)
-
-    @commands.command(pass_context=True)
-    async def unassign(self, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
-        """Unassign a role from a user in the hierarchy. This should only be used for roles that cannot be promoted or demoted."""
-        return await self._core_demote_unassign('unassign', ctx, Member, Tier)
+import asyncio
+import discord
+# pip install -U discord.py
+from discord.ext import commands
+# pip install -U discord-py-slash-command
+from discord_slash import SlashCommand, SlashContext, cog_ext
+from discord_slash.utils.manage_commands import create_option
+from discord.ext.commands import Cog, command, has_permissions, MissingPermissions
+from typing import Union
+
+from cogs.CoreManagement import Core, ApplicationCommandOptionType, create_autocomplete_option
+from cogs.HierarchyIndex import HierarchyIndex
+from custom.Custom import CustomManagement
+
+
+class PlayerManagement(commands.Cog):
+    """Commands for managing player roles."""
+    _instance = None
+    # Role edits a bulk command keeps in flight at once, discord.py queues the rest behind its rate limiter
+    bulk_concurrency = 5
+
+    def __new__(cls, bot):
+        if cls._instance is None:
+            cls._instance = super(PlayerManagement, cls).__new__(cls)
+            # Put any initialization here.
+        return cls._instance
+    
+    def __init__(self, bot):
+        self.bot = bot
+        self._last_member = None
+
+    async def _core_get_hierarchies(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
+        server_id = ctx.message.guild.id
+        server_json = await Core.get_server_json(server_id)
+
+        if str(Tier.id) not in server_json['roles']:
+            await Core.logger(self.bot, ctx,  f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because role {Tier.mention} does not belong to a hierarchy.')
+            await ctx.send(f'Role {Tier.mention} does not belong to a hierarchy.')
+            return None, None
+        hierarchy_name = server_json['roles'][str(Tier.id)]
+        hierarchy = Core.get_hierarchy_index(server_id, server_json, hierarchy_name)
+        # In lean mode the member may have been fetched just for this command
+        Core.member_cache.update(Member, server_json['roles'])
+        return hierarchy_name, hierarchy
+
+    async def _core_get_tier_lists(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role, hierarchy_name: str, hierarchy: HierarchyIndex):
+        key_prefix = None
+        if command == 'promote' or command == 'assign':
+            key_prefix = 'promotion'
+        elif command == 'demote' or command == 'unassign':
+            key_prefix = 'demotion'
+        else:
+            raise Exception('This should be impossible.')
+
+        author_tiers = []
+        target_tiers = []
+        tier_target = None
+        # Only look up the tiers held by the author and the member, and the tier being changed.
+        # Member.roles builds a sorted list of Role objects on every access, so read each member's
+        # roles once into a set of IDs and resolve them through the guild's ID-keyed role map.
+        # Tiers are shared through the server cache, so Discord roles are looked up when they are needed
+        # instead of being stored on them
+        author_role_ids = {role.id for role in ctx.author.roles}
+        member_role_ids = {role.id for role in Member.roles}
+        holders = [('author', role_id) for role_id in author_role_ids] + [('member', role_id) for role_id in member_role_ids] + [('target', Tier.id)]
+        for holder, role_id in holders:
+            tier_object = hierarchy.tier(role_id)
+            if tier_object is None:
+                continue
+            if tier_object.parent_role_id != 0 and ctx.guild.get_role(tier_object.parent_role_id) is None:
+                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because a deleted parent role {tier_object.parent_role_id} still exists in the hierarchy.')
+                await ctx.send(f'Parent role {tier_object.parent_role_id} was deleted but still exists in the hierarchy.')
+                return None, None, None, None
+
+            if holder == 'author':
+                if tier_object[key_prefix + '_min_depth'] != -1 and \
+                        tier_object[key_prefix + '_max_depth'] != -1:
+                    author_tiers.append(tier_object)
+            elif holder == 'member':
+                target_tiers.append(tier_object)
+            else:
+                tier_target = tier_object
+        # Check the author's highest tiers first, as the hierarchy is ordered from the top
+        author_tiers.sort(key=lambda tier_object: tier_object.depth)
+
+        if len(author_tiers) == 0:
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because he/she has no roles in hierarchy {hierarchy_name} that are capable of promoting.')
+            await ctx.send(f'You have no roles in hierarchy {hierarchy_name} with permissions. You cannot {command} members.')
+            return None, None, None, None
+
+        if tier_target is None:
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because role exists in role lookup but not in hierarchy tree.')
+            await ctx.send(f'Hierarchy {hierarchy_name} is corrupted. Role exists in role lookup but not in hierarchy tree. You should never see this error.')
+            return None, None, None, None
+
+        return key_prefix, author_tiers, target_tiers, tier_target
+
+    async def _core_swap_roles(self, Member: discord.Member, Tier: discord.Role, NewTier: discord.Role):
+        """Replaces one role with another in a single member edit, so the member is never left half changed."""
+        # The default role cannot be sent back to Discord, every other role the member has is kept
+        roles = [role for role in Member.roles if not role.is_default() and role.id != Tier.id]
+        if NewTier not in roles:
+            roles.append(NewTier)
+        await Member.edit(roles=roles)
+
+    def _core_role_change_function(self, command: str):
+        """Returns the function that changes a member's roles for the given command."""
+        if command == 'promote' or command == 'demote':
+            async def role_change_function(Member, Tier, NewTier):
+                await self._core_swap_roles(Member, Tier, NewTier)
+                return True
+        elif command == 'assign':
+            async def role_change_function(Member, Tier, NewTier):
+                await Member.add_roles(NewTier)
+                return True
+        elif command == 'unassign':
+            async def role_change_function(Member, Tier, NewTier):
+                await Member.remove_roles(NewTier)
+                return True
+        else:
+            raise Exception('This should be impossible.')
+        return role_change_function
+
+    async def _core_change_roles(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role, NewTier: discord.Role, hierarchy_name: str):
+        """Changes a member's roles, through the custom hook for the command if there is one."""
+        role_change_function = self._core_role_change_function(command)
+        custom_cog = CustomManagement(self.bot)
+        custom_method = getattr(custom_cog, command + '_hooks', None)
+        if callable(custom_method):
+            return await custom_method(ctx, Member, Tier, NewTier, hierarchy_name, role_change_function)
+        return await role_change_function(Member, Tier, NewTier)
+
+    async def _core_promote_assign(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
+        """Core method used in promote/assign commands."""
+        hierarchy_name, hierarchy = await self._core_get_hierarchies(command, ctx, Member, Tier)
+        if hierarchy_name is None or hierarchy is None:
+            return
+        with Core.metrics.timer('resolve'):
+            key_prefix, author_tiers, target_tiers, tier_target = await self._core_get_tier_lists(command, ctx, Member, Tier, hierarchy_name, hierarchy)
+        if key_prefix is None or author_tiers is None or target_tiers is None or tier_target is None:
+            return
+        tier_source = None
+
+        if command == 'promote':
+            for tier_object in target_tiers:
+                # Try to locate the role that we are going to remove before promoting/assigning
+                if tier_object.parent_role_id == Tier.id:
+                    if tier_source is None:
+                        # If the role was found and it is the only role, assign it
+                        tier_source = tier_object
+                    else:
+                        # If multiple roles share this parent
+                        await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because this member has 2 or more child roles in hierarchy {hierarchy_name}.')
+                        return await ctx.send(f'This member has 2 or more child roles in hierarchy {hierarchy_name}. You cannot {command} a user who has two tiers at the same level.')
+
+            # Enforce tier_source as a requirement when promoting/assigning. Only allow ^assign for lowest role
+            # TODO: Remove maximum_depth, no longer useful
+            if tier_source is None:  # and int(tier_target.depth) != int(server_json["hierarchies"][hierarchy_name].maximum_depth)
+                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because {Member.mention} does not have its child role.')
+                return await ctx.send(f'Cannot {command} to <@&{tier_target.role_id}> because {Member.mention} does not have its child role.')
+
+        # Iterate over author's tiers looking for role that can promote
+        for tier_object in author_tiers:
+            with Core.metrics.timer('decide'):
+                allowed = hierarchy.can(command, tier_object.role_id, tier_target.role_id)
+            if allowed:
+
+                callback_result = await self._core_change_roles(command, ctx, Member, ctx.guild.get_role(tier_source.role_id) if tier_source is not None else None, Tier, hierarchy_name)
+
+                if callback_result:
+                    await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) {"promoted" if command == "promote" else "assigned"} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention}.')
+                    return await ctx.send(f'{"Promoted" if command == "promote" else "Assigned"} {Member.mention} to {Tier.mention}.')
+                # Allow callback to handle output on false
+                #else:
+            else:
+                # Might send multiple times for multiple roles
+                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because role <@&{tier_object.role_id}> can only {command} between {tier_object[key_prefix + "_min_depth"]} and {tier_object[key_prefix + "_max_depth"]} roles down, inclusively.')
+                return await ctx.send(f'Your role <@&{tier_object.role_id}> can only {command} between {tier_object[key_prefix + "_min_depth"]} and {tier_object[key_prefix + "_max_depth"]} roles down, inclusively.')
+        return
+
+    """
+    
+    PROMOTE
+    
+    """
+    @cog_ext.cog_slash(name="promote", description="Remove a role from a user and give that user the next highest role in the hierarchy.",
+        options=[
+           create_option(name="Member", description="The member to promote.", option_type=ApplicationCommandOptionType.USER, required=True),
+           create_autocomplete_option(name="Tier", description="The role to promote the member to.", required=True),
+        ]
+    )
+    async def _promote(self, ctx: SlashContext, *, Member: discord.Member, Tier: str):
+        Role = Core.get_role_from_option(ctx.guild, Tier)
+        if Role is None:
+            return await ctx.send(f'Role {Tier} does not exist.')
+        await self.promote(ctx=ctx, Member=Member, Tier=Role)
+
+    @commands.command(pass_context=True)
+    async def promote(self, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
+        """Remove a role from a user and give that user the next highest role in the hierarchy."""
+        return await self._core_promote_assign('promote', ctx, Member, Tier)
+
+    """
+
+    ASSIGN
+
+    """
+    @cog_ext.cog_slash(name="assign", description="Assign a role to a user in the hierarchy. This should only be used for roles that cannot be promoted or demoted.",
+        options=[
+           create_option(name="Member", description="The member to promote.", option_type=ApplicationCommandOptionType.USER, required=True),
+           create_autocomplete_option(name="Tier", description="The role to promote the member to.", required=True),
+        ]
+    )
+    async def _assign(self, ctx: SlashContext, *, Member: discord.Member, Tier: str):
+        Role = Core.get_role_from_option(ctx.guild, Tier)
+        if Role is None:
+            return await ctx.send(f'Role {Tier} does not exist.')
+        await self.assign(ctx=ctx, Member=Member, Tier=Role)
+
+    @commands.command(pass_context=True)
+    async def assign(self, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
+        """Assign a role to a user in the hierarchy. This should only be used for roles that cannot be promoted or demoted."""
+        return await self._core_promote_assign('assign', ctx, Member, Tier)
+
+    async def _core_demote_unassign(self, command: str, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
+        """Core method used in promote/assign commands."""
+        hierarchy_name, hierarchy = await self._core_get_hierarchies(command, ctx, Member, Tier)
+        if hierarchy_name is None:
+            return
+        with Core.metrics.timer('resolve'):
+            key_prefix, author_tiers, target_tiers, tier_target = await self._core_get_tier_lists(command, ctx, Member, Tier, hierarchy_name, hierarchy)
+        if key_prefix is None or author_tiers is None or target_tiers is None or tier_target is None:
+            return
+        tier_source = None
+
+        if command == 'demote':
+            for tier_object in target_tiers:
+                # Try to locate the role that we are going to remove before demoting
+                if tier_object.role_id == tier_target.parent_role_id:
+                    if tier_source is None:
+                        # If the role was found and it is the only role, assign it
+                        tier_source = tier_object
+                    else:
+                        # If multiple roles share this parent
+                        await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because this member has 2 or more child roles in hierarchy {hierarchy_name}.')
+                        return await ctx.send(f'This member has 2 or more child roles in hierarchy {hierarchy_name}. You cannot {command} a user who has two tiers at the same level.')
+
+            if tier_source is None:
+                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because {Member.mention} does not have its child role.')
+                return await ctx.send(f'You cannot {command} a user at the lowest level of the hierarchy. Use unassign for this instead.')
+        #elif command == 'unassign':
+        #    tier_source = tier_target
+        #    tier_target = None
+
+        # Iterate over author's tiers looking for role that can demote
+        for tier_object in author_tiers:
+            with Core.metrics.timer('decide'):
+                allowed = hierarchy.can(command, tier_object.role_id, tier_target.role_id)
+            if allowed:
+
+                callback_result = await self._core_change_roles(command, ctx, Member, ctx.guild.get_role(tier_source.role_id) if tier_source is not None else None, Tier, hierarchy_name)
+
+                if callback_result:
+                    await Core.logger(self.bot, ctx, f'{ctx.author.name} {ctx.author.mention} {"demoted" if command == "demote" else "unassigned"} {Member.name} {Member.mention} to {Tier.name} {Tier.mention}.')
+                    return await ctx.send(f'{"Demoted" if command == "demote" else "Unassigned"} {Member.mention} {"to" if command == "demote" else "from"} {Tier.mention}.')
+                # Allow callback to handle output on false
+                # else:
+            else:
+                # Might send multiple times for multiple roles
+                await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not {command} {Member.mention} ({Member.name}#{Member.discriminator}) to {Tier.mention} because role <@&{tier_object.role_id}> can only {command} between {tier_object.demotion_min_depth} and {tier_object.demotion_max_depth} roles down, inclusively.')
+                await ctx.send(f'Your role <@&{tier_object.role_id}> can only {command} between {tier_object.demotion_min_depth} and {tier_object.demotion_max_depth} roles down, inclusively.')
+        return
+
+    """
+
+    DEMOTE
+
+    """
+    @cog_ext.cog_slash(name="demote", description="Remove a role from a user and give that user the next highest role in the hierarchy.",
+        options=[
+           create_option(name="Member", description="The member to demote.", option_type=ApplicationCommandOptionType.USER, required=True),
+           create_autocomplete_option(name="Tier", description="The role to demote the member to.", required=True),
+        ]
+    )
+    async def _demote(self, ctx: SlashContext, *, Member: discord.Member, Tier: str):
+        Role = Core.get_role_from_option(ctx.guild, Tier)
+        if Role is None:
+            return await ctx.send(f'Role {Tier} does not exist.')
+        await self.demote(ctx=ctx, Member=Member, Tier=Role)
+
+    @commands.command(pass_context=True)
+    async def demote(self, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
+        """Remove a role from the user and give that user the next lowest role in the hierarchy."""
+        return await self._core_demote_unassign('demote', ctx, Member, Tier)
+
+    """
+
+    UNASSIGN
+
+    """
+    @cog_ext.cog_slash(name="unassign", description="Unassign a role from a user in the hierarchy. This should only be used for roles that cannot be promoted or demoted.",
+        options=[
+           create_option(name="Member", description="The member to unassign from.", option_type=ApplicationCommandOptionType.USER, required=True),
+           create_autocomplete_option(name="Tier", description="The role to unassign from the member.", required=True),
+        ]
+    )
+    async def _unassign(self, ctx: SlashContext, *, Member: discord.Member, Tier: str):
+        Role = Core.get_role_from_option(ctx.guild, Tier)
+        if Role is None:
+            return await ctx.send(f'Role {Tier} does not exist.')
+        await self.unassign(ctx=ctx, Member=Member, Tier=Role)
+
+    @commands.command(pass_context=True)
+    async def unassign(self, ctx: discord.ext.commands.Context, Member: discord.Member, Tier: discord.Role):
+        """Unassign a role from a user in the hierarchy. This should only be used for roles that cannot be promoted or demoted."""
+        return await self._core_demote_unassign('unassign', ctx, Member, Tier)
+
+    async def _core_bulk(self, command: str, ctx: discord.ext.commands.Context, Tier: discord.Role, Targets: list):
+        """Core method used in bulk commands. Checks the author once, then changes every member concurrently."""
+        # Roles stand for every member that has them
+        members = []
+        member_ids = set()
+        for target in Targets:
+            for Member in (await Core.get_role_members(ctx.guild, target) if isinstance(target, discord.Role) else [target]):
+                if Member.id not in member_ids:
+                    member_ids.add(Member.id)
+                    members.append(Member)
+        if len(members) == 0:
+            return await ctx.send(f'No members were given to {command}.')
+
+        server_id = ctx.message.guild.id
+        server_json = await Core.get_server_json(server_id)
+        if str(Tier.id) not in server_json['roles']:
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not bulk {command} {len(members)} members to {Tier.mention} because role {Tier.mention} does not belong to a hierarchy.')
+            return await ctx.send(f'Role {Tier.mention} does not belong to a hierarchy.')
+        hierarchy_name = server_json['roles'][str(Tier.id)]
+        hierarchy = Core.get_hierarchy_index(server_id, server_json, hierarchy_name)
+        tier_target = hierarchy.tier(Tier.id)
+        if tier_target is None:
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not bulk {command} {len(members)} members to {Tier.mention} because role exists in role lookup but not in hierarchy tree.')
+            return await ctx.send(f'Hierarchy {hierarchy_name} is corrupted. Role exists in role lookup but not in hierarchy tree. You should never see this error.')
+
+        key_prefix = 'promotion' if command == 'promote' or command == 'assign' else 'demotion'
+        author_tiers = [tier_object for tier_object in hierarchy.tiers_of(ctx.author.roles)
+                        if tier_object[key_prefix + '_min_depth'] != -1 and tier_object[key_prefix + '_max_depth'] != -1]
+        if len(author_tiers) == 0:
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not bulk {command} {len(members)} members to {Tier.mention} because they have no roles in hierarchy {hierarchy_name} with permissions.')
+            return await ctx.send(f'You have no roles in hierarchy {hierarchy_name} with permissions. You cannot {command} members.')
+
+        # Like the single member commands, the author's highest tier decides
+        tier_object = min(author_tiers, key=lambda tier_object: tier_object.depth)
+        with Core.metrics.timer('decide'):
+            allowed = hierarchy.can(command, tier_object.role_id, tier_target.role_id)
+        if not allowed:
+            await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) could not bulk {command} {len(members)} members to {Tier.mention} because role <@&{tier_object.role_id}> can only {command} between {tier_object[key_prefix + "_min_depth"]} and {tier_object[key_prefix + "_max_depth"]} roles down, inclusively.')
+            return await ctx.send(f'Your role <@&{tier_object.role_id}> can only {command} between {tier_object[key_prefix + "_min_depth"]} and {tier_object[key_prefix + "_max_depth"]} roles down, inclusively.')
+
+        # The tiers a member must hold exactly one of to be promoted or demoted to Tier
+        source_role_ids = None
+        if command == 'promote':
+            source_role_ids = {child.role_id for child in hierarchy.children(Tier.id)}
+        elif command == 'demote':
+            source_role_ids = {tier_target.parent_role_id}
+
+        semaphore = asyncio.Semaphore(self.bulk_concurrency)
+        succeeded = []
+        failed = []
+
+        async def change_member(Member):
+            member_role_ids = {role.id for role in Member.roles}
+            source_role = None
+            if source_role_ids is not None:
+                held_role_ids = source_role_ids & member_role_ids
+                if len(held_role_ids) == 0:
+                    return failed.append((Member, f'does not have the role to {command} from'))
+                if len(held_role_ids) > 1:
+                    return failed.append((Member, f'has 2 or more child roles in hierarchy {hierarchy_name}'))
+                source_role = ctx.guild.get_role(held_role_ids.pop())
+                if source_role is None:
+                    return failed.append((Member, f'holds a deleted role of hierarchy {hierarchy_name}'))
+            elif command == 'assign' and Tier.id in member_role_ids:
+                return failed.append((Member, f'already has {Tier.mention}'))
+            elif command == 'unassign' and Tier.id not in member_role_ids:
+                return failed.append((Member, f'does not have {Tier.mention}'))
+
+            async with semaphore:
+                try:
+                    if await self._core_change_roles(command, ctx, Member, source_role, Tier, hierarchy_name):
+                        succeeded.append(Member)
+                    else:
+                        failed.append((Member, 'was skipped by a custom hook'))
+                except Exception as e:
+                    failed.append((Member, str(e)))
+
+        await asyncio.gather(*[change_member(Member) for Member in members])
+
+        verb = {'promote': 'Promoted', 'demote': 'Demoted', 'assign': 'Assigned', 'unassign': 'Unassigned'}[command]
+        summary = f'{verb} {len(succeeded)} of {len(members)} members {"from" if command == "unassign" else "to"} {Tier.mention}.'
+        for index, (Member, reason) in enumerate(failed):
+            line = f'\n{Member.mention} {reason}.'
+            # Stay under Discord's 2000 character message limit
+            if len(summary) + len(line) > 1900:
+                summary += f'\n...and {len(failed) - index} more.'
+                break
+            summary += line
+        await Core.logger(self.bot, ctx, f'{ctx.author.mention} ({ctx.author.name}#{ctx.author.discriminator}) bulk {verb.lower()} {len(succeeded)} of {len(members)} members {"from" if command == "unassign" else "to"} {Tier.mention} in hierarchy `{hierarchy_name}`.')
+        return await ctx.send(summary)
+
+    """
+
+    BULKPROMOTE
+
+    """
+    @cog_ext.cog_slash(name="bulkpromote", description="Promote many members, or every member of a role, to the same tier.",
+        options=[
+           create_option(name="Tier", description="The role to promote the members to.", option_type=ApplicationCommandOptionType.ROLE, required=True),
+           create_option(name="From", description="Every member with this role is promoted.", option_type=ApplicationCommandOptionType.ROLE, required=True),
+        ]
+    )
+    async def _bulkpromote(self, ctx: SlashContext, *, Tier: discord.Role, From: discord.Role):
+        await self._core_bulk('promote', ctx, Tier, [From])
+
+    @commands.command(pass_context=True)
+    async def bulkpromote(self, ctx: discord.ext.commands.Context, Tier: discord.Role, Targets: commands.Greedy[Union[discord.Member, discord.Role]]):
+        """Promote many members, or every member of a role, to the same tier."""
+        return await self._core_bulk('promote', ctx, Tier, Targets)
+
+    """
+
+    BULKDEMOTE
+
+    """
+    @cog_ext.cog_slash(name="bulkdemote", description="Demote many members, or every member of a role, to the same tier.",
+        options=[
+           create_option(name="Tier", description="The role to demote the members to.", option_type=ApplicationCommandOptionType.ROLE, required=True),
+           create_option(name="From", description="Every member with this role is demoted.", option_type=ApplicationCommandOptionType.ROLE, required=True),
+        ]
+    )
+    async def _bulkdemote(self, ctx: SlashContext, *, Tier: discord.Role, From: discord.Role):
+        await self._core_bulk('demote', ctx, Tier, [From])
+
+    @commands.command(pass_context=True)
+    async def bulkdemote(self, ctx: discord.ext.commands.Context, Tier: discord.Role, Targets: commands.Greedy[Union[discord.Member, discord.Role]]):
+        """Demote many members, or every member of a role, to the same tier."""
+        return await self._core_bulk('demote', ctx, Tier, Targets)
+
+    """
+
+    BULKASSIGN
+
+    """
+    @cog_ext.cog_slash(name="bulkassign", description="Assign a tier to many members, or every member of a role.",
+        options=[
+           create_option(name="Tier", description="The role to assign the members to.", option_type=ApplicationCommandOptionType.ROLE, required=True),
+           create_option(name="From", description="Every member with this role is assigned.", option_type=ApplicationCommandOptionType.ROLE, required=True),
+        ]
+    )
+    async def _bulkassign(self, ctx: SlashContext, *, Tier: discord.Role, From: discord.Role):
+        await self._core_bulk('assign', ctx, Tier, [From])
+
+    @commands.command(pass_context=True)
+    async def bulkassign(self, ctx: discord.ext.commands.Context, Tier: discord.Role, Targets: commands.Greedy[Union[discord.Member, discord.Role]]):
+        """Assign a tier to many members, or every member of a role."""
+        return await self._core_bulk('assign', ctx, Tier, Targets)
+
+    """
+
+    BULKUNASSIGN
+
+    """
+    @cog_ext.cog_slash(name="bulkunassign", description="Unassign a tier from many members, or every member of a role.",
+        options=[
+           create_option(name="Tier", description="The role to unassign the members from.", option_type=ApplicationCommandOptionType.ROLE, required=True),
+           create_option(name="From", description="Every member with this role is unassigned.", option_type=ApplicationCommandOptionType.ROLE, required=True),
+        ]
+    )
+    async def _bulkunassign(self, ctx: SlashContext, *, Tier: discord.Role, From: discord.Role):
+        await self._core_bulk('unassign', ctx, Tier, [From])
+
+    @commands.command(pass_context=True)
+    async def bulkunassign(self, ctx: discord.ext.commands.Context, Tier: discord.Role, Targets: commands.Greedy[Union[discord.Member, discord.Role]]):
+        """Unassign a tier from many members, or every member of a role."""
+        return await self._core_bulk('unassign', ctx, Tier, Targets)
@@ -0,0 +1,189 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+from cogs.Metrics import current_command
+
+# Priority classes, lower ones are sent first
+PRIORITY_ROLES = 0
+PRIORITY_REPLIES = 1
+PRIORITY_LOGS = 2
+PRIORITY_NAMES = ('roles', 'replies', 'logs')
+
+ROLE_ROUTES = frozenset((
+    'PATCH /guilds/{guild_id}/members/{user_id}',
+    'PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}',
+    'DELETE /guilds/{guild_id}/members/{user_id}/roles/{role_id}',
+))
+# Interaction responses do not count towards the global rate limit
+GLOBAL_EXEMPT_PATHS = ('/interactions/', '/webhooks/')
+
+
+class Bucket:
+    """A rate limit for one route and major parameter, and the requests waiting for it in priority order."""
+
+    __slots__ = ('limit', 'per', 'sent', 'waiters')
+
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        # Send times of the last limit requests. Keeping every span of `per` seconds under the limit
+        # also keeps Discord's windows under it, wherever they start.
+        self.sent = deque(maxlen=limit)
+        # Heap of (priority, sequence, event)
+        self.waiters = []
+
+    def delay(self, now: float, margin: float, allowed: int) -> float:
+        """Seconds until a request that may use allowed of the limit may be sent, 0 if it may be sent now."""
+        index = len(self.sent) - allowed
+        if index < 0:
+            return 0.0
+        return max(0.0, self.sent[index] + self.per + margin - now)
+
+    def take(self, now: float):
+        self.sent.append(now)
+
+    def idle(self, now: float, margin: float) -> bool:
+        return not self.waiters and (not self.sent or now >= self.sent[-1] + self.per + margin)
+
+
+class RequestScheduler:
+    """Sends Discord REST requests in priority order: role edits, then replies, then log messages.
+
+    Known rate limits are counted down before a request is sent, so requests queue here by priority
+    instead of in discord.py's first come, first served bucket locks, and rarely run into a 429."""
+
+    # Route -> (requests, per seconds), for each major parameter (guild or channel)
+    default_route_limits = {
+        'PATCH /guilds/{guild_id}/members/{user_id}': (10, 10.0),
+        'PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}': (10, 10.0),
+        'DELETE /guilds/{guild_id}/members/{user_id}/roles/{role_id}': (10, 10.0),
+        'POST /channels/{channel_id}/messages': (5, 5.0),
+    }
+
+    def __init__(self, enabled: bool = True, route_limits: dict = None, global_limit: tuple = (50, 1.0),
+                 reset_margin: float = 0.1, log_share: float = 0.6, metrics=None):
+        self.enabled = enabled
+        self.route_limits = dict(self.default_route_limits, **(route_limits or {}))
+        # Requests per second for the whole bot, None for no global limit
+        self.global_bucket = Bucket(*global_limit) if global_limit is not None else None
+        # Discord counts a request when it arrives, a little after it is sent from here
+        self.reset_margin = reset_margin
+        # Log messages only use this share of a bucket, the rest is kept free for replies and role edits
+        self.log_share = log_share
+        # Queue waits are also timed as the queue phase of the command that made the request
+        self.metrics = metrics
+        # (route, major parameter) -> Bucket
+        self.buckets = {}
+        self._sequence = itertools.count()
+        self.queued = [0] * len(PRIORITY_NAMES)
+        self.stats = {name: {
+            'requests': 0,
+            'delayed': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'queued_max': 0,
+        } for name in PRIORITY_NAMES}
+
+    @staticmethod
+    def classify(route_key: str) -> int:
+        if route_key in ROLE_ROUTES:
+            return PRIORITY_ROLES
+        # LogQueue's sender tasks run as log_queue
+        if current_command.get() == 'log_queue':
+            return PRIORITY_LOGS
+        return PRIORITY_REPLIES
+
+    async def run(self, route_key: str, major, send, priority: int = None):
+        """Waits for the request's turn and rate limit buckets, then awaits send()."""
+        if not self.enabled:
+            return await send()
+        if priority is None:
+            priority = self.classify(route_key)
+        stats = self.stats[PRIORITY_NAMES[priority]]
+        self.queued[priority] += 1
+        stats['queued_max'] = max(stats['queued_max'], self.queued[priority])
+        started = time.perf_counter()
+        try:
+            limit = self.route_limits.get(route_key)
+            if limit is not None:
+                key = (route_key, major)
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    if len(self.buckets) >= 10000:
+                        self._prune()
+                    bucket = self.buckets[key] = Bucket(*limit)
+                await self._acquire(bucket, priority)
+            if self.global_bucket is not None and not route_key.split(' ', 1)[-1].startswith(GLOBAL_EXEMPT_PATHS):
+                await self._acquire(self.global_bucket, priority)
+        finally:
+            self.queued[priority] -= 1
+
+        waited = time.perf_counter() - started
+        stats['requests'] += 1
+        stats['wait_total'] += waited
+        stats['wait_max'] = max(stats['wait_max'], waited)
+        if waited > 0.001:
+            stats['delayed'] += 1
+        if self.metrics is not None:
+            self.metrics.observe(current_command.get(), 'queue', waited)
+        return await send()
+
+    async def _acquire(self, bucket: Bucket, priority: int):
+        loop = asyncio.get_event_loop()
+        entry = (priority, next(self._sequence), asyncio.Event())
+        heapq.heappush(bucket.waiters, entry)
+        allowed = max(1, int(bucket.limit * self.log_share)) if priority == PRIORITY_LOGS else bucket.limit
+        try:
+            while True:
+                if bucket.waiters[0] is not entry:
+                    # Woken up by the request ahead when it leaves the queue
+                    entry[2].clear()
+                    await entry[2].wait()
+                    continue
+                now = loop.time()
+                delay = bucket.delay(now, self.reset_margin, allowed)
+                if delay <= 0:
+                    bucket.take(now)
+                    return
+                # A request with a higher priority may arrive meanwhile and go first
+                await asyncio.sleep(delay)
+        finally:
+            # Also reached when the waiting command is cancelled
+            if bucket.waiters[0] is entry:
+                heapq.heappop(bucket.waiters)
+            else:
+                bucket.waiters.remove(entry)
+                heapq.heapify(bucket.waiters)
+            if bucket.waiters:
+                bucket.waiters[0][2].set()
+
+    def _prune(self):
+        """Forgets buckets that are full again."""
+        now = asyncio.get_event_loop().time()
+        for key in [key for key, bucket in self.buckets.items() if bucket.idle(now, self.reset_margin)]:
+            del self.buckets[key]
+
+    def install(self, http):
+        """Wraps discord.py's HTTP client so every REST call goes through the scheduler."""
+        if getattr(http, 'scheduler_installed', False):
+            return
+        request = http.request
+
+        async def scheduled_request(route, **kwargs):
+            return await self.run(f'{route.method} {route.path}', route.channel_id or route.guild_id,
+                                  lambda: request(route, **kwargs))
+
+        http.request = scheduled_request
+        http.scheduler_installed = True
+
+    def get_stats(self):
+        return {
+            'enabled': self.enabled,
+            'queued': dict(zip(PRIORITY_NAMES, self.queued)),
+            'buckets': len(self.buckets),
+            'priorities': {name: dict(stats, wait_average=stats['wait_total'] / stats['requests'] if stats['requests'] else 0.0)
+                           for name, stats in self.stats.items()},
+        }
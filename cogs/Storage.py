@@ -0,0 +1,597 @@
+import os
+import os.path
+from os import path
+from pathlib import Path
+import json
+import queue
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from cogs.Codec import create_codec, decode_server_file, encode_server_file
+from cogs.Model import TIER_FIELDS, Hierarchy, Tier, load_hierarchies
+from cogs.Mutations import apply_mutation, update_hierarchy_depths
+
+
+def new_server_json():
+    return {
+        'hierarchies': {},
+        'roles': {},
+        'channels': {'log': None}
+    }
+
+
+def fill_server_json(server_json):
+    if 'hierarchies' not in server_json:
+        server_json['hierarchies'] = {}
+    if 'roles' not in server_json:
+        server_json['roles'] = {}
+    if 'channels' not in server_json:
+        server_json['channels'] = {'log': None}
+    return server_json
+
+
+def find_tier(server_json, role_id):
+    """Returns the hierarchy name and tier for a role, or None, None if the role is not in a hierarchy."""
+    if str(role_id) not in server_json['roles']:
+        return None, None
+    hierarchy_name = server_json['roles'][str(role_id)]
+    hierarchy = server_json['hierarchies'].get(hierarchy_name)
+    for tier in (hierarchy.tiers if hierarchy is not None else []):
+        if tier.role_id == int(role_id):
+            return hierarchy_name, tier
+    return hierarchy_name, None
+
+
+class Storage:
+    """Interface between Core and wherever server files are kept."""
+
+    # Backends that wait on the network or the disk set this, and Core runs their methods on self.executor
+    blocking = False
+    executor = None
+    # Whether get_version is cheap enough to call on the event loop even when blocking is set
+    version_on_loop = False
+    # Whether different guilds may be loaded on several threads at once, used by the startup warm-up
+    thread_safe = False
+
+    def has_guild(self, server_id):
+        """Whether anything is stored for the guild yet."""
+        return self.get_version(server_id) is not None
+
+    def get_version(self, server_id):
+        """Returns a value that changes whenever the stored server file changes, including from another process."""
+        raise NotImplementedError
+
+    def load_guild(self, server_id):
+        """Returns the full server document."""
+        raise NotImplementedError
+
+    def get_tier_by_role(self, server_id, role_id):
+        """Returns the hierarchy name and tier for a role, or None, None if the role is not in a hierarchy."""
+        return find_tier(self.load_guild(server_id), role_id)
+
+    def list_hierarchies(self, server_id):
+        return list(self.load_guild(server_id)['hierarchies'])
+
+    def apply_mutation(self, server_id, server_json, mutation, changed_tiers):
+        """Persists a mutation that has already been applied to server_json.
+
+        Returns the new version if it can be read atomically with the write, otherwise None."""
+        raise NotImplementedError
+
+    def save_guild(self, server_id, server_json):
+        """Persists the full server document. Returns the new version like apply_mutation."""
+        raise NotImplementedError
+
+    def needs_compaction(self, server_id):
+        return False
+
+    def pending_compactions(self):
+        return []
+
+    def compact(self, server_id, server_json):
+        pass
+
+
+class JsonStorage(Storage):
+    """One snapshot file per guild in ./servers, plus an append-only journal of mutations in JSON lines.
+
+    Snapshots are written with the codec from cogs/Codec.py, older indented JSON snapshots are rewritten with it on first load."""
+
+    # Every guild has its own files. Core keeps each guild's calls on one thread at a time.
+    thread_safe = True
+    # Journal appends wait for fsync and compactions encode and write whole snapshots, keep both off the event loop
+    blocking = True
+    # Two stats, cache hits do not wait for a thread behind writes
+    version_on_loop = True
+
+    def __init__(self, directory: str = './servers', journal_compact_threshold: int = 100, codec=None, pool_size: int = 4):
+        self.directory = directory
+        self.journal_compact_threshold = journal_compact_threshold
+        self.codec = codec if codec is not None else create_codec()
+        # Mutations waiting in each guild's journal to be folded into its snapshot
+        self.journal_lengths = {}
+        self.pool_size = pool_size
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='json-storage')
+
+    def _path(self, server_id, extension):
+        return self.directory + '/' + str(server_id) + extension
+
+    def get_version(self, server_id):
+        """Returns the modification time and size of the snapshot and journal files."""
+        version = []
+        for extension in ('.json', '.journal'):
+            try:
+                stat = os.stat(self._path(server_id, extension))
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def has_guild(self, server_id):
+        return path.isfile(self._path(server_id, '.json'))
+
+    def load_guild(self, server_id):
+        migrate = False
+        if path.isfile(self._path(server_id, '.json')):
+            contents = Path(self._path(server_id, '.json')).read_bytes()
+            try:
+                server_json, codec_name = decode_server_file(contents)
+            except Exception as exception:
+                raise Exception(f'Could not read server file {server_id}: {exception}')
+            server_json = load_hierarchies(fill_server_json(server_json))
+            migrate = len(contents.strip()) > 0 and codec_name != self.codec.name
+        else:
+            Path(self._path(server_id, '.json')).touch()
+            server_json = new_server_json()
+        self.replay_journal(server_id, server_json)
+        if migrate:
+            print(f'Rewriting server file {server_id} with {self.codec.name}.')
+            self.save_guild(server_id, server_json)
+        return server_json
+
+    def replay_journal(self, server_id, server_json):
+        """Applies the mutations in the journal that are newer than the snapshot."""
+        replayed = 0
+        if path.isfile(self._path(server_id, '.journal')):
+            with open(self._path(server_id, '.journal'), 'rb+') as journal_file:
+                offset = 0
+                for line in journal_file:
+                    try:
+                        mutation = json.loads(line)
+                    except ValueError:
+                        # The process died while appending this record, so it was never acknowledged.
+                        # Cut it off so that new records are not appended to the broken line.
+                        print(f'Discarding incomplete journal record for server {server_id}.')
+                        journal_file.truncate(offset)
+                        break
+                    offset += len(line)
+                    if mutation['seq'] <= server_json.get('journal_sequence', 0):
+                        continue
+                    apply_mutation(server_json, mutation)
+                    server_json['journal_sequence'] = mutation['seq']
+                    replayed += 1
+        self.journal_lengths[str(server_id)] = replayed
+
+    def apply_mutation(self, server_id, server_json, mutation, changed_tiers):
+        server_json['journal_sequence'] = server_json.get('journal_sequence', 0) + 1
+        record = dict(mutation, seq=server_json['journal_sequence'])
+        with open(self._path(server_id, '.journal'), 'a') as journal_file:
+            journal_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self.journal_lengths[str(server_id)] = self.journal_lengths.get(str(server_id), 0) + 1
+
+    def save_guild(self, server_id, server_json):
+        """Atomically writes a full snapshot of the server file and empties its journal."""
+        contents = encode_server_file(self.codec, fill_server_json(server_json))
+        with open(self._path(server_id, '.json.tmp'), "wb") as json_file:
+            json_file.write(contents)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        os.replace(self._path(server_id, '.json.tmp'), self._path(server_id, '.json'))
+        # Records left behind by a crash before this point are skipped by their sequence number
+        open(self._path(server_id, '.journal'), 'w').close()
+        self.journal_lengths[str(server_id)] = 0
+
+    def needs_compaction(self, server_id):
+        return self.journal_lengths.get(str(server_id), 0) >= self.journal_compact_threshold
+
+    def pending_compactions(self):
+        return [server_id for server_id, length in self.journal_lengths.items() if length > 0]
+
+    def compact(self, server_id, server_json):
+        if self.journal_lengths.get(str(server_id), 0) > 0:
+            self.save_guild(server_id, server_json)
+
+
+class SqlStorage(Storage):
+    """Queries shared by the relational backends, written with ? placeholders."""
+
+    # Same order as the Tier constructor arguments
+    TIER_COLUMNS = TIER_FIELDS
+
+    # Column that keeps rows in insertion order
+    order_column = 'rowid'
+
+    def __init__(self, json_directory: str = './servers'):
+        # Guilds that still have a JSON server file are imported on first load
+        self.json_storage = JsonStorage(json_directory)
+
+    def _transaction(self):
+        """Context manager that yields a cursor and commits when the block exits without an exception."""
+        raise NotImplementedError
+
+    def _sql(self, sql):
+        return sql
+
+    def _upsert(self, table, columns, key_columns):
+        raise NotImplementedError
+
+    def _insert_ignore(self, table, columns):
+        raise NotImplementedError
+
+    def _select(self, sql, parameters):
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(sql), parameters)
+            return cursor.fetchall()
+
+    def get_version(self, server_id):
+        rows = self._select('SELECT version FROM guilds WHERE guild_id = ?', (int(server_id),))
+        return rows[0][0] if rows else None
+
+    def has_guild(self, server_id):
+        return self.get_version(server_id) is not None or self.json_storage.has_guild(server_id)
+
+    def _read_version(self, cursor, server_id):
+        # Read inside the writing transaction so another process cannot slip a change in between
+        cursor.execute(self._sql('SELECT version FROM guilds WHERE guild_id = ?'), (int(server_id),))
+        return cursor.fetchone()[0]
+
+    def _tier_row(self, server_id, hierarchy_name, tier):
+        row = [int(server_id), hierarchy_name]
+        for column in self.TIER_COLUMNS:
+            value = getattr(tier, column)
+            row.append(int(value) if isinstance(value, bool) else value)
+        return row
+
+    def _row_tier(self, row):
+        tier = Tier(*row)
+        # Tiers created before these flags existed do not have them
+        if tier.allow_promote_demote is not None:
+            tier.allow_promote_demote = bool(tier.allow_promote_demote)
+        if tier.allow_assign_unassign is not None:
+            tier.allow_assign_unassign = bool(tier.allow_assign_unassign)
+        return tier
+
+    def load_guild(self, server_id):
+        with self._transaction() as cursor:
+            cursor.execute(self._sql('SELECT log_channel FROM guilds WHERE guild_id = ?'), (int(server_id),))
+            guild = cursor.fetchone()
+            if guild is not None:
+                cursor.execute(self._sql('SELECT name, maximum_depth FROM hierarchies WHERE guild_id = ? ORDER BY ' + self.order_column), (int(server_id),))
+                hierarchies = cursor.fetchall()
+                cursor.execute(self._sql('SELECT hierarchy, ' + ', '.join(self.TIER_COLUMNS) + ' FROM tiers WHERE guild_id = ? ORDER BY ' + self.order_column), (int(server_id),))
+                tiers = cursor.fetchall()
+                cursor.execute(self._sql('SELECT role_id, hierarchy FROM roles WHERE guild_id = ?'), (int(server_id),))
+                roles = cursor.fetchall()
+
+        if guild is None:
+            server_json = new_server_json()
+            if path.isfile(self.json_storage._path(server_id, '.json')):
+                server_json = self.json_storage.load_guild(server_id)
+                print(f'Importing server file {server_id} into {type(self).__name__}.')
+            self.save_guild(server_id, server_json)
+            return server_json
+
+        server_json = new_server_json()
+        if guild[0] is not None:
+            server_json['log_channel'] = guild[0]
+        for name, maximum_depth in hierarchies:
+            server_json['hierarchies'][name] = Hierarchy(maximum_depth=maximum_depth)
+        for row in tiers:
+            if row[0] in server_json['hierarchies']:
+                server_json['hierarchies'][row[0]].tiers.append(self._row_tier(row[1:]))
+        for role_id, hierarchy_name in roles:
+            server_json['roles'][str(role_id)] = hierarchy_name
+        # Rows come back in insertion order, put them back into tree order
+        for hierarchy_json in server_json['hierarchies'].values():
+            update_hierarchy_depths(hierarchy_json)
+        return server_json
+
+    def get_tier_by_role(self, server_id, role_id):
+        rows = self._select(
+            'SELECT r.hierarchy, ' + ', '.join('t.' + column for column in self.TIER_COLUMNS) +
+            ' FROM roles r LEFT JOIN tiers t ON t.guild_id = r.guild_id AND t.role_id = r.role_id'
+            ' WHERE r.guild_id = ? AND r.role_id = ?', (int(server_id), int(role_id)))
+        if not rows:
+            return None, None
+        if rows[0][1] is None:
+            return rows[0][0], None
+        return rows[0][0], self._row_tier(rows[0][1:])
+
+    def list_hierarchies(self, server_id):
+        return [row[0] for row in self._select(
+            'SELECT name FROM hierarchies WHERE guild_id = ? ORDER BY ' + self.order_column, (int(server_id),))]
+
+    def _upsert_tiers(self, cursor, server_id, hierarchy_name, tiers):
+        if len(tiers) == 0:
+            return
+        cursor.executemany(self._sql(self._upsert('tiers', ('guild_id', 'hierarchy') + self.TIER_COLUMNS, ('guild_id', 'role_id'))),
+            [self._tier_row(server_id, hierarchy_name, tier) for tier in tiers])
+        cursor.executemany(self._sql(self._upsert('roles', ('guild_id', 'role_id', 'hierarchy'), ('guild_id', 'role_id'))),
+            [(int(server_id), tier.role_id, hierarchy_name) for tier in tiers])
+
+    def apply_mutation(self, server_id, server_json, mutation, changed_tiers):
+        op = mutation['op']
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(self._insert_ignore('guilds', ('guild_id',))), (int(server_id),))
+            if op == 'set_log_channel':
+                cursor.execute(self._sql('UPDATE guilds SET log_channel = ? WHERE guild_id = ?'), (mutation['channel_id'], int(server_id)))
+            elif op == 'delete_hierarchy':
+                for table, column in (('tiers', 'hierarchy'), ('roles', 'hierarchy'), ('hierarchies', 'name')):
+                    cursor.execute(self._sql('DELETE FROM ' + table + ' WHERE guild_id = ? AND ' + column + ' = ?'), (int(server_id), mutation['hierarchy']))
+            else:
+                if op == 'create_hierarchy':
+                    cursor.execute(self._sql('INSERT INTO hierarchies (guild_id, name) VALUES (?, ?)'), (int(server_id), mutation['hierarchy']))
+                elif op == 'remove_tier':
+                    for table in ('tiers', 'roles'):
+                        cursor.execute(self._sql('DELETE FROM ' + table + ' WHERE guild_id = ? AND role_id = ?'), (int(server_id), mutation['role_id']))
+                self._upsert_tiers(cursor, server_id, mutation['hierarchy'], changed_tiers)
+                cursor.execute(self._sql('UPDATE hierarchies SET maximum_depth = ? WHERE guild_id = ? AND name = ?'),
+                    (server_json['hierarchies'][mutation['hierarchy']].maximum_depth, int(server_id), mutation['hierarchy']))
+            cursor.execute(self._sql('UPDATE guilds SET version = version + 1 WHERE guild_id = ?'), (int(server_id),))
+            return self._read_version(cursor, server_id)
+
+    def save_guild(self, server_id, server_json):
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(self._insert_ignore('guilds', ('guild_id',))), (int(server_id),))
+            cursor.execute(self._sql('UPDATE guilds SET log_channel = ?, version = version + 1 WHERE guild_id = ?'),
+                (server_json.get('log_channel'), int(server_id)))
+            for table in ('tiers', 'roles', 'hierarchies'):
+                cursor.execute(self._sql('DELETE FROM ' + table + ' WHERE guild_id = ?'), (int(server_id),))
+            if len(server_json['hierarchies']) > 0:
+                cursor.executemany(self._sql('INSERT INTO hierarchies (guild_id, name, maximum_depth) VALUES (?, ?, ?)'),
+                    [(int(server_id), hierarchy_name, hierarchy_json.maximum_depth) for hierarchy_name, hierarchy_json in server_json['hierarchies'].items()])
+            for hierarchy_name, hierarchy_json in server_json['hierarchies'].items():
+                self._upsert_tiers(cursor, server_id, hierarchy_name, hierarchy_json.tiers)
+            # Keep lookup entries whose tier is missing, ^remove and ^delete still clean those up
+            if len(server_json['roles']) > 0:
+                cursor.executemany(self._sql(self._insert_ignore('roles', ('guild_id', 'role_id', 'hierarchy'))),
+                    [(int(server_id), int(role_id), hierarchy_name) for role_id, hierarchy_name in server_json['roles'].items()])
+            return self._read_version(cursor, server_id)
+
+
+class SqliteStorage(SqlStorage):
+    """Every guild in one SQLite database, with hierarchies, tiers and the role lookup as indexed tables."""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS guilds (
+            guild_id INTEGER PRIMARY KEY,
+            log_channel INTEGER,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS hierarchies (
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            maximum_depth INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, name)
+        );
+        CREATE TABLE IF NOT EXISTS tiers (
+            guild_id INTEGER NOT NULL,
+            hierarchy TEXT NOT NULL,
+            role_id INTEGER NOT NULL,
+            parent_role_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            promotion_min_depth INTEGER NOT NULL,
+            promotion_max_depth INTEGER NOT NULL,
+            demotion_min_depth INTEGER NOT NULL,
+            demotion_max_depth INTEGER NOT NULL,
+            allow_promote_demote INTEGER,
+            allow_assign_unassign INTEGER,
+            PRIMARY KEY (guild_id, role_id)
+        );
+        CREATE INDEX IF NOT EXISTS tiers_guild_hierarchy ON tiers (guild_id, hierarchy);
+        CREATE INDEX IF NOT EXISTS tiers_role ON tiers (role_id);
+        CREATE TABLE IF NOT EXISTS roles (
+            guild_id INTEGER NOT NULL,
+            role_id INTEGER NOT NULL,
+            hierarchy TEXT NOT NULL,
+            PRIMARY KEY (guild_id, role_id)
+        );
+        CREATE INDEX IF NOT EXISTS roles_guild_hierarchy ON roles (guild_id, hierarchy);
+        CREATE INDEX IF NOT EXISTS roles_role ON roles (role_id);
+    '''
+
+    def __init__(self, database: str = './servers/hierarchies.db', json_directory: str = './servers'):
+        super().__init__(json_directory)
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self.connection:
+            yield self.connection.cursor()
+
+    def _upsert(self, table, columns, key_columns):
+        return 'INSERT INTO ' + table + ' (' + ', '.join(columns) + ') VALUES (' + ', '.join('?' for _ in columns) + ')' + \
+            ' ON CONFLICT (' + ', '.join(key_columns) + ') DO UPDATE SET ' + \
+            ', '.join(column + ' = excluded.' + column for column in columns if column not in key_columns)
+
+    def _insert_ignore(self, table, columns):
+        return 'INSERT OR IGNORE INTO ' + table + ' (' + ', '.join(columns) + ') VALUES (' + ', '.join('?' for _ in columns) + ')'
+
+
+class MysqlStorage(SqlStorage):
+    """Every guild in one MySQL/MariaDB database shared by all bot processes, through a bounded connection pool.
+
+    Queries block, so Core runs them on an executor with one thread per pooled connection."""
+
+    blocking = True
+    # Each thread takes its own connection from the pool
+    thread_safe = True
+    order_column = 'id'
+    idle_ping_interval = 60
+
+    # Binary collation keeps hierarchy names case and accent sensitive, like the JSON and SQLite backends
+    SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS guilds (
+            guild_id BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+            log_channel BIGINT UNSIGNED NULL,
+            version BIGINT UNSIGNED NOT NULL DEFAULT 0
+        ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin''',
+        '''CREATE TABLE IF NOT EXISTS hierarchies (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            guild_id BIGINT UNSIGNED NOT NULL,
+            name VARCHAR(32) NOT NULL,
+            maximum_depth INT NOT NULL DEFAULT 0,
+            UNIQUE KEY hierarchies_guild_name (guild_id, name)
+        ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin''',
+        '''CREATE TABLE IF NOT EXISTS tiers (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            guild_id BIGINT UNSIGNED NOT NULL,
+            hierarchy VARCHAR(32) NOT NULL,
+            role_id BIGINT UNSIGNED NOT NULL,
+            parent_role_id BIGINT UNSIGNED NOT NULL,
+            depth INT NOT NULL,
+            promotion_min_depth INT NOT NULL,
+            promotion_max_depth INT NOT NULL,
+            demotion_min_depth INT NOT NULL,
+            demotion_max_depth INT NOT NULL,
+            allow_promote_demote TINYINT(1) NULL,
+            allow_assign_unassign TINYINT(1) NULL,
+            UNIQUE KEY tiers_guild_role (guild_id, role_id),
+            KEY tiers_guild_hierarchy (guild_id, hierarchy),
+            KEY tiers_role (role_id)
+        ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin''',
+        '''CREATE TABLE IF NOT EXISTS roles (
+            guild_id BIGINT UNSIGNED NOT NULL,
+            role_id BIGINT UNSIGNED NOT NULL,
+            hierarchy VARCHAR(32) NOT NULL,
+            PRIMARY KEY (guild_id, role_id),
+            KEY roles_guild_hierarchy (guild_id, hierarchy),
+            KEY roles_role (role_id)
+        ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin''',
+    )
+    # Tables created before the schema set a collation, with the columns that hold hierarchy names
+    NAME_COLUMNS = (('hierarchies', 'name'), ('tiers', 'hierarchy'), ('roles', 'hierarchy'))
+
+    def __init__(self, host: str, port: int, user: str, password: str, database: str,
+            pool_size: int = 5, tunnel=None, json_directory: str = './servers'):
+        # pip3 install pymysql
+        import pymysql
+        super().__init__(json_directory)
+        self.pymysql = pymysql
+        self.tunnel = tunnel
+        self.connect_arguments = {
+            'host': host,
+            'port': port,
+            'user': user,
+            'password': password,
+            'database': database,
+            'charset': 'utf8mb4',
+            'autocommit': False,
+        }
+        self.pool_size = pool_size
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        for _ in range(pool_size):
+            # Connections are opened lazily the first time they are taken from the pool
+            self.pool.put((None, 0))
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='mysql')
+
+        with self._transaction() as cursor:
+            for statement in self.SCHEMA:
+                cursor.execute(statement)
+            for table, column in self.NAME_COLUMNS:
+                cursor.execute('SELECT collation_name FROM information_schema.columns'
+                               ' WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s', (table, column))
+                row = cursor.fetchone()
+                if row is not None and row[0] != 'utf8mb4_bin':
+                    print(f'Converting MySQL table {table} to the utf8mb4_bin collation.')
+                    cursor.execute('ALTER TABLE ' + table + ' CONVERT TO CHARACTER SET utf8mb4 COLLATE utf8mb4_bin')
+
+    @contextmanager
+    def _transaction(self):
+        # Blocks until a connection is free, so at most pool_size queries run at once
+        connection, last_used = self.pool.get()
+        try:
+            if connection is None or not connection.open:
+                connection = self.pymysql.connect(**self.connect_arguments)
+            elif time.monotonic() - last_used > self.idle_ping_interval:
+                # The server may have dropped a connection that sat idle in the pool
+                connection.ping(reconnect=True)
+            with connection.cursor() as cursor:
+                yield cursor
+            connection.commit()
+        except BaseException:
+            if connection is not None and connection.open:
+                try:
+                    connection.rollback()
+                except self.pymysql.MySQLError:
+                    # The connection is broken, open a fresh one next time
+                    connection.close()
+            raise
+        finally:
+            self.pool.put((connection, time.monotonic()))
+
+    def _sql(self, sql):
+        return sql.replace('?', '%s')
+
+    def _upsert(self, table, columns, key_columns):
+        return 'INSERT INTO ' + table + ' (' + ', '.join(columns) + ') VALUES (' + ', '.join('?' for _ in columns) + ')' + \
+            ' ON DUPLICATE KEY UPDATE ' + \
+            ', '.join(column + ' = VALUES(' + column + ')' for column in columns if column not in key_columns)
+
+    def _insert_ignore(self, table, columns):
+        return 'INSERT IGNORE INTO ' + table + ' (' + ', '.join(columns) + ') VALUES (' + ', '.join('?' for _ in columns) + ')'
+
+    def close(self):
+        while not self.pool.empty():
+            connection, last_used = self.pool.get_nowait()
+            if connection is not None and connection.open:
+                connection.close()
+        self.executor.shutdown(wait=False)
+        if self.tunnel is not None:
+            self.tunnel.stop()
+
+
+def create_mysql_storage(DatabaseConfig):
+    host = getattr(DatabaseConfig, 'local_host', '') or '127.0.0.1'
+    port = getattr(DatabaseConfig, 'local_port', None) or 3306
+    tunnel = None
+    if getattr(DatabaseConfig, 'remote_host', ''):
+        # The database only listens on the remote machine, reach it through SSH
+        # pip3 install sshtunnel
+        from sshtunnel import SSHTunnelForwarder
+        tunnel = SSHTunnelForwarder(
+            (DatabaseConfig.remote_host, DatabaseConfig.remote_port),
+            ssh_username=DatabaseConfig.remote_user,
+            ssh_password=DatabaseConfig.remote_password,
+            remote_bind_address=(host, port)
+        )
+        tunnel.start()
+        host, port = '127.0.0.1', tunnel.local_bind_port
+    return MysqlStorage(host, port, DatabaseConfig.mysql_user, DatabaseConfig.mysql_password,
+        getattr(DatabaseConfig, 'mysql_database', 'hierarchies'),
+        pool_size=getattr(DatabaseConfig, 'mysql_pool_size', 5),
+        tunnel=tunnel)
+
+
+def create_storage():
+    """Creates the storage backend selected in custom/DatabaseConfig.py, defaulting to JSON files."""
+    try:
+        from custom import DatabaseConfig
+    except ImportError:
+        DatabaseConfig = None
+
+    backend = getattr(DatabaseConfig, 'storage_backend', 'json')
+    if backend == 'json':
+        return JsonStorage(codec=create_codec(getattr(DatabaseConfig, 'storage_codec', 'auto')))
+    elif backend == 'sqlite':
+        return SqliteStorage(getattr(DatabaseConfig, 'sqlite_file', './servers/hierarchies.db'))
+    elif backend == 'mysql':
+        return create_mysql_storage(DatabaseConfig)
+    raise Exception(f'Unknown storage backend `{backend}` in custom/DatabaseConfig.py.')
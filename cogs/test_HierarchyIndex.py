@@ -0,0 +1,116 @@
+#
+# Checks the permission bitsets of HierarchyIndex against the depth comparison
+# they replace, and that update_tier compiles the same masks as a rebuild.
+# Run with: python -m unittest discover -s cogs -p "test_*.py" -t .
+#
+import random
+import unittest
+
+from cogs.HierarchyIndex import PERMISSION_COMMANDS, HierarchyIndex
+from cogs.Mutations import apply_mutation
+
+DEPTH_RANGES = (-1, 0, 1, 2, 3, 5)
+
+
+def random_ranges(rng):
+    return {key_prefix + suffix: rng.choice(DEPTH_RANGES)
+            for key_prefix in ('promotion', 'demotion') for suffix in ('_min_depth', '_max_depth')}
+
+
+def random_hierarchy(rng, size):
+    server_json = {'hierarchies': {}, 'roles': {}, 'channels': {'log': None}}
+    apply_mutation(server_json, {'op': 'create_hierarchy', 'hierarchy': 'h',
+                                 'tier': dict(random_ranges(rng), role_id=1, parent_role_id=0, depth=0)})
+    for role_id in range(2, size + 1):
+        apply_mutation(server_json, {'op': 'add_tier', 'hierarchy': 'h',
+                                     'tier': dict(random_ranges(rng), role_id=role_id, parent_role_id=rng.randrange(1, role_id), depth=0)})
+    return server_json
+
+
+def allowed(actor, target, key_prefix):
+    """The depth comparison the commands made before the index existed, -1 disables the command."""
+    minimum = actor[key_prefix + '_min_depth']
+    maximum = actor[key_prefix + '_max_depth']
+    if minimum == -1 or maximum == -1:
+        return False
+    return minimum <= target.depth - actor.depth <= maximum
+
+
+class HierarchyIndexTest(unittest.TestCase):
+
+    def assertMatchesDepthComparison(self, index, tiers):
+        for key_prefix, commands in PERMISSION_COMMANDS:
+            for actor in tiers:
+                expected_mask = 0
+                for position, target in enumerate(tiers):
+                    expected = allowed(actor, target, key_prefix)
+                    if expected:
+                        expected_mask |= 1 << position
+                    for command in commands:
+                        self.assertEqual(index.can(command, actor.role_id, target.role_id), expected,
+                                         f'{command} from {actor} to {target}')
+                for command in commands:
+                    self.assertEqual(index.permission_mask(command, [actor.role_id]), expected_mask)
+
+    def assertSameMasks(self, index, hierarchy_json):
+        rebuilt = HierarchyIndex(hierarchy_json)
+        self.assertEqual(index.permission_masks, rebuilt.permission_masks)
+        self.assertEqual(index.positions, rebuilt.positions)
+
+    def test_can_matches_depth_comparison(self):
+        rng = random.Random(11)
+        for _ in range(20):
+            server_json = random_hierarchy(rng, 30)
+            hierarchy_json = server_json['hierarchies']['h']
+            self.assertMatchesDepthComparison(HierarchyIndex(hierarchy_json), hierarchy_json.tiers)
+
+    def test_unknown_roles_are_never_allowed(self):
+        server_json = random_hierarchy(random.Random(1), 5)
+        index = HierarchyIndex(server_json['hierarchies']['h'])
+        self.assertFalse(index.can('promote', 1, 99))
+        self.assertFalse(index.can('demote', 99, 1))
+        self.assertEqual(index.permission_mask('assign', [99]), 0)
+
+    def test_permission_mask_combines_actor_tiers(self):
+        server_json = random_hierarchy(random.Random(3), 20)
+        index = HierarchyIndex(server_json['hierarchies']['h'])
+        self.assertEqual(index.permission_mask('promote', [2, 5, 9]),
+                         index.permission_mask('promote', [2]) | index.permission_mask('promote', [5]) | index.permission_mask('promote', [9]))
+
+    def test_update_tier_matches_rebuild(self):
+        rng = random.Random(5)
+        server_json = random_hierarchy(rng, 40)
+        hierarchy_json = server_json['hierarchies']['h']
+        index = HierarchyIndex(hierarchy_json)
+        index.cache['show_pages'] = []
+        for _ in range(200):
+            role_id = rng.randrange(1, 41)
+            tier_object = index.tier(role_id)
+            apply_mutation(server_json, {'op': 'modify_tier', 'hierarchy': 'h', 'role_id': role_id,
+                                         'changes': dict(random_ranges(rng), parent_role_id=tier_object.parent_role_id)},
+                           index.positions)
+            index.update_tier(role_id)
+            self.assertSameMasks(index, hierarchy_json)
+        self.assertEqual(index.cache, {})
+        self.assertMatchesDepthComparison(index, hierarchy_json.tiers)
+
+    def test_update_tier_rebuilds_after_a_move(self):
+        rng = random.Random(9)
+        server_json = random_hierarchy(rng, 40)
+        hierarchy_json = server_json['hierarchies']['h']
+        index = HierarchyIndex(hierarchy_json)
+        for _ in range(100):
+            role_id, parent_role_id = rng.randrange(2, 41), rng.randrange(1, 41)
+            if index.is_below(parent_role_id, role_id):
+                continue
+            apply_mutation(server_json, {'op': 'modify_tier', 'hierarchy': 'h', 'role_id': role_id,
+                                         'changes': dict(random_ranges(rng), parent_role_id=parent_role_id)},
+                           index.positions)
+            index.update_tier(role_id)
+            self.assertSameMasks(index, hierarchy_json)
+            self.assertEqual(index.children_by_parent, HierarchyIndex(hierarchy_json).children_by_parent)
+        self.assertMatchesDepthComparison(index, hierarchy_json.tiers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#
+# Checks that the in-place tier list updates in Mutations.py keep a hierarchy in
+# tree order with the same depths a full re-sort gives.
+# Run with: python -m unittest discover -s cogs -p "test_*.py" -t .
+#
+import random
+import unittest
+
+from cogs.Model import Hierarchy
+from cogs.Mutations import apply_mutation, order_hierarchy_tiers
+
+
+def tier(role_id, parent_role_id):
+    return {'role_id': role_id, 'parent_role_id': parent_role_id, 'depth': 0,
+            'promotion_min_depth': 0, 'promotion_max_depth': 1, 'demotion_min_depth': 0, 'demotion_max_depth': 1}
+
+
+def new_hierarchy(edges):
+    """Builds hierarchy `h` from (role ID, parent role ID) pairs, parents first."""
+    server_json = {'hierarchies': {}, 'roles': {}, 'channels': {'log': None}}
+    apply_mutation(server_json, {'op': 'create_hierarchy', 'hierarchy': 'h', 'tier': tier(*edges[0])})
+    for role_id, parent_role_id in edges[1:]:
+        apply_mutation(server_json, {'op': 'add_tier', 'hierarchy': 'h', 'tier': tier(role_id, parent_role_id)})
+    return server_json
+
+
+def move(server_json, role_id, parent_role_id):
+    apply_mutation(server_json, {'op': 'modify_tier', 'hierarchy': 'h', 'role_id': role_id,
+                                 'changes': {'parent_role_id': parent_role_id}})
+
+
+def remove(server_json, role_id):
+    apply_mutation(server_json, {'op': 'remove_tier', 'hierarchy': 'h', 'role_id': role_id})
+
+
+class TreeOrderTest(unittest.TestCase):
+
+    def assertTreeOrder(self, hierarchy: Hierarchy):
+        """The tiers are in tree order with the depths and maximum depth a full re-sort gives."""
+        # Re-sorting keeps siblings in list order, so a list that is already in tree order comes back unchanged
+        expected = order_hierarchy_tiers([tier_object.copy() for tier_object in hierarchy.tiers])
+        self.assertEqual([(tier_object.role_id, tier_object.depth) for tier_object in hierarchy.tiers],
+                         [(tier_object.role_id, tier_object.depth) for tier_object in expected])
+        self.assertEqual(hierarchy.maximum_depth, max((tier_object.depth for tier_object in hierarchy.tiers), default=0))
+
+    @staticmethod
+    def _is_below(tiers, role_id, ancestor_role_id):
+        parents = {tier_object.role_id: tier_object.parent_role_id for tier_object in tiers}
+        while role_id != 0:
+            if role_id == ancestor_role_id:
+                return True
+            role_id = parents[role_id]
+        return False
+
+    def roles(self, server_json):
+        return [(tier_object.role_id, tier_object.depth) for tier_object in server_json['hierarchies']['h'].tiers]
+
+    def test_add_places_leaf_after_parent_subtree(self):
+        server_json = new_hierarchy([(1, 0), (2, 1), (3, 2), (4, 1), (5, 2)])
+        self.assertEqual(self.roles(server_json), [(1, 0), (2, 1), (3, 2), (5, 2), (4, 1)])
+        self.assertEqual(server_json['hierarchies']['h'].maximum_depth, 2)
+        self.assertTreeOrder(server_json['hierarchies']['h'])
+
+    def test_add_with_missing_parent_raises(self):
+        server_json = new_hierarchy([(1, 0)])
+        with self.assertRaises(Exception):
+            apply_mutation(server_json, {'op': 'add_tier', 'hierarchy': 'h', 'tier': tier(2, 9)})
+
+    def test_move_subtree_to_parent_before_it(self):
+        server_json = new_hierarchy([(1, 0), (2, 1), (3, 2), (4, 1), (5, 4), (6, 5)])
+        move(server_json, 5, 2)
+        self.assertEqual(self.roles(server_json), [(1, 0), (2, 1), (3, 2), (5, 2), (6, 3), (4, 1)])
+        self.assertEqual(server_json['hierarchies']['h'].maximum_depth, 3)
+        self.assertTreeOrder(server_json['hierarchies']['h'])
+
+    def test_move_subtree_to_parent_after_it(self):
+        server_json = new_hierarchy([(1, 0), (2, 1), (3, 2), (7, 3), (4, 1), (5, 4)])
+        move(server_json, 3, 5)
+        self.assertEqual(self.roles(server_json), [(1, 0), (2, 1), (4, 1), (5, 2), (3, 3), (7, 4)])
+        self.assertEqual(server_json['hierarchies']['h'].maximum_depth, 4)
+        self.assertTreeOrder(server_json['hierarchies']['h'])
+
+    def test_move_subtree_up_lowers_maximum_depth(self):
+        server_json = new_hierarchy([(1, 0), (2, 1), (3, 2), (4, 3)])
+        move(server_json, 3, 1)
+        self.assertEqual(self.roles(server_json), [(1, 0), (2, 1), (3, 1), (4, 2)])
+        self.assertEqual(server_json['hierarchies']['h'].maximum_depth, 2)
+        self.assertTreeOrder(server_json['hierarchies']['h'])
+
+    def test_move_below_itself_raises(self):
+        server_json = new_hierarchy([(1, 0), (2, 1), (3, 2)])
+        with self.assertRaises(Exception):
+            move(server_json, 2, 3)
+        self.assertEqual(self.roles(server_json), [(1, 0), (2, 1), (3, 2)])
+
+    def test_remove_links_children_to_parent(self):
+        server_json = new_hierarchy([(1, 0), (2, 1), (3, 2), (4, 3), (5, 2), (6, 1)])
+        remove(server_json, 2)
+        tiers = server_json['hierarchies']['h'].tiers
+        self.assertEqual(self.roles(server_json), [(1, 0), (3, 1), (4, 2), (5, 1), (6, 1)])
+        self.assertEqual([tier_object.parent_role_id for tier_object in tiers], [0, 1, 3, 1, 1])
+        self.assertEqual(server_json['hierarchies']['h'].maximum_depth, 2)
+        self.assertNotIn('2', server_json['roles'])
+        self.assertTreeOrder(server_json['hierarchies']['h'])
+
+    def test_remove_deepest_leaf_lowers_maximum_depth(self):
+        server_json = new_hierarchy([(1, 0), (2, 1), (3, 2)])
+        remove(server_json, 3)
+        self.assertEqual(server_json['hierarchies']['h'].maximum_depth, 1)
+        self.assertTreeOrder(server_json['hierarchies']['h'])
+
+    def test_stale_positions_fall_back_to_a_scan(self):
+        server_json = new_hierarchy([(1, 0), (2, 1), (3, 1)])
+        positions = {1: 0, 2: 2, 3: 1}
+        apply_mutation(server_json, {'op': 'add_tier', 'hierarchy': 'h', 'tier': tier(4, 2)}, positions)
+        self.assertEqual(self.roles(server_json), [(1, 0), (2, 1), (4, 2), (3, 1)])
+        self.assertTreeOrder(server_json['hierarchies']['h'])
+
+    def test_random_mutations_keep_tree_order(self):
+        rng = random.Random(7)
+        server_json = new_hierarchy([(1, 0)])
+        role_ids = [1]
+        for next_role_id in range(2, 400):
+            action = rng.random()
+            hierarchy = server_json['hierarchies']['h']
+            if action < 0.5 or len(role_ids) < 3:
+                apply_mutation(server_json, {'op': 'add_tier', 'hierarchy': 'h', 'tier': tier(next_role_id, rng.choice(role_ids))})
+                role_ids.append(next_role_id)
+            elif action < 0.8:
+                role_id, parent_role_id = rng.choice(role_ids[1:]), rng.choice(role_ids)
+                if not self._is_below(hierarchy.tiers, parent_role_id, role_id):
+                    move(server_json, role_id, parent_role_id)
+            else:
+                role_id = rng.choice(role_ids[1:])
+                role_ids.remove(role_id)
+                remove(server_json, role_id)
+            self.assertTreeOrder(server_json['hierarchies']['h'])
+
+
+if __name__ == '__main__':
+    unittest.main()
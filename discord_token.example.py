@@ -1 +1 @@
-token = ''
+token = ''
@@ -0,0 +1,115 @@
+#
+# Runs Hierarchies as several processes ("clusters"), each connecting its own slice of the shards.
+#
+# python launcher.py --clusters 4               Uses the shard count Discord recommends
+# python launcher.py --clusters 4 --shards 32   Uses a fixed shard count
+#
+# Every cluster runs Hierarchies.py with its shard IDs in the environment, see cogs/Cluster.py.
+# Clusters that exit are restarted, waiting longer after each crash in a row.
+#
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from cogs.Cluster import cluster_environment, split_shards
+from discord_token import token
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Hierarchies.py')
+# Discord allows max_concurrency shards to identify every 5 seconds
+IDENTIFY_INTERVAL = 5.0
+
+
+def get_gateway_bot():
+    """Returns the recommended shard count and identify concurrency for the bot."""
+    request = urllib.request.Request('https://discord.com/api/v9/gateway/bot', headers={
+        'Authorization': 'Bot ' + token,
+        'User-Agent': 'DiscordBot (https://github.com/NobleUplift/Hierarchies, 1.0)',
+    })
+    with urllib.request.urlopen(request, timeout=30) as response:
+        gateway = json.load(response)
+    return gateway['shards'], gateway.get('session_start_limit', {}).get('max_concurrency', 1)
+
+
+class Cluster:
+    def __init__(self, name: str, shard_count: int, shard_ids: list):
+        self.name = name
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+        self.process = None
+        self.started_at = 0.0
+        self.crashes = 0
+        self.restart_at = 0.0
+
+    def start(self):
+        print(f'Starting {self.name} with shards {self.shard_ids} of {self.shard_count}.')
+        self.process = subprocess.Popen([sys.executable, BOT_SCRIPT],
+            env=dict(os.environ, **cluster_environment(self.shard_count, self.shard_ids, self.name)))
+        self.started_at = time.monotonic()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs Hierarchies as several processes that split the shards between them.')
+    parser.add_argument('--clusters', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shards', type=int, default=None, help='Total shard count, by default the count Discord recommends.')
+    parser.add_argument('--max-concurrency', type=int, default=None, help='Shards that may identify at the same time.')
+    parser.add_argument('--max-restart-delay', type=float, default=300.0)
+    options = parser.parse_args()
+
+    shard_count, max_concurrency = options.shards, options.max_concurrency
+    if shard_count is None or max_concurrency is None:
+        recommended_shards, recommended_concurrency = get_gateway_bot()
+        shard_count = shard_count or recommended_shards
+        max_concurrency = max_concurrency or recommended_concurrency
+
+    clusters = [Cluster(f'cluster-{index}', shard_count, shard_ids)
+                for index, shard_ids in enumerate(split_shards(shard_count, options.clusters))]
+
+    stopping = False
+
+    def stop(signal_number, frame):
+        nonlocal stopping
+        stopping = True
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Give each cluster time to identify its shards before the next one starts
+    for cluster in clusters:
+        if stopping:
+            break
+        cluster.start()
+        time.sleep(IDENTIFY_INTERVAL * len(cluster.shard_ids) / max_concurrency)
+
+    while not stopping:
+        time.sleep(1)
+        for cluster in clusters:
+            if cluster.process is None or cluster.process.poll() is None:
+                continue
+            if cluster.restart_at == 0.0:
+                # Only crashes in a row count towards the delay, not one after hours of uptime
+                cluster.crashes = cluster.crashes + 1 if time.monotonic() - cluster.started_at < options.max_restart_delay else 1
+                delay = min(2 ** cluster.crashes, options.max_restart_delay)
+                print(f'{cluster.name} exited with code {cluster.process.returncode}, restarting in {delay:.0f} seconds.', file=sys.stderr)
+                cluster.restart_at = time.monotonic() + delay
+            elif time.monotonic() >= cluster.restart_at:
+                cluster.restart_at = 0.0
+                cluster.start()
+
+    print('Stopping clusters.')
+    for cluster in clusters:
+        cluster.stop()
+    for cluster in clusters:
+        if cluster.process is not None:
+            cluster.process.wait()
+
+
+if __name__ == '__main__':
+    main()